@@ -0,0 +1,64 @@
+"""
+Compares the fused CLIP preprocessing path against chaining `to_numpy`, `normalize`, `transpose` and `expand_dims`.
+
+Usage: python -m benchmarks.clip_preprocess --size 224
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+from immich_ml.models.transforms import get_normalization_lut, normalize, normalize_to_nchw, to_numpy
+
+# OpenAI CLIP normalization, shared by most OpenCLIP models
+MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+
+def chained(img: Image.Image) -> NDArray[np.float32]:
+    image_np = normalize(to_numpy(img), MEAN, STD)
+    return np.expand_dims(image_np.transpose(2, 0, 1), 0)
+
+
+def bench(func: Callable[[], NDArray[np.float32]], iterations: int, warmup: int) -> NDArray[np.float64]:
+    for _ in range(warmup):
+        func()
+    latencies = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs="+", default=[224, 256, 336, 384])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args()
+
+    lut = get_normalization_lut(MEAN, STD)
+    rng = np.random.default_rng(0)
+    for size in args.size:
+        img = Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+        out = np.empty((1, 3, size, size), dtype=np.float32)
+
+        def fused() -> NDArray[np.float32]:
+            return normalize_to_nchw(np.asarray(img), lut, out=out)
+
+        assert np.array_equal(chained(img), fused())
+        for name, func in [("chained", lambda: chained(img)), ("fused", fused)]:
+            latencies = bench(func, args.iterations, args.warmup)
+            print(
+                f"{size:>4} {name:<8} mean {latencies.mean():7.3f} ms | "
+                f"p50 {np.percentile(latencies, 50):7.3f} ms | p95 {np.percentile(latencies, 95):7.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
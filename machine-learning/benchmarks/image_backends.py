@@ -0,0 +1,75 @@
+"""
+Compares the Pillow and OpenCV image backends for decoding and CLIP-style resizing across formats and sizes.
+
+Usage: python -m benchmarks.image_backends --size 1440 4000 --format jpeg webp
+"""
+
+import argparse
+import time
+from io import BytesIO
+from typing import Callable
+
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+from immich_ml.models.transforms import crop_cv2, crop_pil, decode_image, resize_cv2, resize_pil
+from immich_ml.schemas import ImageBackend
+
+
+def make_image(size: int, format: str) -> bytes:
+    # smooth gradients with some noise compress more like photos than pure noise does
+    width, height = size, size * 3 // 4
+    x, y = np.meshgrid(np.linspace(0, 255, width), np.linspace(0, 255, height))
+    noise = np.random.default_rng(0).normal(0, 8, (height, width, 3))
+    pixels = np.clip(np.stack([x, y, (x + y) / 2], axis=-1) + noise, 0, 255).astype(np.uint8)
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, format=format)
+    return buf.getvalue()
+
+
+def clip_preprocess(image_bytes: bytes, backend: ImageBackend, size: int) -> Image.Image | NDArray[np.uint8]:
+    context = decode_image(image_bytes, (size, 0), backend)
+    if backend == ImageBackend.CV2:
+        return crop_cv2(resize_cv2(context.bgr((size, 0)), size), size)
+    return crop_pil(resize_pil(context.level((size, 0)), size), size)
+
+
+def bench(func: Callable[[], object], iterations: int, warmup: int) -> NDArray[np.float64]:
+    for _ in range(warmup):
+        func()
+    latencies = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs="+", default=[1440, 4000], help="longest side of the test images")
+    parser.add_argument("--format", nargs="+", default=["jpeg", "png", "webp"])
+    parser.add_argument("--clip-size", type=int, default=224)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    args = parser.parse_args()
+
+    for format in args.format:
+        for size in args.size:
+            image_bytes = make_image(size, format)
+            for backend in ImageBackend:
+                cases: dict[str, Callable[[], object]] = {
+                    "decode": lambda: decode_image(image_bytes, None, backend).bgr(),
+                    "clip": lambda: clip_preprocess(image_bytes, backend, args.clip_size),
+                }
+                for name, func in cases.items():
+                    latencies = bench(func, args.iterations, args.warmup)
+                    print(
+                        f"{format:<5} {size:>5} {backend:<4} {name:<6} mean {latencies.mean():8.2f} ms | "
+                        f"p50 {np.percentile(latencies, 50):8.2f} ms | p95 {np.percentile(latencies, 95):8.2f} ms"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Compares preparing OCR recognition batches with batched cv2 perspective warps and width buckets against the previous
+per-crop path of Pillow perspective transforms followed by RapidOCR's batching, resizing and normalization, on
+text-dense images. Model inference is left out, but the total size of the batches shows how much padding each path
+feeds the model.
+
+Usage: python -m benchmarks.ocr_crops --boxes 50 200
+"""
+
+import argparse
+import time
+from typing import Callable
+from unittest import mock
+
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+from rapidocr.ch_ppocr_rec import TextRecognizer as RapidTextRecognizer
+
+from immich_ml.models.ocr.recognition import TextRecognizer
+from immich_ml.models.transforms import pil_to_cv2
+
+REC_IMAGE_SHAPE = (3, 48, 320)
+
+
+def make_boxes(num_boxes: int, width: int, height: int) -> NDArray[np.float32]:
+    # slightly skewed lines of text in rows, like a document photo, with a few vertical boxes mixed in
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, width * 0.7, num_boxes)
+    y = rng.uniform(0, height * 0.95, num_boxes)
+    box_width = rng.uniform(40, width * 0.3, num_boxes)
+    box_height = rng.uniform(16, 40, num_boxes)
+    vertical = rng.random(num_boxes) < 0.1
+    box_width[vertical], box_height[vertical] = box_height[vertical], box_width[vertical] / 4
+    skew = rng.uniform(-0.05, 0.05, num_boxes) * box_width
+    boxes = np.stack(
+        [
+            np.stack([x, y], axis=1),
+            np.stack([x + box_width, y + skew], axis=1),
+            np.stack([x + box_width, y + skew + box_height], axis=1),
+            np.stack([x, y + box_height], axis=1),
+        ],
+        axis=1,
+    )
+    return boxes.astype(np.float32)
+
+
+def per_crop(
+    text_recognizer: TextRecognizer, rapid: RapidTextRecognizer, img: Image.Image, boxes: NDArray[np.float32]
+) -> list[NDArray[np.float32]]:
+    img_crop_width = np.maximum(
+        np.linalg.norm(boxes[:, 1] - boxes[:, 0], axis=1), np.linalg.norm(boxes[:, 2] - boxes[:, 3], axis=1)
+    ).astype(np.int32)
+    img_crop_height = np.maximum(
+        np.linalg.norm(boxes[:, 0] - boxes[:, 3], axis=1), np.linalg.norm(boxes[:, 1] - boxes[:, 2], axis=1)
+    ).astype(np.int32)
+    pts_std = np.zeros((img_crop_width.shape[0], 4, 2), dtype=np.float32)
+    pts_std[:, 1:3, 0] = img_crop_width[:, None]
+    pts_std[:, 2:4, 1] = img_crop_height[:, None]
+    all_coeffs = text_recognizer._get_perspective_transform(pts_std, boxes)
+    crops = []
+    for coeffs, dst_size in zip(all_coeffs, np.stack([img_crop_width, img_crop_height], axis=1)):
+        dst_img = img.transform(
+            size=tuple(dst_size),
+            method=Image.Transform.PERSPECTIVE,
+            data=tuple(coeffs),
+            resample=Image.Resampling.BICUBIC,
+        )
+        if dst_img.height / dst_img.width >= 1.5:
+            dst_img = dst_img.rotate(90, expand=True)
+        crops.append(pil_to_cv2(dst_img))
+
+    # RapidOCR's batching, minus inference
+    order = np.argsort([crop.shape[1] / crop.shape[0] for crop in crops])
+    batches = []
+    for start in range(0, len(order), rapid.rec_batch_num):
+        indices = order[start : start + rapid.rec_batch_num]
+        max_wh_ratio = max(
+            REC_IMAGE_SHAPE[2] / REC_IMAGE_SHAPE[1], *(crops[i].shape[1] / crops[i].shape[0] for i in indices)
+        )
+        batches.append(np.stack([rapid.resize_norm_img(crops[i], max_wh_ratio) for i in indices]))
+    return batches
+
+
+def batched(
+    text_recognizer: TextRecognizer, img: NDArray[np.uint8], boxes: NDArray[np.float32]
+) -> list[NDArray[np.float32]]:
+    batches: list[NDArray[np.float32]] = []
+
+    def session(batch: NDArray[np.float32]) -> NDArray[np.float32]:
+        batches.append(batch)
+        # only blanks, so decoding is as cheap as possible
+        preds = np.zeros((len(batch), batch.shape[3] // 8, len(text_recognizer.characters)), dtype=np.float32)
+        preds[:, :, 0] = 1.0
+        return preds
+
+    text_recognizer.session = mock.Mock(run=lambda output_names, input_feed: [session(input_feed["x"])])
+    text_recognizer._recognize(img, boxes)
+    return batches
+
+
+def bench(func: Callable[[], object], iterations: int, warmup: int) -> NDArray[np.float64]:
+    for _ in range(warmup):
+        func()
+    latencies = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[20, 50, 200], help="number of text boxes per image")
+    parser.add_argument("--size", type=int, default=2000, help="width of the test image")
+    parser.add_argument("--batch-size", type=int, default=6)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    args = parser.parse_args()
+
+    width, height = args.size, args.size * 4 // 3
+    bgr = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    pil = Image.fromarray(bgr[:, :, ::-1])
+    with mock.patch.object(TextRecognizer, "load"):
+        text_recognizer = TextRecognizer("PP-OCRv5_mobile")
+    text_recognizer.batch_size = args.batch_size
+    text_recognizer.characters = np.array(["blank", *"abcdefghijklmnopqrstuvwxyz", " "], dtype=object)
+    rapid = mock.Mock(rec_image_shape=REC_IMAGE_SHAPE, rec_batch_num=args.batch_size)
+    rapid.resize_norm_img = lambda img, max_wh_ratio: RapidTextRecognizer.resize_norm_img(rapid, img, max_wh_ratio)
+
+    for num_boxes in args.boxes:
+        boxes = make_boxes(num_boxes, width, height)
+        funcs: list[tuple[str, Callable[[], list[NDArray[np.float32]]]]] = [
+            ("per-crop", lambda: per_crop(text_recognizer, rapid, pil, boxes)),
+            ("batched", lambda: batched(text_recognizer, bgr, boxes)),
+        ]
+        for name, func in funcs:
+            latencies = bench(func, args.iterations, args.warmup)
+            megapixels = sum(batch.shape[0] * batch.shape[2] * batch.shape[3] for batch in func()) / 1e6
+            print(
+                f"{num_boxes:>4} boxes {name:<9} mean {latencies.mean():8.3f} ms | "
+                f"p50 {np.percentile(latencies, 50):8.3f} ms | p95 {np.percentile(latencies, 95):8.3f} ms | "
+                f"input {megapixels:6.2f} MP"
+            )
+
+
+if __name__ == "__main__":
+    main()
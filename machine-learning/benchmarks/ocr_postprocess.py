@@ -0,0 +1,87 @@
+"""
+Compares the in-tree DB post-processing for OCR detection against RapidOCR's on synthetic probability maps with
+lines of words, from a few words to a text-dense page. Model inference is left out. The number of boxes each finds
+and the largest difference between their boxes are reported alongside the latency.
+
+Usage: python -m benchmarks.ocr_postprocess --lines 2 30 --rotated 0.2
+"""
+
+import argparse
+import time
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+from rapidocr.ch_ppocr_det.utils import DBPostProcess as RapidDBPostProcess
+
+from immich_ml.models.ocr.postprocess import DBPostProcess
+
+# the settings used by the OCR detection model
+KWARGS: dict[str, Any] = {
+    "thresh": 0.3,
+    "box_thresh": 0.5,
+    "unclip_ratio": 1.6,
+    "use_dilation": True,
+    "score_mode": "fast",
+}
+
+
+def make_prob_map(lines: int, rotated: float, height: int, width: int) -> NDArray[np.float32]:
+    rng = np.random.default_rng(0)
+    prob = np.zeros((height, width), dtype=np.float32)
+    for y in np.linspace(8, height - 20, lines).astype(int).tolist():
+        x = 5
+        while x < width - 50:
+            word_width = int(rng.uniform(12, 70))
+            score = rng.uniform(0.4, 1.0)
+            if rng.random() < rotated:
+                rect = ((x + word_width / 2, y + 6), (word_width, 10), rng.uniform(-8, 8))
+                cv2.fillPoly(prob, [cv2.boxPoints(rect).astype(np.int32)], score)
+            else:
+                prob[y : y + 11, x : x + word_width] = score
+            x += word_width + int(rng.uniform(6, 20))
+    return cv2.GaussianBlur(prob, (3, 3), 0.8)[None, None]  # type: ignore
+
+
+def bench(func: Callable[[], object], iterations: int, warmup: int) -> NDArray[np.float64]:
+    for _ in range(warmup):
+        func()
+    latencies = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 5, 30], help="number of lines of text")
+    parser.add_argument("--rotated", type=float, default=0.0, help="fraction of words that are slightly rotated")
+    parser.add_argument("--size", type=int, nargs=2, default=[736, 992], metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    args = parser.parse_args()
+
+    height, width = args.size
+    # boxes are scaled to the original image, which is usually larger than the model input
+    ori_shape = (height * 2, width * 2)
+    rapid, in_tree = RapidDBPostProcess(**KWARGS), DBPostProcess(**KWARGS)
+    for lines in args.lines:
+        prob = make_prob_map(lines, args.rotated, height, width)
+        expected, _ = rapid(prob, ori_shape)
+        boxes, _ = in_tree(prob, ori_shape)
+        diff = f"{np.abs(boxes - expected).max():.0f} px" if len(boxes) == len(expected) else "n/a"
+        funcs: list[tuple[str, Callable[..., object]]] = [("rapidocr", rapid), ("in-tree", in_tree)]
+        for name, func in funcs:
+            latencies = bench(lambda: func(prob, ori_shape), args.iterations, args.warmup)
+            print(
+                f"{lines:>3} lines {name:<8} mean {latencies.mean():8.3f} ms | "
+                f"p50 {np.percentile(latencies, 50):8.3f} ms | p95 {np.percentile(latencies, 95):8.3f} ms"
+            )
+        print(f"{lines:>3} lines {len(expected)} vs {len(boxes)} boxes, max difference {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares OCR detection preprocessing with a uint8 OpenCV resize and normalization lookup into a reused input buffer
+against the previous path of a Pillow Lanczos resize followed by float32 color conversion, normalization and
+transposition. Both paths start from a decoded image, and the mean difference between their outputs is reported
+in gray levels.
+
+Usage: python -m benchmarks.ocr_preprocess --size 1440 4032
+"""
+
+import argparse
+import time
+from typing import Callable
+from unittest import mock
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+from immich_ml.models.ocr.detection import TextDetector
+from immich_ml.models.transforms import ImageContext
+
+
+def previous(text_detector: TextDetector, context: ImageContext) -> NDArray[np.float32]:
+    img = context.level(text_detector.min_image_size)
+    ratio = min(float(text_detector.max_resolution) / min(img.height, img.width), 1.0)
+    resize_h = int(round(int(img.height * ratio) / 32) * 32)
+    resize_w = int(round(int(img.width * ratio) / 32) * 32)
+    resized_img = img.resize((resize_w, resize_h), resample=Image.Resampling.LANCZOS)
+    img_np: NDArray[np.float32] = cv2.cvtColor(np.array(resized_img, dtype=np.float32), cv2.COLOR_RGB2BGR)  # type: ignore
+    img_np -= text_detector.mean
+    img_np *= text_detector.std_inv
+    # the session copies non-contiguous inputs
+    return np.ascontiguousarray(np.expand_dims(np.transpose(img_np, (2, 0, 1)), axis=0))
+
+
+def optimized(text_detector: TextDetector, context: ImageContext) -> NDArray[np.float32]:
+    return text_detector._to_input(text_detector._resize(context, text_detector.max_resolution)[None])
+
+
+def bench(func: Callable[[], object], iterations: int, warmup: int) -> NDArray[np.float64]:
+    for _ in range(warmup):
+        func()
+    latencies = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs="+", default=[1080, 2048, 4032], help="width of the test image")
+    parser.add_argument("--max-resolution", type=int, default=736)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    with mock.patch.object(TextDetector, "load"):
+        text_detector = TextDetector("PP-OCRv5_mobile")
+    text_detector.max_resolution = args.max_resolution
+
+    for size in args.size:
+        # smooth gradients with some sharp edges, so the resampling filters differ like they would on a photo
+        x, y = np.meshgrid(np.arange(size), np.arange(size * 3 // 4))
+        rgb = np.stack([x * 255 // size, y * 255 // (size * 3 // 4), ((x // 16 + y // 16) % 2) * 255], axis=-1)
+        context = ImageContext(Image.fromarray(rgb.astype(np.uint8)))
+        # levels are cached by the context, so both paths start from an already converted image
+        context.bgr(text_detector.min_image_size)
+
+        diff = np.abs(previous(text_detector, context) - optimized(text_detector, context)).mean() * 127.5
+        for name, func in [("previous", previous), ("optimized", optimized)]:
+            latencies = bench(lambda: func(text_detector, context), args.iterations, args.warmup)
+            print(
+                f"{size:>5} {name:<9} mean {latencies.mean():8.3f} ms | "
+                f"p50 {np.percentile(latencies, 50):8.3f} ms | p95 {np.percentile(latencies, 95):8.3f} ms"
+            )
+        print(f"{size:>5} mean difference {diff:.3f} gray levels")
+
+
+if __name__ == "__main__":
+    main()
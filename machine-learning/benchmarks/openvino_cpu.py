@@ -0,0 +1,87 @@
+"""
+Compares the OpenVINO CPU device against the default CPU execution provider for a model.
+
+Usage: python -m benchmarks.openvino_cpu ViT-B-32__openai --task clip --type visual
+"""
+
+import argparse
+import time
+from typing import Any
+
+import numpy as np
+import onnxruntime as ort
+from numpy.typing import NDArray
+
+from immich_ml.config import settings
+from immich_ml.models import from_model_type
+from immich_ml.schemas import ModelFormat, ModelPrecision, ModelTask, ModelType
+from immich_ml.sessions.ort import OrtSession
+
+DTYPES: dict[str, type[np.generic]] = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(int32)": np.int32,
+    "tensor(int64)": np.int64,
+}
+
+
+def make_inputs(session: OrtSession, batch_size: int, size: int) -> dict[str, NDArray[Any]]:
+    inputs: dict[str, NDArray[Any]] = {}
+    for node in session.session.get_inputs():
+        # the first axis is the batch axis, any other dynamic axes are spatial
+        shape = [dim if isinstance(dim, int) else batch_size if i == 0 else size for i, dim in enumerate(node.shape)]
+        dtype = DTYPES[node.type]
+        if np.issubdtype(dtype, np.integer):
+            inputs[node.name] = np.random.randint(0, 100, size=shape).astype(dtype)
+        else:
+            inputs[node.name] = np.random.rand(*shape).astype(dtype)
+    return inputs
+
+
+def bench(session: OrtSession, inputs: dict[str, NDArray[Any]], iterations: int, warmup: int) -> NDArray[np.float64]:
+    for _ in range(warmup):
+        session.run(None, inputs)
+    latencies = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        session.run(None, inputs)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model_name")
+    parser.add_argument("--task", type=ModelTask, default=ModelTask.SEARCH)
+    parser.add_argument("--type", type=ModelType, default=ModelType.VISUAL)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--size", type=int, default=640, help="length of dynamic non-batch axes")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--precision", type=ModelPrecision, default=ModelPrecision.FP32)
+    args = parser.parse_args()
+
+    if "OpenVINOExecutionProvider" not in ort.get_available_providers():
+        parser.error("OpenVINOExecutionProvider is not available, install the `openvino` extra first")
+
+    model = from_model_type(args.model_name, args.type, args.task, model_format=ModelFormat.ONNX)
+    model.download()
+
+    settings.openvino_cpu = True
+    settings.openvino_precision = args.precision
+    inputs = None
+    for provider in ["CPUExecutionProvider", "OpenVINOExecutionProvider"]:
+        # the first OpenVINO load includes compilation, subsequent ones read from the model cache
+        start = time.perf_counter()
+        session = OrtSession(model.model_path, providers=[provider])
+        load_ms = (time.perf_counter() - start) * 1000
+        inputs = inputs if inputs is not None else make_inputs(session, args.batch_size, args.size)
+        latencies = bench(session, inputs, args.iterations, args.warmup)
+        print(
+            f"{provider:<26} load {load_ms:8.1f} ms | mean {latencies.mean():7.2f} ms | "
+            f"p50 {np.percentile(latencies, 50):7.2f} ms | p95 {np.percentile(latencies, 95):7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
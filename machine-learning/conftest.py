@@ -1,8 +1,10 @@
 import json
+from pathlib import Path
 from typing import Any, Iterator
 from unittest import mock
 
 import numpy as np
+import onnx
 import pytest
 from fastapi.testclient import TestClient
 from numpy.typing import NDArray
@@ -22,6 +24,36 @@ def cv_image(pil_image: Image.Image) -> NDArray[np.float32]:
     return np.asarray(pil_image)[:, :, ::-1]  # PIL uses RGB while cv2 uses BGR
 
 
+@pytest.fixture
+def matmul_model(tmp_path: Path) -> Path:
+    weights = np.random.rand(64, 32).astype(np.float32)
+    graph = onnx.helper.make_graph(
+        [onnx.helper.make_node("MatMul", ["input", "weights"], ["output"])],
+        "matmul",
+        [onnx.helper.make_tensor_value_info("input", onnx.TensorProto.FLOAT, ["batch", 64])],
+        [onnx.helper.make_tensor_value_info("output", onnx.TensorProto.FLOAT, ["batch", 32])],
+        [onnx.numpy_helper.from_array(weights, "weights")],
+    )
+    model_path = tmp_path / "textual" / "model.onnx"
+    model_path.parent.mkdir()
+    onnx.save(onnx.helper.make_model(graph, opset_imports=[onnx.helper.make_opsetid("", 17)], ir_version=9), model_path)
+    return model_path
+
+
+@pytest.fixture
+def identity_image_model(tmp_path: Path) -> Path:
+    graph = onnx.helper.make_graph(
+        [onnx.helper.make_node("Identity", ["image"], ["output"])],
+        "identity",
+        [onnx.helper.make_tensor_value_info("image", onnx.TensorProto.FLOAT, ["batch", 3, "height", "width"])],
+        [onnx.helper.make_tensor_value_info("output", onnx.TensorProto.FLOAT, ["batch", 3, "height", "width"])],
+    )
+    model_path = tmp_path / "visual" / "model.onnx"
+    model_path.parent.mkdir()
+    onnx.save(onnx.helper.make_model(graph, opset_imports=[onnx.helper.make_opsetid("", 17)], ir_version=9), model_path)
+    return model_path
+
+
 @pytest.fixture
 def mock_get_model() -> Iterator[mock.Mock]:
     with mock.patch("immich_ml.models.cache.from_model_type", autospec=True) as mocked:
@@ -13,7 +13,7 @@ from rich.logging import RichHandler
 from uvicorn import Server
 from uvicorn.workers import UvicornWorker
 
-from .schemas import ModelPrecision
+from .schemas import ImageBackend, ModelPrecision
 
 
 class ClipSettings(BaseModel):
@@ -48,6 +48,7 @@ class PreloadModelData(BaseModel):
 
 
 class MaxBatchSize(BaseModel):
+    face_detection: int | None = None
     facial_recognition: int | None = None
     text_recognition: int | None = None
 
@@ -71,14 +72,23 @@ class Settings(BaseSettings):
     model_inter_op_threads: int = 0
     model_intra_op_threads: int = 0
     model_arena: bool = True
+    model_mmap: bool = False
+    model_arena_shrink_threshold_mb: int = 0
+    model_arena_shrink_interval_s: int = 0
+    model_uint8_input: bool = False
     ann: bool = True
     ann_fp16_turbo: bool = False
     ann_tuning_level: int = 2
     rknn: bool = True
     rknn_threads: int = 1
+    session_backend: str | None = None
+    synthetic_latency_ms: int = 0
     preload: PreloadModelData | None = None
     max_batch_size: MaxBatchSize | None = None
     openvino_precision: ModelPrecision = ModelPrecision.FP32
+    openvino_cpu: bool = False
+    image_backend: ImageBackend = ImageBackend.PIL
+    ocr_detection_buckets: list[int] = []
 
     @property
     def device_id(self) -> str:
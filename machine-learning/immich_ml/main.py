@@ -20,7 +20,7 @@ from starlette.formparsers import MultiPartParser
 
 from immich_ml.models import get_model_deps
 from immich_ml.models.base import InferenceModel
-from immich_ml.models.transforms import decode_pil
+from immich_ml.models.transforms import ImageContext, decode_image
 
 from .config import PreloadModelData, log, settings
 from .models.cache import ModelCache
@@ -183,7 +183,7 @@ async def predict(
     text: str | None = Form(default=None),
 ) -> Any:
     if image is not None:
-        inputs: Image | str = await run(lambda: decode_pil(image))
+        inputs: bytes | str = image
     elif text is not None:
         inputs = text
     else:
@@ -192,14 +192,21 @@ async def predict(
     return ORJSONResponse(response)
 
 
-async def run_inference(payload: Image | str, entries: InferenceEntries) -> InferenceResponse:
+async def run_inference(payload: bytes | Image | ImageContext | str, entries: InferenceEntries) -> InferenceResponse:
     outputs: dict[ModelIdentity, Any] = {}
     response: InferenceResponse = {}
 
-    async def _run_inference(entry: InferenceEntry) -> None:
+    async def _get_model(entry: InferenceEntry) -> InferenceModel:
         model = await model_cache.get(
             entry["name"], entry["type"], entry["task"], ttl=settings.model_ttl, **entry["options"]
         )
+        model = await load(model)
+        # options like the max resolution decide how small the image can be decoded, so they're applied beforehand
+        if entry["options"]:
+            model.configure(**entry["options"])
+        return model
+
+    async def _run_inference(entry: InferenceEntry, model: InferenceModel) -> None:
         inputs = [payload]
         for dep in model.depends:
             try:
@@ -207,21 +214,41 @@ async def run_inference(payload: Image | str, entries: InferenceEntries) -> Infe
             except KeyError:
                 message = f"Task {entry['task']} of type {entry['type']} depends on output of {dep}"
                 raise HTTPException(400, message)
-        model = await load(model)
         output = await run(model.predict, *inputs, **entry["options"])
         outputs[model.identity] = output
         response[entry["task"]] = output
 
     without_deps, with_deps = entries
-    await asyncio.gather(*[_run_inference(entry) for entry in without_deps])
+    # models are loaded before decoding so the image is only decoded at the resolution they need
+    models = await asyncio.gather(*[_get_model(entry) for entry in without_deps + with_deps])
+    # the decoded image is shared between models so they can reuse each other's downscaled and converted images
+    if isinstance(payload, bytes):
+        payload = await run(decode_image, payload, get_min_image_size(models), settings.image_backend)
+    elif isinstance(payload, Image):
+        payload = ImageContext(payload)
+    await asyncio.gather(*[_run_inference(entry, model) for entry, model in zip(without_deps, models)])
     if with_deps:
-        await asyncio.gather(*[_run_inference(entry) for entry in with_deps])
-    if isinstance(payload, Image):
+        await asyncio.gather(
+            *[_run_inference(entry, model) for entry, model in zip(with_deps, models[len(without_deps) :])]
+        )
+    if isinstance(payload, ImageContext):
         response["imageHeight"], response["imageWidth"] = payload.height, payload.width
 
     return response
 
 
+def get_min_image_size(models: list[InferenceModel]) -> tuple[int, int] | None:
+    """Returns the smallest image size that satisfies every model, or None if the image must be decoded in full."""
+    if not models:
+        return None
+    min_size = (0, 0)
+    for model in models:
+        if (size := model.min_image_size) is None:
+            return None
+        min_size = max(min_size[0], size[0]), max(min_size[1], size[1])
+    return min_size
+
+
 async def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
     if thread_pool is None:
         return func(*args, **kwargs)
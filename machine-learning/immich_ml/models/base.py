@@ -1,19 +1,22 @@
 from __future__ import annotations
 
+import hashlib
 from abc import ABC, abstractmethod
 from pathlib import Path
 from shutil import rmtree
-from typing import Any, ClassVar
+from typing import Any, ClassVar, Sequence
 
+import numpy as np
+import onnx
 from huggingface_hub import snapshot_download
+from numpy.typing import NDArray
 
 import immich_ml.sessions.ann.loader
 import immich_ml.sessions.rknn as rknn
-from immich_ml.sessions.ort import OrtSession
+from immich_ml.sessions.registry import SessionBackend, get_session_backend, get_session_backends
 
 from ..config import clean_name, log, settings
 from ..schemas import ModelFormat, ModelIdentity, ModelSession, ModelTask, ModelType
-from ..sessions.ann import AnnSession
 
 
 class InferenceModel(ABC):
@@ -72,6 +75,17 @@ class InferenceModel(ABC):
             ModelFormat.RKNN: ["*.armnn"],
         }
 
+        if not self.session_backend.needs_model_file:
+            # only download configs, tokenizers, etc.
+            snapshot_download(
+                f"immich-app/{clean_name(self.model_name)}",
+                cache_dir=self.cache_dir,
+                local_dir=self.cache_dir,
+                allow_patterns=["*.json", "*.txt"],
+            )
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+            return
+
         snapshot_download(
             f"immich-app/{clean_name(self.model_name)}",
             cache_dir=self.cache_dir,
@@ -105,19 +119,89 @@ class InferenceModel(ABC):
         self.cache_dir.mkdir(parents=True, exist_ok=True)
 
     def _make_session(self, model_path: Path) -> ModelSession:
-        if not model_path.is_file():
+        if settings.session_backend is not None:
+            backend: SessionBackend | None = get_session_backend(settings.session_backend)
+        else:
+            backend = get_session_backends().get(model_path.suffix.removeprefix("."))
+
+        if (backend is None or backend.needs_model_file) and not model_path.is_file():
             raise FileNotFoundError(f"Model file not found: {model_path}")
+        if backend is None:
+            raise ValueError(f"Unsupported model file type: {model_path.suffix}")
+        return backend.factory(model_path)
 
-        match model_path.suffix:
-            case ".armnn":
-                session: ModelSession = AnnSession(model_path)
-            case ".onnx":
-                session = OrtSession(model_path)
-            case ".rknn":
-                session = rknn.RknnSession(model_path)
-            case _:
-                raise ValueError(f"Unsupported model file type: {model_path.suffix}")
-        return session
+    def _make_uint8_session(
+        self,
+        mean: Sequence[float] | NDArray[np.float32],
+        std: Sequence[float] | NDArray[np.float32],
+        swap_rb: bool = False,
+    ) -> ModelSession:
+        """
+        Creates a session for a cached copy of the ONNX model that takes raw uint8 NHWC images instead of normalized
+        float32 NCHW tensors. `mean` and `std` are per channel in pixel units, i.e. the input is `(x - mean) / std`.
+        """
+        # the copy is keyed on the preprocessing it bakes in, so changing it doesn't reuse an outdated copy
+        key = np.concatenate([np.asarray(mean, dtype=np.float32), np.asarray(std, dtype=np.float32), [swap_rb]])
+        digest = hashlib.sha1(key.astype(np.float32).tobytes(), usedforsecurity=False).hexdigest()[:8]
+        uint8_model_path = self.model_dir / f"model.uint8.{digest}.onnx"
+        # and stamped with the source so that it's rebuilt when the model is rewritten, e.g. to add a batch axis
+        stat = self.model_path.stat()
+        source = f"{stat.st_size} {stat.st_mtime_ns}"
+        source_path = uint8_model_path.with_name(f"{uint8_model_path.name}.source")
+        if not (uint8_model_path.is_file() and source_path.is_file() and source_path.read_text() == source):
+            self._add_uint8_input(self.model_path, uint8_model_path, mean, std, swap_rb)
+            source_path.write_text(source)
+        return self._make_session(uint8_model_path)
+
+    def _add_uint8_input(
+        self,
+        model_path: Path,
+        output_path: Path,
+        mean: Sequence[float] | NDArray[np.float32],
+        std: Sequence[float] | NDArray[np.float32],
+        swap_rb: bool,
+    ) -> None:
+        log.debug(f"Adding uint8 input to model {model_path}")
+        # external data is left in place, so the copy references the same weights file as the original
+        proto = onnx.load(model_path, load_external_data=False)
+        graph = proto.graph
+        name = graph.input[0].name
+        batch, channels, height, width = (
+            dim.dim_param if dim.HasField("dim_param") else dim.dim_value
+            for dim in graph.input[0].type.tensor_type.shape.dim
+        )
+        for node in graph.node:
+            node.input[:] = [f"{name}_normalized" if node_input == name else node_input for node_input in node.input]
+
+        pixels = f"{name}_float"
+        nodes = [onnx.helper.make_node("Cast", [name], [pixels], to=onnx.TensorProto.FLOAT)]
+        initializers = [
+            onnx.numpy_helper.from_array(np.asarray(mean, dtype=np.float32), f"{name}_mean"),
+            onnx.numpy_helper.from_array(np.float32(1.0) / np.asarray(std, dtype=np.float32), f"{name}_std_inv"),
+        ]
+        if swap_rb:
+            initializers.append(onnx.numpy_helper.from_array(np.array([2, 1, 0], dtype=np.int64), f"{name}_bgr"))
+            nodes.append(onnx.helper.make_node("Gather", [pixels, f"{name}_bgr"], [f"{name}_swapped"], axis=3))
+            pixels = f"{name}_swapped"
+        nodes += [
+            onnx.helper.make_node("Sub", [pixels, f"{name}_mean"], [f"{name}_centered"]),
+            onnx.helper.make_node("Mul", [f"{name}_centered", f"{name}_std_inv"], [f"{name}_scaled"]),
+            onnx.helper.make_node("Transpose", [f"{name}_scaled"], [f"{name}_normalized"], perm=[0, 3, 1, 2]),
+        ]
+        uint8_input = onnx.helper.make_tensor_value_info(name, onnx.TensorProto.UINT8, [batch, height, width, channels])
+
+        inputs = [uint8_input, *graph.input[1:]]
+        del graph.input[:]
+        graph.input.extend(inputs)
+        all_nodes = [*nodes, *graph.node]
+        del graph.node[:]
+        graph.node.extend(all_nodes)
+        graph.initializer.extend(initializers)
+
+        # written to a temporary file first so an interrupted write isn't mistaken for a cached model
+        tmp_path = output_path.with_suffix(".tmp")
+        onnx.save(proto, tmp_path)
+        tmp_path.replace(output_path)
 
     def model_path_for_format(self, model_format: ModelFormat) -> Path:
         model_path_prefix = rknn.model_prefix if model_format == ModelFormat.RKNN else None
@@ -125,6 +209,23 @@ class InferenceModel(ABC):
             return self.model_dir / model_path_prefix / f"model.{model_format}"
         return self.model_dir / f"model.{model_format}"
 
+    @property
+    def min_image_size(self) -> tuple[int, int] | None:
+        """
+        The smallest (shortest side, longest side) an input image can be decoded at without affecting the output,
+        or None if the model needs the image at full resolution.
+        """
+        return None
+
+    @property
+    def uint8_input(self) -> bool:
+        """Whether the model takes raw uint8 NHWC images, with normalization and layout conversion in the graph."""
+        return (
+            settings.model_uint8_input
+            and self.model_format == ModelFormat.ONNX
+            and settings.session_backend in (None, ModelFormat.ONNX)
+        )
+
     @property
     def model_dir(self) -> Path:
         return self.cache_dir / self.model_type.value
@@ -155,8 +256,14 @@ class InferenceModel(ABC):
 
     @property
     def cached(self) -> bool:
+        if not self.session_backend.needs_model_file:
+            return self.model_dir.is_dir()
         return self.model_path.is_file()
 
+    @property
+    def session_backend(self) -> SessionBackend:
+        return get_session_backend(settings.session_backend or self.model_format)
+
     @property
     def model_format(self) -> ModelFormat:
         return self._model_format
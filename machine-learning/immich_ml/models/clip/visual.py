@@ -1,4 +1,5 @@
 import json
+import threading
 from abc import abstractmethod
 from functools import cached_property
 from pathlib import Path
@@ -11,28 +12,37 @@ from PIL import Image
 from immich_ml.config import log
 from immich_ml.models.base import InferenceModel
 from immich_ml.models.transforms import (
+    ImageContext,
+    crop_cv2,
     crop_pil,
     decode_pil,
+    get_normalization_lut,
     get_pil_resampling,
-    normalize,
+    normalize_to_nchw,
+    resize_cv2,
     resize_pil,
     serialize_np_array,
-    to_numpy,
 )
-from immich_ml.schemas import ModelSession, ModelTask, ModelType
+from immich_ml.schemas import ImageBackend, ModelSession, ModelTask, ModelType
 
 
 class BaseCLIPVisualEncoder(InferenceModel):
     depends = []
     identity = (ModelType.VISUAL, ModelTask.SEARCH)
 
-    def _predict(self, inputs: Image.Image | bytes) -> str:
-        image = decode_pil(inputs)
+    def _predict(self, inputs: Image.Image | ImageContext | bytes) -> str:
+        image: Image.Image | NDArray[np.uint8]
+        if isinstance(inputs, ImageContext):
+            # resample with the backend the image was decoded with
+            use_cv2 = inputs.backend == ImageBackend.CV2
+            image = inputs.bgr(self.min_image_size) if use_cv2 else inputs.level(self.min_image_size)
+        else:
+            image = decode_pil(inputs)
         res: NDArray[np.float32] = self.session.run(None, self.transform(image))[0][0]
         return serialize_np_array(res)
 
     @abstractmethod
-    def transform(self, image: Image.Image) -> dict[str, NDArray[np.float32]]:
+    def transform(self, image: Image.Image | NDArray[np.uint8]) -> dict[str, NDArray[np.float32]]:
         pass
 
     @property
@@ -66,12 +76,32 @@ class OpenClipVisualEncoder(BaseCLIPVisualEncoder):
         self.resampling = get_pil_resampling(self.preprocess_cfg["interpolation"])
         self.mean = np.array(self.preprocess_cfg["mean"], dtype=np.float32)
         self.std = np.array(self.preprocess_cfg["std"], dtype=np.float32)
+        self.lut = get_normalization_lut(self.mean, self.std)
+        # models can be called from several threads at once, so each thread gets its own input buffer
+        self.buffers = threading.local()
 
+        if self.uint8_input:
+            return self._make_uint8_session(self.mean * 255, self.std * 255)
         return super()._load()
 
-    def transform(self, image: Image.Image) -> dict[str, NDArray[np.float32]]:
-        image = resize_pil(image, self.size)
-        image = crop_pil(image, self.size)
-        image_np = to_numpy(image)
-        image_np = normalize(image_np, self.mean, self.std)
-        return {"image": np.expand_dims(image_np.transpose(2, 0, 1), 0)}
+    @property
+    def min_image_size(self) -> tuple[int, int] | None:
+        return self.size, 0
+
+    def transform(self, image: Image.Image | NDArray[np.uint8]) -> dict[str, NDArray[np.float32]]:
+        if isinstance(image, np.ndarray):
+            # BGR array from the cv2 image backend
+            image_np = crop_cv2(resize_cv2(image, self.size), self.size)[..., ::-1]
+        else:
+            image = crop_pil(resize_pil(image, self.size), self.size)
+            image_np = np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+        if self.uint8_input:
+            return {"image": np.ascontiguousarray(np.expand_dims(image_np, 0))}
+        return {"image": normalize_to_nchw(image_np, self.lut, out=self._input_buffer)}
+
+    @property
+    def _input_buffer(self) -> NDArray[np.float32]:
+        buffer: NDArray[np.float32] | None = getattr(self.buffers, "image", None)
+        if buffer is None:
+            buffer = self.buffers.image = np.empty((1, 3, self.size, self.size), dtype=np.float32)
+        return buffer
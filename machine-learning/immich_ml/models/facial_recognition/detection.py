@@ -1,41 +1,247 @@
+import threading
+from concurrent.futures import Future
+from math import ceil
+from pathlib import Path
 from typing import Any
 
+import cv2
 import numpy as np
+import onnx
 from insightface.model_zoo import RetinaFace
 from numpy.typing import NDArray
 
+from immich_ml.config import log, settings
 from immich_ml.models.base import InferenceModel
-from immich_ml.models.transforms import decode_cv2
-from immich_ml.schemas import FaceDetectionOutput, ModelSession, ModelTask, ModelType
+from immich_ml.models.transforms import ImageContext, decode_cv2
+from immich_ml.schemas import FaceDetectionOutput, ModelFormat, ModelSession, ModelTask, ModelType
+
+Detections = tuple[NDArray[np.float32], NDArray[np.float32]]
+
+# the shorter side of dynamic input sizes is rounded up to a multiple of this, which limits the number of distinct
+# shapes the session sees and lets it reuse its allocations; it must be a multiple of the largest feature stride
+_SHAPE_BUCKET = 64
+
+# RetinaFace's input normalization, in pixel units
+_INPUT_MEAN = 127.5
+_INPUT_STD = 128.0
 
 
 class FaceDetector(InferenceModel):
     depends = []
     identity = (ModelType.DETECTION, ModelTask.FACIAL_RECOGNITION)
+    dynamic_input = False
 
-    def __init__(self, model_name: str, min_score: float = 0.7, **model_kwargs: Any) -> None:
+    def __init__(self, model_name: str, min_score: float = 0.7, max_resolution: int = 640, **model_kwargs: Any) -> None:
         self.min_score = model_kwargs.pop("minScore", min_score)
+        self.max_resolution = model_kwargs.pop("maxResolution", max_resolution)
         super().__init__(model_name, **model_kwargs)
+        max_batch_size = settings.max_batch_size.face_detection if settings.max_batch_size else None
+        self.batch_size = max_batch_size if max_batch_size and self._supports_batching else 1
+        # images waiting to be detected, which are run together by whichever caller gets the batch lock
+        self.pending: list[tuple[NDArray[np.uint8], Future[Detections]]] = []
+        self.pending_lock = threading.Lock()
+        self.batch_lock = threading.Lock()
 
     def _load(self) -> ModelSession:
+        if self.uint8_input:
+            return self._load_uint8()
         session = self._make_session(self.model_path)
-        self.model = RetinaFace(session=session)
-        self.model.prepare(ctx_id=0, det_thresh=self.min_score, input_size=(640, 640))
+        if (
+            self.model_format == ModelFormat.ONNX
+            and self.batch_size > 1
+            and str(session.get_inputs()[0].shape[0]) != "batch"
+        ):
+            self._add_batch_axis(self.model_path)
+            session = self._make_session(self.model_path)
+        self._init_model(RetinaFace(session=session))
+        return session
 
+    def _load_uint8(self) -> ModelSession:
+        if self.batch_size > 1:
+            # only the graph is needed to check the batch axis, not the weights
+            proto = onnx.load(self.model_path, load_external_data=False)
+            if proto.graph.input[0].type.tensor_type.shape.dim[0].dim_param != "batch":
+                self._add_batch_axis(self.model_path)
+        session = self._make_uint8_session([_INPUT_MEAN] * 3, [_INPUT_STD] * 3, swap_rb=True)
+        model = RetinaFace(session=session)
+        # RetinaFace reads the input size as NCHW, but the uint8 input is NHWC
+        height, width = session.get_inputs()[0].shape[1:3]
+        model.input_size = None if isinstance(width, str) else (width, height)
+        self._init_model(model)
         return session
 
-    def _predict(self, inputs: NDArray[np.uint8] | bytes) -> FaceDetectionOutput:
-        inputs = decode_cv2(inputs)
+    def _init_model(self, model: RetinaFace) -> None:
+        self.model = model
+        # models with symbolic height and width can take inputs that follow the aspect ratio of the image
+        self.dynamic_input = self.model.input_size is None
+        self.model.prepare(ctx_id=0, det_thresh=self.min_score, input_size=(640, 640))
+        self.anchors: dict[tuple[int, int], tuple[NDArray[np.float32], NDArray[np.float32]]] = {}
 
-        bboxes, landmarks = self._detect(inputs)
+    @property
+    def _supports_batching(self) -> bool:
+        # RKNN models have a static batch size, but the session splits larger batches across NPU cores
+        return self.model_format in (ModelFormat.ONNX, ModelFormat.RKNN)
+
+    @property
+    def min_image_size(self) -> tuple[int, int] | None:
+        # the image is scaled to fit inside the input size
+        if self.dynamic_input:
+            return 0, _round_up(self.max_resolution, _SHAPE_BUCKET)
+        return 0, max(self.model.input_size)
+
+    def _predict(self, inputs: NDArray[np.uint8] | bytes | ImageContext) -> FaceDetectionOutput:
+        if isinstance(inputs, ImageContext):
+            image = inputs.bgr(self.min_image_size)
+            scale = inputs.width / image.shape[1]
+        else:
+            image, scale = decode_cv2(inputs), 1.0
+
+        bboxes, landmarks = self._detect(image)
+        if scale != 1.0:
+            # map back to the coordinates of the full image
+            bboxes[:, :4] *= scale
+            landmarks *= scale
         return {
             "boxes": bboxes[:, :4].round(),
             "scores": bboxes[:, 4],
             "landmarks": landmarks,
         }
 
-    def _detect(self, inputs: NDArray[np.uint8] | bytes) -> tuple[NDArray[np.float32], NDArray[np.float32]]:
-        return self.model.detect(inputs)  # type: ignore
+    def _detect(self, inputs: NDArray[np.uint8]) -> Detections:
+        if self.batch_size <= 1:
+            return self._detect_batch([inputs])[0]
+
+        future: Future[Detections] = Future()
+        with self.pending_lock:
+            self.pending.append((inputs, future))
+        # images queued by other requests while a batch runs are picked up together by the next caller
+        while not future.done():
+            with self.batch_lock:
+                if future.done():
+                    break
+                with self.pending_lock:
+                    batch, self.pending = self.pending[: self.batch_size], self.pending[self.batch_size :]
+                try:
+                    results = self._detect_batch([image for image, _ in batch])
+                except Exception as e:
+                    for _, pending in batch:
+                        pending.set_exception(e)
+                    continue
+                for (_, pending), result in zip(batch, results):
+                    pending.set_result(result)
+        return future.result()
+
+    # adapted from insightface's RetinaFace, with anchors cached per input size and decoding limited to candidates
+    def _detect_batch(self, images: list[NDArray[np.uint8]]) -> list[Detections]:
+        """Letterboxes the images into one batch that fits all of them, runs it once and decodes each image."""
+        sizes = [self._input_size(*image.shape[:2]) for image in images]
+        input_size = max(width for width, _ in sizes), max(height for _, height in sizes)
+        resized = [self._resize(image, input_size) for image in images]
+        det_imgs = [det_img for det_img, _ in resized]
+        if self.uint8_input:
+            # the session normalizes the letterboxed BGR images itself
+            outputs = self.session.run(self.model.output_names, {self.model.input_name: np.stack(det_imgs)})
+        else:
+            blob: NDArray[np.float32] = cv2.dnn.blobFromImages(  # type: ignore[assignment]
+                det_imgs,
+                1.0 / self.model.input_std,
+                det_imgs[0].shape[1::-1],
+                (self.model.input_mean, self.model.input_mean, self.model.input_mean),
+                swapRB=True,
+            )
+            outputs = self.session.run(self.model.output_names, {self.model.input_name: blob})
+        # depending on the model, the outputs are either batched or flattened across the batch in image order
+        outputs = [output.reshape(len(images), -1, output.shape[-1]) for output in outputs]
+        return [
+            self._postprocess([output[i] for output in outputs], det_imgs[i].shape[:2], det_scale)
+            for i, (_, det_scale) in enumerate(resized)
+        ]
+
+    def _input_size(self, height: int, width: int) -> tuple[int, int]:
+        """
+        Returns the (width, height) to run the model at. Dynamic models get the aspect ratio of the image, with the
+        longest side at the max resolution and the shortest side bucketed, so only the remainder is padded.
+        """
+        if not self.dynamic_input:
+            input_size: tuple[int, int] = self.model.input_size
+            return input_size
+        longest = _round_up(self.max_resolution, _SHAPE_BUCKET)
+        shortest = min(_round_up(min(height, width) * longest / max(height, width), _SHAPE_BUCKET), longest)
+        return (longest, shortest) if width >= height else (shortest, longest)
+
+    def _resize(self, image: NDArray[np.uint8], input_size: tuple[int, int]) -> tuple[NDArray[np.uint8], float]:
+        """Scales the image to fit the input size and pads it at the bottom or right."""
+        input_width, input_height = input_size
+        if image.shape[0] / image.shape[1] > input_height / input_width:
+            new_height = input_height
+            new_width = int(new_height / (image.shape[0] / image.shape[1]))
+        else:
+            new_width = input_width
+            new_height = int(new_width * (image.shape[0] / image.shape[1]))
+        det_img = np.zeros((input_height, input_width, 3), dtype=np.uint8)
+        det_img[:new_height, :new_width] = cv2.resize(image, (new_width, new_height))
+        return det_img, new_height / image.shape[0]
+
+    def _postprocess(
+        self, outputs: list[NDArray[np.float32]], input_shape: tuple[int, int], det_scale: float
+    ) -> Detections:
+        fmc = self.model.fmc
+        scores = np.concatenate(outputs[:fmc]).ravel()
+        candidates = np.flatnonzero(scores >= self.model.det_thresh)
+        order = candidates[scores[candidates].argsort()[::-1]]
+
+        scale = np.float32(det_scale)
+        centers, strides = self._anchors(*input_shape)
+        centers, strides = centers[order], strides[order, None]
+        distances = np.concatenate(outputs[fmc : fmc * 2])[order] * strides
+        boxes = np.hstack([centers - distances[:, :2], centers + distances[:, 2:]]) / scale
+        offsets = np.concatenate(outputs[fmc * 2 :])[order] * strides
+        landmarks = ((np.tile(centers, 5) + offsets) / scale).astype(np.float32, copy=False)
+
+        dets = np.hstack([boxes, scores[order, None]]).astype(np.float32, copy=False)
+        keep = self._nms(dets)
+        return dets[keep], landmarks[keep].reshape(-1, 5, 2)
+
+    def _anchors(self, height: int, width: int) -> tuple[NDArray[np.float32], NDArray[np.float32]]:
+        """Returns the center and stride of every anchor for an input size, in the order of the model's outputs."""
+        if (anchors := self.anchors.get((height, width))) is None:
+            centers, strides = [], []
+            for stride in self.model._feat_stride_fpn:
+                grid = np.stack(np.meshgrid(np.arange(width // stride), np.arange(height // stride)), axis=-1)
+                grid = np.repeat((grid.astype(np.float32) * stride).reshape(-1, 2), self.model._num_anchors, axis=0)
+                centers.append(grid)
+                strides.append(np.full(len(grid), stride, dtype=np.float32))
+            anchors = self.anchors[(height, width)] = (np.concatenate(centers), np.concatenate(strides))
+        return anchors
+
+    def _nms(self, dets: NDArray[np.float32]) -> NDArray[np.intp]:
+        """Greedy NMS over detections sorted by descending score, with the same overlap measure as insightface."""
+        x1, y1, x2, y2 = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3]
+        areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+        suppressed = np.zeros(len(dets), dtype=bool)
+        keep = []
+        for i in range(len(dets)):
+            if suppressed[i]:
+                continue
+            keep.append(i)
+            rest = slice(i + 1, None)
+            width = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+            height = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+            intersection = width * height
+            suppressed[rest] |= intersection / (areas[i] + areas[rest] - intersection) > self.model.nms_thresh
+        return np.array(keep, dtype=np.intp)
+
+    def _add_batch_axis(self, model_path: Path) -> None:
+        log.debug(f"Adding batch axis to model {model_path}")
+        proto = onnx.load(model_path)
+        # the outputs are already flattened across the batch, so only the input needs a symbolic batch dimension
+        proto.graph.input[0].type.tensor_type.shape.dim[0].dim_param = "batch"
+        onnx.save(proto, model_path)
 
     def configure(self, **kwargs: Any) -> None:
         self.model.det_thresh = kwargs.pop("minScore", self.model.det_thresh)
+        self.max_resolution = kwargs.pop("maxResolution", self.max_resolution)
+
+
+def _round_up(value: float, multiple: int) -> int:
+    return max(ceil(value / multiple), 1) * multiple
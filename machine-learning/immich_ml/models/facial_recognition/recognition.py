@@ -1,18 +1,25 @@
+from io import BytesIO
 from pathlib import Path
 from typing import Any
 
+import cv2
 import numpy as np
 import onnx
 import onnxruntime as ort
 from insightface.model_zoo import ArcFaceONNX
-from insightface.utils.face_align import norm_crop
+from insightface.utils.face_align import arcface_dst
 from numpy.typing import NDArray
 from onnx.tools.update_model_dims import update_inputs_outputs_dims
 from PIL import Image
 
 from immich_ml.config import log, settings
 from immich_ml.models.base import InferenceModel
-from immich_ml.models.transforms import decode_cv2, serialize_np_array
+from immich_ml.models.transforms import (
+    ImageContext,
+    decode_cv2,
+    estimate_similarity_transforms,
+    serialize_np_array,
+)
 from immich_ml.schemas import (
     FaceDetectionOutput,
     FacialRecognitionOutput,
@@ -27,42 +34,115 @@ class FaceRecognizer(InferenceModel):
     depends = [(ModelType.DETECTION, ModelTask.FACIAL_RECOGNITION)]
     identity = (ModelType.RECOGNITION, ModelTask.FACIAL_RECOGNITION)
 
-    def __init__(self, model_name: str, **model_kwargs: Any) -> None:
+    def __init__(
+        self,
+        model_name: str,
+        max_faces: int = 0,
+        min_face_size: int = 0,
+        min_sharpness: float = 0.0,
+        **model_kwargs: Any,
+    ) -> None:
+        self.max_faces = model_kwargs.pop("maxFaces", max_faces)
+        self.min_face_size = model_kwargs.pop("minFaceSize", min_face_size)
+        self.min_sharpness = model_kwargs.pop("minSharpness", min_sharpness)
         super().__init__(model_name, **model_kwargs)
         max_batch_size = settings.max_batch_size.facial_recognition if settings.max_batch_size else None
         self.batch_size = max_batch_size if max_batch_size else self._batch_size_default
 
     def _load(self) -> ModelSession:
+        if self.uint8_input:
+            return self._load_uint8()
         session = self._make_session(self.model_path)
-        if (not self.batch_size or self.batch_size > 1) and str(session.get_inputs()[0].shape[0]) != "batch":
+        if (
+            self.model_format == ModelFormat.ONNX
+            and (not self.batch_size or self.batch_size > 1)
+            and str(session.get_inputs()[0].shape[0]) != "batch"
+        ):
             self._add_batch_axis(self.model_path)
             session = self._make_session(self.model_path)
+        # ArcFaceONNX only reads the model file to infer the input normalization
+        model_file = self.model_path_for_format(ModelFormat.ONNX).as_posix()
         self.model = ArcFaceONNX(
-            self.model_path_for_format(ModelFormat.ONNX).as_posix(),
+            model_file if self.session_backend.needs_model_file else BytesIO(onnx.ModelProto().SerializeToString()),
             session=session,
         )
         return session
 
+    def _load_uint8(self) -> ModelSession:
+        # only the graph is needed to check the batch axis and infer the normalization, not the weights
+        proto = onnx.load(self.model_path, load_external_data=False)
+        batch_dim = proto.graph.input[0].type.tensor_type.shape.dim[0].dim_param
+        if (not self.batch_size or self.batch_size > 1) and batch_dim != "batch":
+            self._add_batch_axis(self.model_path)
+        mean, std = _input_normalization(proto)
+        session = self._make_uint8_session([mean] * 3, [std] * 3, swap_rb=True)
+        self.model = ArcFaceONNX(BytesIO(onnx.ModelProto().SerializeToString()), session=session)
+        self.model.input_mean, self.model.input_std = mean, std
+        # ArcFaceONNX reads the input size as NCHW, but the uint8 input is NHWC
+        self.model.input_size = tuple(session.get_inputs()[0].shape[1:3][::-1])
+        return session
+
     def _predict(
-        self, inputs: NDArray[np.uint8] | bytes | Image.Image, faces: FaceDetectionOutput
+        self, inputs: NDArray[np.uint8] | bytes | Image.Image | ImageContext, faces: FaceDetectionOutput
     ) -> FacialRecognitionOutput:
+        faces = self._filter_by_size(faces)
         if faces["boxes"].shape[0] == 0:
             return []
         inputs = decode_cv2(inputs)
         cropped_faces = self._crop(inputs, faces)
+        if self.min_sharpness > 0:
+            keep = np.flatnonzero(self._sharpness(cropped_faces) >= self.min_sharpness)
+            faces, cropped_faces = self._select(faces, keep), cropped_faces[keep]
+        if self.max_faces > 0 and len(cropped_faces) > self.max_faces:
+            boxes = faces["boxes"]
+            priority = faces["scores"] * (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            keep = np.sort(np.argsort(-priority, kind="stable")[: self.max_faces])
+            faces, cropped_faces = self._select(faces, keep), cropped_faces[keep]
+        if len(cropped_faces) == 0:
+            return []
         embeddings = self._predict_batch(cropped_faces)
         return self.postprocess(faces, embeddings)
 
-    def _predict_batch(self, cropped_faces: list[NDArray[np.uint8]]) -> NDArray[np.float32]:
+    def _filter_by_size(self, faces: FaceDetectionOutput) -> FaceDetectionOutput:
+        if self.min_face_size <= 0:
+            return faces
+        boxes = faces["boxes"]
+        sizes = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        return self._select(faces, np.flatnonzero(sizes >= self.min_face_size))
+
+    def _select(self, faces: FaceDetectionOutput, indices: NDArray[np.intp]) -> FaceDetectionOutput:
+        return {
+            "boxes": faces["boxes"][indices],
+            "scores": faces["scores"][indices],
+            "landmarks": faces["landmarks"][indices],
+        }
+
+    def _sharpness(self, cropped_faces: NDArray[np.uint8]) -> NDArray[np.float32]:
+        """Returns the variance of the Laplacian of each crop in grayscale, which is low for blurry faces."""
+        gray = cropped_faces @ np.array([0.114, 0.587, 0.299], dtype=np.float32)  # BGR
+        laplacian = (
+            gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:] - 4 * gray[:, 1:-1, 1:-1]
+        )
+        sharpness: NDArray[np.float32] = laplacian.var(axis=(1, 2))
+        return sharpness
+
+    def _predict_batch(self, cropped_faces: NDArray[np.uint8]) -> NDArray[np.float32]:
         if not self.batch_size or len(cropped_faces) <= self.batch_size:
-            embeddings: NDArray[np.float32] = self.model.get_feat(cropped_faces)
-            return embeddings
+            return self._get_feat(cropped_faces)
 
         batch_embeddings: list[NDArray[np.float32]] = []
         for i in range(0, len(cropped_faces), self.batch_size):
-            batch_embeddings.append(self.model.get_feat(cropped_faces[i : i + self.batch_size]))
+            # sessions like ARM NN's reuse their output buffers, so each batch is copied before running the next one
+            batch_embeddings.append(self._get_feat(cropped_faces[i : i + self.batch_size]).copy())
         return np.concatenate(batch_embeddings, axis=0)
 
+    def _get_feat(self, cropped_faces: NDArray[np.uint8]) -> NDArray[np.float32]:
+        if not self.uint8_input:
+            # ArcFaceONNX only accepts a list, which holds views of the batch rather than copies
+            embeddings: NDArray[np.float32] = self.model.get_feat(list(cropped_faces))
+            return embeddings
+        return self.session.run(None, {self.model.input_name: cropped_faces})[0]
+
     def postprocess(self, faces: FaceDetectionOutput, embeddings: NDArray[np.float32]) -> FacialRecognitionOutput:
         return [
             {
@@ -73,8 +153,18 @@ class FaceRecognizer(InferenceModel):
             for (x1, y1, x2, y2), embedding, score in zip(faces["boxes"], embeddings, faces["scores"])
         ]
 
-    def _crop(self, image: NDArray[np.uint8], faces: FaceDetectionOutput) -> list[NDArray[np.uint8]]:
-        return [norm_crop(image, landmark) for landmark in faces["landmarks"]]
+    def _crop(self, image: NDArray[np.uint8], faces: FaceDetectionOutput) -> NDArray[np.uint8]:
+        """Aligns each face to the ArcFace landmark template, writing the crops into a single (N, 112, 112, 3) batch."""
+        transforms = estimate_similarity_transforms(faces["landmarks"], arcface_dst)
+        cropped_faces = np.empty((len(transforms), 112, 112, 3), dtype=np.uint8)
+        for transform, cropped_face in zip(transforms, cropped_faces):
+            cv2.warpAffine(image, transform, (112, 112), dst=cropped_face, borderValue=0.0)
+        return cropped_faces
+
+    def configure(self, **kwargs: Any) -> None:
+        self.max_faces = kwargs.pop("maxFaces", self.max_faces)
+        self.min_face_size = kwargs.pop("minFaceSize", self.min_face_size)
+        self.min_sharpness = kwargs.pop("minSharpness", self.min_sharpness)
 
     def _add_batch_axis(self, model_path: Path) -> None:
         log.debug(f"Adding batch axis to model {model_path}")
@@ -88,5 +178,20 @@ class FaceRecognizer(InferenceModel):
 
     @property
     def _batch_size_default(self) -> int | None:
-        providers = ort.get_available_providers()
-        return None if self.model_format == ModelFormat.ONNX and "OpenVINOExecutionProvider" not in providers else 1
+        match self.model_format:
+            case ModelFormat.ONNX:
+                return None if "OpenVINOExecutionProvider" not in ort.get_available_providers() else 1
+            case ModelFormat.RKNN:
+                # RKNN models have a static batch size, but the session splits larger batches across NPU cores
+                return None
+            case _:
+                return 1
+
+
+# mirrors ArcFaceONNX, which infers the normalization from the names of the first nodes
+def _input_normalization(proto: onnx.ModelProto) -> tuple[float, float]:
+    names = [node.name for node in proto.graph.node[:8]]
+    find_sub = any(name.startswith(("Sub", "_minus")) for name in names)
+    find_mul = any(name.startswith(("Mul", "_mul")) for name in names)
+    # mxnet models normalize in the graph
+    return (0.0, 1.0) if find_sub and find_mul else (127.5, 127.5)
@@ -1,22 +1,32 @@
+import threading
+from collections import Counter
+from math import ceil
 from typing import Any
 
 import cv2
 import numpy as np
 from numpy.typing import NDArray
 from PIL import Image
-from rapidocr.ch_ppocr_det.utils import DBPostProcess
 from rapidocr.inference_engine.base import FileInfo, InferSession
 from rapidocr.utils.download_file import DownloadFile, DownloadFileInput
 from rapidocr.utils.typings import EngineType, LangDet, OCRVersion, TaskType
 from rapidocr.utils.typings import ModelType as RapidModelType
 
-from immich_ml.config import log
+from immich_ml.config import log, settings
 from immich_ml.models.base import InferenceModel
+from immich_ml.models.transforms import ImageContext, get_normalization_lut, normalize_to_nchw
 from immich_ml.schemas import ModelFormat, ModelSession, ModelTask, ModelType
-from immich_ml.sessions.ort import OrtSession
 
+from .postprocess import DBPostProcess
 from .schemas import TextDetectionOutput
 
+# tiles overlap by this fraction of their size, and each pixel is taken from the tile it's furthest inside of
+_TILE_OVERLAP = 0.25
+# the number of tiles run together, which bounds the memory used by the model regardless of the image size
+_TILE_BATCH_SIZE = 4
+# input buffers up to this size are kept for reuse, which covers a batch of tiles or the default buckets
+_MAX_REUSED_INPUT_BYTES = 32 * 1024 * 1024
+
 
 class TextDetector(InferenceModel):
     depends = []
@@ -25,8 +35,18 @@ class TextDetector(InferenceModel):
     def __init__(self, model_name: str, **model_kwargs: Any) -> None:
         super().__init__(model_name.split("__")[-1], **model_kwargs, model_format=ModelFormat.ONNX)
         self.max_resolution = 736
+        self.tile_size = 0
+        self.prepass_resolution = 0
+        # inputs are padded to a few fixed sizes so the session sees the same shapes and can reuse its allocations
+        self.shape_buckets = sorted({_round_up(bucket, 32) for bucket in settings.ocr_detection_buckets})
+        self.bucket_usage: Counter[tuple[int, int]] = Counter()
+        self.bucket_lock = threading.Lock()
         self.mean = np.array([0.5, 0.5, 0.5], dtype=np.float32)
         self.std_inv = np.float32(1.0) / (np.array([0.5, 0.5, 0.5], dtype=np.float32) * 255.0)
+        # maps uint8 values straight to (value - mean) * std_inv, as the mean and std apply to the 0-255 range
+        self.lut = get_normalization_lut(self.mean / 255.0, np.float32(1.0) / (self.std_inv * 255.0))
+        # models can be called from several threads at once, so each thread gets its own input buffer
+        self.buffers = threading.local()
         self._empty: TextDetectionOutput = {
             "boxes": np.empty(0, dtype=np.float32),
             "scores": np.empty(0, dtype=np.float32),
@@ -41,6 +61,10 @@ class TextDetector(InferenceModel):
         )
 
     def _download(self) -> None:
+        if not self.session_backend.needs_model_file:
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+            return
+
         model_info = InferSession.get_model_url(
             FileInfo(
                 engine_type=EngineType.ONNXRUNTIME,
@@ -59,15 +83,28 @@ class TextDetector(InferenceModel):
         DownloadFile.run(download_params)
 
     def _load(self) -> ModelSession:
-        # TODO: support other runtime sessions
-        return OrtSession(self.model_path)
+        if self.uint8_input:
+            return self._make_uint8_session(self.mean, np.float32(1.0) / self.std_inv)
+        return self._make_session(self.model_path)
+
+    @property
+    def min_image_size(self) -> tuple[int, int] | None:
+        return self.max_resolution, 0
 
     # partly adapted from RapidOCR
-    def _predict(self, inputs: Image.Image) -> TextDetectionOutput:
-        w, h = inputs.size
+    def _predict(self, inputs: Image.Image | ImageContext) -> TextDetectionOutput:
+        context = inputs if isinstance(inputs, ImageContext) else ImageContext(inputs)
+        w, h = context.size
         if w < 32 or h < 32:
             return self._empty
-        out = self.session.run(None, {"x": self._transform(inputs)})[0]
+        if 0 < self.prepass_resolution < min(self.max_resolution, w, h):
+            # most images have no text, which a much smaller input is usually enough to tell
+            out = self._detect(self._resize(context, self.prepass_resolution), bucket=False)
+            if not self._has_text(out, self.postprocess.thresh):
+                return self._empty
+        out = self._detect(self._resize(context, self.max_resolution))
+        if not self._has_text(out, self.postprocess.box_thresh):
+            return self._empty
         boxes, scores = self.postprocess(out, (h, w))
         if len(boxes) == 0:
             return self._empty
@@ -76,12 +113,78 @@ class TextDetector(InferenceModel):
             "scores": np.array(scores, dtype=np.float32),
         }
 
+    def _detect(self, image: NDArray[np.uint8], bucket: bool = True) -> NDArray[np.float32]:
+        height, width = image.shape[:2]
+        if bucket:
+            image = self._pad_to_bucket(image)
+        if self.tile_size > 0 and max(image.shape[:2]) > self.tile_size:
+            out = self._detect_tiled(image)
+        else:
+            out = self.session.run(None, {"x": self._to_input(image[None])})[0]
+        return out[:, :, :height, :width]
+
+    def _pad_to_bucket(self, image: NDArray[np.uint8]) -> NDArray[np.uint8]:
+        if not self.shape_buckets:
+            return image
+        height, width = image.shape[:2]
+        bucket = self._bucket(height), self._bucket(width)
+        with self.bucket_lock:
+            self.bucket_usage[bucket] += 1
+            if self.bucket_usage[bucket] == 1:
+                log.debug(
+                    f"Using new input shape {bucket[0]}x{bucket[1]} for OCR detection model '{self.model_name}' "
+                    f"({len(self.bucket_usage)} shapes used: {dict(self.bucket_usage)})"
+                )
+        if bucket == (height, width):
+            return image
+        return cv2.copyMakeBorder(  # type: ignore
+            image, 0, bucket[0] - height, 0, bucket[1] - width, cv2.BORDER_CONSTANT, value=(0, 0, 0)
+        )
+
+    def _bucket(self, length: int) -> int:
+        """Returns the smallest bucket that fits `length`, or a multiple of the largest bucket beyond it."""
+        for bucket in self.shape_buckets:
+            if length <= bucket:
+                return bucket
+        return _round_up(length, self.shape_buckets[-1])
+
+    def _detect_tiled(self, image: NDArray[np.uint8]) -> NDArray[np.float32]:
+        """
+        Runs the model on overlapping tiles of the image in batches and stitches their probability maps together,
+        so text cut by the edge of one tile is taken from a neighbouring tile and boxes are found across seams.
+        """
+        tile_size = max(self.tile_size // 32, 1) * 32
+        tile_height, tile_width = min(tile_size, image.shape[0]), min(tile_size, image.shape[1])
+        tiles = [
+            (row, col)
+            for row in _tile_spans(image.shape[0], tile_height)
+            for col in _tile_spans(image.shape[1], tile_width)
+        ]
+        out = np.empty((1, 1, *image.shape[:2]), dtype=np.float32)
+        for start in range(0, len(tiles), _TILE_BATCH_SIZE):
+            batch_tiles = tiles[start : start + _TILE_BATCH_SIZE]
+            batch = np.stack([image[y : y + tile_height, x : x + tile_width] for (y, _, _), (x, _, _) in batch_tiles])
+            probs = self.session.run(None, {"x": self._to_input(batch)})[0]
+            for ((y, top, bottom), (x, left, right)), prob in zip(batch_tiles, probs, strict=True):
+                out[0, 0, top:bottom, left:right] = prob[0, top - y : bottom - y, left - x : right - x]
+        return out
+
+    def _has_text(self, out: NDArray[np.float32], min_score: float) -> bool:
+        """
+        Checks the probability map for anything post-processing could turn into a box, which is much cheaper than
+        post-processing itself. Boxes are scored by their mean probability, so none can pass if no pixel does, and
+        boxes narrower than `min_size` are dropped, which fewer than `min_size` pixels can't span even after dilation.
+        """
+        if out.max() < min_score:
+            return False
+        return bool(np.count_nonzero(out > self.postprocess.thresh) >= self.postprocess.min_size)
+
     # adapted from RapidOCR
-    def _transform(self, img: Image.Image) -> NDArray[np.float32]:
+    def _resize(self, img: ImageContext, max_resolution: int) -> NDArray[np.uint8]:
         if img.height < img.width:
-            ratio = float(self.max_resolution) / img.height
+            ratio = float(max_resolution) / img.height
         else:
-            ratio = float(self.max_resolution) / img.width
+            ratio = float(max_resolution) / img.width
         ratio = min(ratio, 1.0)
 
         resize_h = int(img.height * ratio)
@@ -89,13 +192,32 @@ class TextDetector(InferenceModel):
 
         resize_h = int(round(resize_h / 32) * 32)
         resize_w = int(round(resize_w / 32) * 32)
-        resized_img = img.resize((int(resize_w), int(resize_h)), resample=Image.Resampling.LANCZOS)
+        # resample from the smallest level that is still at least as large as the target
+        level = img.bgr(self.min_image_size)
+        return cv2.resize(level, (resize_w, resize_h), interpolation=cv2.INTER_AREA)  # type: ignore
+
+    def _to_input(self, images: NDArray[np.uint8]) -> NDArray[np.float32]:
+        """Converts a batch of BGR NHWC images to the model input."""
+        if self.uint8_input:
+            # the model takes BGR images like RapidOCR, so they're passed through unchanged
+            return np.ascontiguousarray(images)
+        batch = self._input_buffer(images.shape)
+        for image, out in zip(images, batch):
+            normalize_to_nchw(image, self.lut, out=out[None])
+        return batch
 
-        img_np: NDArray[np.float32] = cv2.cvtColor(np.array(resized_img, dtype=np.float32), cv2.COLOR_RGB2BGR)  # type: ignore
-        img_np -= self.mean
-        img_np *= self.std_inv
-        img_np = np.transpose(img_np, (2, 0, 1))
-        return np.expand_dims(img_np, axis=0)
+    def _input_buffer(self, shape: tuple[int, ...]) -> NDArray[np.float32]:
+        """
+        Returns this thread's input buffer, which is reused while the input shape doesn't change. Only inputs with
+        fixed shapes, i.e. shape buckets or tiles, are likely to repeat, and large ones aren't kept to bound memory.
+        """
+        batch_size, height, width, channels = shape
+        buffer: NDArray[np.float32] | None = getattr(self.buffers, "x", None)
+        if buffer is None or buffer.shape[0] < batch_size or buffer.shape[1:] != (channels, height, width):
+            buffer = np.empty((batch_size, channels, height, width), dtype=np.float32)
+            fixed_shape = bool(self.shape_buckets) or self.tile_size > 0
+            self.buffers.x = buffer if fixed_shape and buffer.nbytes <= _MAX_REUSED_INPUT_BYTES else None
+        return buffer[:batch_size]
 
     def sorted_boxes(self, dt_boxes: NDArray[np.float32]) -> NDArray[np.float32]:
         if len(dt_boxes) == 0:
@@ -118,8 +240,37 @@ class TextDetector(InferenceModel):
 
     def configure(self, **kwargs: Any) -> None:
         if (max_resolution := kwargs.get("maxResolution")) is not None:
+            if max_resolution <= 0:
+                raise ValueError(f"maxResolution must be positive, got {max_resolution}")
             self.max_resolution = max_resolution
         if (min_score := kwargs.get("minScore")) is not None:
             self.postprocess.box_thresh = min_score
         if (score_mode := kwargs.get("scoreMode")) is not None:
             self.postprocess.score_mode = score_mode
+        if (tile_size := kwargs.get("tileSize")) is not None:
+            self.tile_size = tile_size
+        if (prepass_resolution := kwargs.get("prepassResolution")) is not None:
+            self.prepass_resolution = prepass_resolution
+
+
+def _round_up(value: float, multiple: int) -> int:
+    return max(ceil(value / multiple), 1) * multiple
+
+
+def _tile_spans(length: int, tile_size: int) -> list[tuple[int, int, int]]:
+    """
+    Returns the offset of each tile along an axis, spread evenly so the tiles cover it with at least the target overlap,
+    and the range of the axis that each tile contributes to the output.
+    """
+    if length <= tile_size:
+        return [(0, 0, length)]
+    overlap = int(tile_size * _TILE_OVERLAP)
+    count = ceil((length - overlap) / (tile_size - overlap))
+    offsets = [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+    # tiles meet in the middle of their overlap
+    bounds = [
+        0,
+        *((offset + tile_size + next_offset) // 2 for offset, next_offset in zip(offsets, offsets[1:])),
+        length,
+    ]
+    return list(zip(offsets, bounds[:-1], bounds[1:]))
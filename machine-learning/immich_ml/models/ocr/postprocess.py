@@ -0,0 +1,218 @@
+import math
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+# summing boxes from an integral image only pays for itself once there are enough of them
+_INTEGRAL_MIN_BOXES = 32
+
+
+class DBPostProcess:
+    """
+    Turns the probability map of a DB text detection model into boxes like RapidOCR's `DBPostProcess`, but finds,
+    scores, unclips and filters the candidate boxes together in NumPy rather than one at a time.
+
+    Unlike RapidOCR, which keeps the first `max_candidates` contours in the order they're found, this keeps the
+    `max_candidates` highest-scoring boxes. Scores are identical, as are axis-aligned boxes, but unclipping expands
+    rotated boxes in closed form rather than offsetting a polygon, which can move their corners by about a pixel of
+    the probability map.
+    """
+
+    def __init__(
+        self,
+        thresh: float = 0.3,
+        box_thresh: float = 0.7,
+        max_candidates: int = 1000,
+        unclip_ratio: float = 2.0,
+        score_mode: str = "fast",
+        use_dilation: bool = False,
+    ) -> None:
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.max_candidates = max_candidates
+        self.unclip_ratio = unclip_ratio
+        self.min_size = 3
+        self.score_mode = score_mode
+        self.dilation_kernel = np.ones((2, 2), dtype=np.uint8) if use_dilation else None
+
+    def __call__(
+        self, pred: NDArray[np.float32], ori_shape: tuple[int, int]
+    ) -> tuple[NDArray[np.float32], list[float]]:
+        src_h, src_w = ori_shape
+        prob = pred[0, 0]
+        mask = (prob > self.thresh).astype(np.uint8)
+        if self.dilation_kernel is not None:
+            mask = cv2.dilate(mask, self.dilation_kernel)
+        contours, _ = cv2.findContours(mask * 255, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        if len(contours) == 0:
+            return np.empty((0, 4, 2), dtype=np.float32), []
+
+        rects = np.array([(*center, *size, angle) for center, size, angle in map(cv2.minAreaRect, contours)])
+        keep = np.flatnonzero(rects[:, 2:4].min(axis=1) >= self.min_size)
+        rects = rects[keep]
+        boxes = _box_points(rects)
+
+        if self.score_mode == "fast":
+            scores = self._score_fast(prob, boxes)
+        else:
+            scores = self._score_slow(prob, [contours[i] for i in keep])
+        keep = np.flatnonzero(scores >= self.box_thresh)
+        if len(keep) > self.max_candidates:
+            keep = np.sort(keep[np.argsort(-scores[keep], kind="stable")[: self.max_candidates]])
+        rects, boxes, scores = rects[keep], boxes[keep], scores[keep]
+
+        x, y = boxes[..., 0].astype(np.float64), boxes[..., 1].astype(np.float64)
+        area = np.abs((x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1)) / 2
+        length = np.linalg.norm(boxes - np.roll(boxes, -1, axis=1), axis=2).sum(axis=1)
+        distance = area * self.unclip_ratio / np.maximum(length, 1e-6)
+        boxes, sides = self._unclip(boxes, rects, distance)
+        keep = np.flatnonzero(sides >= self.min_size + 2)
+        boxes, scores = boxes[keep], scores[keep]
+
+        height, width = prob.shape
+        boxes[..., 0] = np.clip(np.round(boxes[..., 0] / width * src_w), 0, src_w)
+        boxes[..., 1] = np.clip(np.round(boxes[..., 1] / height * src_h), 0, src_h)
+        boxes = _order_clockwise(boxes.astype(np.int32).astype(np.float32))
+        boxes[..., 0] = np.minimum(boxes[..., 0], src_w - 1)
+        boxes[..., 1] = np.minimum(boxes[..., 1], src_h - 1)
+
+        rect_width = np.linalg.norm(boxes[:, 0] - boxes[:, 1], axis=1).astype(np.int32)
+        rect_height = np.linalg.norm(boxes[:, 0] - boxes[:, 3], axis=1).astype(np.int32)
+        keep = np.flatnonzero((rect_width > 3) & (rect_height > 3))
+        return boxes[keep], scores[keep].tolist()
+
+    def _unclip(
+        self, boxes: NDArray[np.float32], rects: NDArray[np.float64], distance: NDArray[np.float64]
+    ) -> tuple[NDArray[np.float32], NDArray[np.float64]]:
+        """
+        Expands each box by `distance` on every side, returning the expanded boxes and their shortest sides.
+
+        Offsetting a rectangle with rounded corners and taking its minimum area rectangle grows each side by twice the
+        distance. RapidOCR offsets with Clipper, which truncates the corners to whole pixels and rounds the result, so
+        axis-aligned boxes do the same to give identical boxes.
+        """
+        rects = rects.copy()
+        rects[:, 2:4] += 2 * distance[:, None]
+        expanded = _box_points(rects)
+        sides = rects[:, 2:4].min(axis=1)
+
+        corners = np.trunc(boxes)
+        aligned = _is_axis_aligned(corners)
+        lower = _round_half_away(corners[aligned].min(axis=1) - distance[aligned, None])
+        upper = _round_half_away(corners[aligned].max(axis=1) + distance[aligned, None])
+        expanded[aligned] = np.stack(
+            [lower, np.stack([upper[:, 0], lower[:, 1]], axis=1), upper, np.stack([lower[:, 0], upper[:, 1]], axis=1)],
+            axis=1,
+        )
+        sides[aligned] = (upper - lower).min(axis=1)
+        return expanded, sides
+
+    def _score_fast(self, prob: NDArray[np.float32], boxes: NDArray[np.float32]) -> NDArray[np.float64]:
+        """
+        Returns the mean probability inside each box. Boxes that are axis-aligned once rounded to pixels, which is
+        nearly all of them, are summed from an integral image, while the others are filled in individually.
+        """
+        height, width = prob.shape
+        limit = np.array([width - 1, height - 1])
+        lower = np.clip(np.floor(boxes.min(axis=1)).astype(np.int32), 0, limit)
+        upper = np.clip(np.ceil(boxes.max(axis=1)).astype(np.int32), 0, limit)
+        local = (boxes - lower[:, None]).astype(np.int32)
+        scores = np.empty(len(boxes), dtype=np.float64)
+
+        aligned = _is_axis_aligned(local)
+        start = lower + np.clip(local.min(axis=1), 0, upper - lower)
+        end = lower + np.clip(local.max(axis=1), 0, upper - lower) + 1
+        (x0, y0), (x1, y1) = start[aligned].T, end[aligned].T
+        if len(x0) >= _INTEGRAL_MIN_BOXES:
+            integral = cv2.integral(prob, sdepth=cv2.CV_64F)
+            sums = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        else:
+            sums = np.array(
+                [prob[top:bottom, left:right].sum(dtype=np.float64) for left, top, right, bottom in zip(x0, y0, x1, y1)]
+            )
+        scores[aligned] = sums / ((x1 - x0) * (y1 - y0))
+
+        for i in np.flatnonzero(~aligned):
+            (xmin, ymin), (xmax, ymax) = lower[i], upper[i]
+            mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+            cv2.fillPoly(mask, local[i][None], 1)
+            scores[i] = cv2.mean(prob[ymin : ymax + 1, xmin : xmax + 1], mask)[0]
+        return scores
+
+    def _score_slow(self, prob: NDArray[np.float32], contours: list[NDArray[np.int32]]) -> NDArray[np.float64]:
+        """Returns the mean probability inside each contour."""
+        height, width = prob.shape
+        scores = np.empty(len(contours), dtype=np.float64)
+        for i, contour in enumerate(contours):
+            points = contour.reshape(-1, 2)
+            xmin, ymin = np.clip(points.min(axis=0), 0, [width - 1, height - 1])
+            xmax, ymax = np.clip(points.max(axis=0), 0, [width - 1, height - 1])
+            mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+            cv2.fillPoly(mask, (points - [xmin, ymin])[None].astype(np.int32), 1)
+            scores[i] = cv2.mean(prob[ymin : ymax + 1, xmin : xmax + 1], mask)[0]
+        return scores
+
+
+def _box_points(rects: NDArray[np.float64]) -> NDArray[np.float32]:
+    """
+    Returns the corners of each (center x, center y, width, height, angle) rectangle in the same float32 arithmetic as
+    `cv2.boxPoints`, ordered top-left, top-right, bottom-right, bottom-left as RapidOCR does.
+    """
+    cx, cy, w, h = rects[:, :4].astype(np.float32).T
+    # NumPy's vectorized sin and cos can differ from the C library's in the last bit
+    angle = (rects[:, 4] * np.pi / 180).tolist()
+    b = np.array([math.cos(x) for x in angle], dtype=np.float32) * np.float32(0.5)
+    a = np.array([math.sin(x) for x in angle], dtype=np.float32) * np.float32(0.5)
+    points = np.empty((len(rects), 4, 2), dtype=np.float32)
+    points[:, 0, 0] = cx - a * h - b * w
+    points[:, 0, 1] = cy + b * h - a * w
+    points[:, 1, 0] = cx + a * h - b * w
+    points[:, 1, 1] = cy - b * h - a * w
+    points[:, 2, 0] = cx + a * h + b * w
+    points[:, 2, 1] = cy - b * h + a * w
+    points[:, 3, 0] = cx - a * h + b * w
+    points[:, 3, 1] = cy + b * h + a * w
+
+    # the two leftmost points are the left side, with the top-left being the higher one, and likewise on the right
+    points = np.take_along_axis(points, np.argsort(points[..., 0], axis=1, kind="stable")[..., None], axis=1)
+    rows = np.arange(len(points))
+    left_swap = points[:, 1, 1] <= points[:, 0, 1]
+    right_swap = points[:, 3, 1] <= points[:, 2, 1]
+    top_left, bottom_left = np.where(left_swap, 1, 0), np.where(left_swap, 0, 1)
+    top_right, bottom_right = np.where(right_swap, 3, 2), np.where(right_swap, 2, 3)
+    ordered: NDArray[np.float32] = np.stack(
+        [
+            points[rows, top_left],
+            points[rows, top_right],
+            points[rows, bottom_right],
+            points[rows, bottom_left],
+        ],
+        axis=1,
+    )
+    return ordered
+
+
+def _is_axis_aligned(boxes: NDArray[np.generic]) -> NDArray[np.bool_]:
+    """Checks which boxes, with corners ordered top-left, top-right, bottom-right, bottom-left, are axis-aligned."""
+    aligned: NDArray[np.bool_] = (
+        (boxes[:, 0, 1] == boxes[:, 1, 1])
+        & (boxes[:, 2, 1] == boxes[:, 3, 1])
+        & (boxes[:, 0, 0] == boxes[:, 3, 0])
+        & (boxes[:, 1, 0] == boxes[:, 2, 0])
+    )
+    return aligned
+
+
+def _round_half_away(values: NDArray[np.float64]) -> NDArray[np.float64]:
+    rounded: NDArray[np.float64] = np.copysign(np.floor(np.abs(values) + 0.5), values)
+    return rounded
+
+
+def _order_clockwise(boxes: NDArray[np.float32]) -> NDArray[np.float32]:
+    """Orders the corners of each box clockwise from the top-left by their x and then y coordinates."""
+    boxes = np.take_along_axis(boxes, np.argsort(boxes[..., 0], axis=1, kind="stable")[..., None], axis=1)
+    left = np.take_along_axis(boxes[:, :2], np.argsort(boxes[:, :2, 1], axis=1, kind="stable")[..., None], axis=1)
+    right = np.take_along_axis(boxes[:, 2:], np.argsort(boxes[:, 2:, 1], axis=1, kind="stable")[..., None], axis=1)
+    ordered: NDArray[np.float32] = np.stack([left[:, 0], right[:, 0], right[:, 1], left[:, 1]], axis=1)
+    return ordered
@@ -1,23 +1,32 @@
 from typing import Any
 
+import cv2
 import numpy as np
+import onnx
 from numpy.typing import NDArray
 from PIL import Image
-from rapidocr.ch_ppocr_rec import TextRecInput
-from rapidocr.ch_ppocr_rec import TextRecognizer as RapidTextRecognizer
+from rapidocr.ch_ppocr_rec.main import RTL_LANGS
+from rapidocr.ch_ppocr_rec.utils import CTCLabelDecode
 from rapidocr.inference_engine.base import FileInfo, InferSession
 from rapidocr.utils.download_file import DownloadFile, DownloadFileInput
+from rapidocr.utils.model_resolver import normalize_lang
 from rapidocr.utils.typings import EngineType, LangRec, OCRVersion, TaskType
 from rapidocr.utils.typings import ModelType as RapidModelType
-from rapidocr.utils.vis_res import VisRes
+from rapidocr.utils.utils import reorder_bidi_for_display, validate_rtl_dependency
 
 from immich_ml.config import log, settings
 from immich_ml.models.base import InferenceModel
-from immich_ml.models.transforms import pil_to_cv2
+from immich_ml.models.transforms import ImageContext, decode_cv2, get_normalization_lut, normalize_to_nchw
 from immich_ml.schemas import ModelFormat, ModelSession, ModelTask, ModelType
-from immich_ml.sessions.ort import OrtSession
 
-from .schemas import OcrOptions, TextDetectionOutput, TextRecognitionOutput
+from .schemas import TextDetectionOutput, TextRecognitionOutput
+
+# crops are resized to this height, keeping their aspect ratio
+_INPUT_HEIGHT = 48
+# crops are padded to a multiple of this width, so similar lengths of text share a batch and an input shape
+_WIDTH_BUCKET = 64
+# RapidOCR normalizes each channel to [-1, 1]
+_NORMALIZATION_LUT = get_normalization_lut(np.full(3, 0.5, dtype=np.float32), np.full(3, 0.5, dtype=np.float32))
 
 
 class TextRecognizer(InferenceModel):
@@ -27,16 +36,21 @@ class TextRecognizer(InferenceModel):
     def __init__(self, model_name: str, **model_kwargs: Any) -> None:
         self.language = LangRec[model_name.split("__")[0]] if "__" in model_name else LangRec.CH
         self.min_score = model_kwargs.get("minScore", 0.9)
+        max_batch_size = settings.max_batch_size.text_recognition if settings.max_batch_size else None
+        self.batch_size = max_batch_size or 6
         self._empty: TextRecognitionOutput = {
             "box": np.empty(0, dtype=np.float32),
             "boxScore": np.empty(0, dtype=np.float32),
             "text": [],
             "textScore": np.empty(0, dtype=np.float32),
         }
-        VisRes.__init__ = lambda self, **kwargs: None  # pyright: ignore[reportAttributeAccessIssue]
         super().__init__(model_name, **model_kwargs, model_format=ModelFormat.ONNX)
 
     def _download(self) -> None:
+        if not self.session_backend.needs_model_file:
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+            return
+
         model_info = InferSession.get_model_url(
             FileInfo(
                 engine_type=EngineType.ONNXRUNTIME,
@@ -55,67 +69,136 @@ class TextRecognizer(InferenceModel):
         DownloadFile.run(download_params)
 
     def _load(self) -> ModelSession:
-        # TODO: support other runtimes
-        session = OrtSession(self.model_path)
-        self.model = RapidTextRecognizer(
-            OcrOptions(
-                session=session.session,
-                rec_batch_num=settings.max_batch_size.text_recognition if settings.max_batch_size is not None else 6,
-                rec_img_shape=(3, 48, 320),
-                lang_type=self.language,
-            )
-        )
+        if normalize_lang(self.language) in RTL_LANGS:
+            validate_rtl_dependency()
+        session = self._make_session(self.model_path)
+        # the blank token and space are added the same way as RapidOCR's `CTCLabelDecode`
+        self.characters = np.array(CTCLabelDecode(character=self._character_list(session)).character, dtype=object)
         return session
 
-    def _predict(self, img: Image.Image, texts: TextDetectionOutput) -> TextRecognitionOutput:
+    def _character_list(self, session: ModelSession) -> list[str]:
+        if not self.session_backend.needs_model_file:
+            # sessions without a model file have no character set, so each output class gets a placeholder
+            num_classes = int(session.get_outputs()[0].shape[-1])
+            return [chr(ord("!") + i) for i in range(num_classes - 2)]
+        # RapidOCR's models store their character set in the metadata, which doesn't need the weights
+        proto = onnx.load(self.model_path, load_external_data=False)
+        metadata = {prop.key: prop.value for prop in proto.metadata_props}
+        characters: list[str] = metadata["character"].splitlines()
+        return characters
+
+    def _predict(self, inputs: Image.Image | ImageContext, texts: TextDetectionOutput) -> TextRecognitionOutput:
         boxes, box_scores = texts["boxes"], texts["scores"]
         if boxes.shape[0] == 0:
             return self._empty
-        rec = self.model(TextRecInput(img=self.get_crop_img_list(img, boxes)))
-        if rec.txts is None:
-            return self._empty
+        img = decode_cv2(inputs)
+        rec_texts, text_scores = self._recognize(img, boxes)
 
-        boxes[:, :, 0] /= img.width
-        boxes[:, :, 1] /= img.height
+        boxes[:, :, 0] /= img.shape[1]
+        boxes[:, :, 1] /= img.shape[0]
 
-        text_scores = np.array(rec.scores)
         valid_text_score_idx = text_scores > self.min_score
         valid_score_idx_list = valid_text_score_idx.tolist()
         return {
             "box": boxes.reshape(-1, 8)[valid_text_score_idx].reshape(-1),
-            "text": [rec.txts[i] for i in range(len(rec.txts)) if valid_score_idx_list[i]],
+            "text": [rec_texts[i] for i in range(len(rec_texts)) if valid_score_idx_list[i]],
             "boxScore": box_scores[valid_text_score_idx],
             "textScore": text_scores[valid_text_score_idx],
         }
 
-    def get_crop_img_list(self, img: Image.Image, boxes: NDArray[np.float32]) -> list[NDArray[np.uint8]]:
+    def _recognize(self, img: NDArray[np.uint8], boxes: NDArray[np.float32]) -> tuple[list[str], NDArray[np.float32]]:
+        """
+        Recognizes the text in each box. Boxes are sorted by aspect ratio and grouped into width buckets, so each batch
+        is only as wide as its bucket instead of being padded to the widest crop or a fixed minimum width.
+        """
+        transforms, crop_sizes = self._get_crop_transforms(boxes)
+        order = np.argsort(crop_sizes[:, 0] / crop_sizes[:, 1], kind="stable")
+        resized_widths = np.ceil(_INPUT_HEIGHT * crop_sizes[order, 0] / crop_sizes[order, 1])
+        bucket_widths = np.maximum(np.ceil(resized_widths / _WIDTH_BUCKET), 1).astype(np.int32) * _WIDTH_BUCKET
+
+        texts = [""] * len(boxes)
+        scores = np.zeros(len(boxes), dtype=np.float32)
+        bucket_starts = np.flatnonzero(np.diff(bucket_widths, prepend=-1))
+        for bucket_start, bucket_end in zip(bucket_starts, [*bucket_starts[1:], len(order)]):
+            for start in range(bucket_start, bucket_end, self.batch_size):
+                indices = order[start : min(start + self.batch_size, bucket_end)]
+                batch = self._crop_batch(img, transforms[indices], crop_sizes[indices], int(bucket_widths[start]))
+                batch_texts, scores[indices] = self._decode(self.session.run(None, {"x": batch})[0])
+                for i, text in zip(indices, batch_texts):
+                    texts[i] = text
+        if normalize_lang(self.language) in RTL_LANGS:
+            texts = list(reorder_bidi_for_display(tuple(texts)))  # type: ignore[arg-type]
+        return texts, scores
+
+    def _decode(self, preds: NDArray[np.float32]) -> tuple[list[str], NDArray[np.float32]]:
+        """
+        Greedy CTC decoding of a batch with the same output as RapidOCR's `CTCLabelDecode`: repeated tokens and blanks
+        are dropped, and the score is the mean probability of the remaining tokens.
+        """
+        token_ids = preds.argmax(axis=2)
+        probs = np.take_along_axis(preds, token_ids[:, :, None], axis=2)[:, :, 0].astype(np.float64).round(5)
+        selection = token_ids != 0
+        selection[:, 1:] &= token_ids[:, 1:] != token_ids[:, :-1]
+        counts = selection.sum(axis=1)
+        scores = ((probs * selection).sum(axis=1) / np.maximum(counts, 1)).round(5)
+        chars = np.split(self.characters[token_ids[selection]], np.cumsum(counts)[:-1])
+        return ["".join(row) for row in chars], scores.astype(np.float32)
+
+    def _crop_batch(
+        self, img: NDArray[np.uint8], transforms: NDArray[np.float64], crop_sizes: NDArray[np.int32], batch_width: int
+    ) -> NDArray[np.float32]:
+        """
+        Warps each crop from the image at the input height into a (N, 3, height, batch_width) batch, normalized and
+        padded on the right the same way as RapidOCR.
+        """
+        height = _INPUT_HEIGHT
+        widths = np.minimum(np.ceil(height * crop_sizes[:, 0] / crop_sizes[:, 1]), batch_width).astype(np.int32)
+        # maps each output pixel to the crop, then through the crop's homography to the source pixel
+        scale = np.zeros((len(transforms), 3, 3))
+        scale[:, 0, 0], scale[:, 1, 1], scale[:, 2, 2] = crop_sizes[:, 0] / widths, crop_sizes[:, 1] / height, 1.0
+        to_center, from_center = np.eye(3), np.eye(3)
+        to_center[:2, 2], from_center[:2, 2] = 0.5, -0.5
+        inverse_maps = from_center @ transforms @ scale @ to_center
+
+        crop = np.empty((height, batch_width, 3), dtype=np.uint8)
+        batch = np.zeros((len(transforms), 3, height, batch_width), dtype=np.float32)
+        for i, (inverse_map, width) in enumerate(zip(inverse_maps, widths)):
+            warped: NDArray[np.uint8] = cv2.warpPerspective(  # type: ignore[assignment]
+                img,
+                inverse_map,
+                (int(width), height),
+                dst=crop[:, :width],
+                flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            )
+            normalize_to_nchw(warped, _NORMALIZATION_LUT, out=batch[i : i + 1, :, :, :width])
+        return batch
+
+    def _get_crop_transforms(self, boxes: NDArray[np.float32]) -> tuple[NDArray[np.float64], NDArray[np.int32]]:
+        """
+        Returns the homography mapping each crop to its box in the image and the (width, height) of each crop.
+        Crops that are at least 1.5x taller than wide are rotated 90 degrees counterclockwise.
+        """
         img_crop_width = np.maximum(
             np.linalg.norm(boxes[:, 1] - boxes[:, 0], axis=1), np.linalg.norm(boxes[:, 2] - boxes[:, 3], axis=1)
         ).astype(np.int32)
         img_crop_height = np.maximum(
             np.linalg.norm(boxes[:, 0] - boxes[:, 3], axis=1), np.linalg.norm(boxes[:, 1] - boxes[:, 2], axis=1)
         ).astype(np.int32)
+        img_crop_width, img_crop_height = np.maximum(img_crop_width, 1), np.maximum(img_crop_height, 1)
         pts_std = np.zeros((img_crop_width.shape[0], 4, 2), dtype=np.float32)
         pts_std[:, 1:3, 0] = img_crop_width[:, None]
         pts_std[:, 2:4, 1] = img_crop_height[:, None]
 
-        img_crop_sizes = np.stack([img_crop_width, img_crop_height], axis=1)
-        all_coeffs = self._get_perspective_transform(pts_std, boxes)
-        imgs: list[NDArray[np.uint8]] = []
-        for coeffs, dst_size in zip(all_coeffs, img_crop_sizes):
-            dst_img = img.transform(
-                size=tuple(dst_size),
-                method=Image.Transform.PERSPECTIVE,
-                data=tuple(coeffs),
-                resample=Image.Resampling.BICUBIC,
-            )
-
-            dst_width, dst_height = dst_img.size
-            if dst_height * 1.0 / dst_width >= 1.5:
-                dst_img = dst_img.rotate(90, expand=True)
-            imgs.append(pil_to_cv2(dst_img))
+        coeffs = self._get_perspective_transform(pts_std, boxes)
+        transforms = np.concatenate([coeffs, np.ones((len(coeffs), 1))], axis=1).reshape(-1, 3, 3).astype(np.float64)
+        crop_sizes = np.stack([img_crop_width, img_crop_height], axis=1)
 
-        return imgs
+        rotated = img_crop_height >= img_crop_width * 1.5
+        rotation = np.zeros((rotated.sum(), 3, 3))
+        rotation[:, 0, 1], rotation[:, 0, 2], rotation[:, 1, 0], rotation[:, 2, 2] = -1, img_crop_width[rotated], 1, 1
+        transforms[rotated] = transforms[rotated] @ rotation
+        crop_sizes[rotated] = crop_sizes[rotated, ::-1]
+        return transforms, crop_sizes
 
     def _get_perspective_transform(self, src: NDArray[np.float32], dst: NDArray[np.float32]) -> NDArray[np.float32]:
         N = src.shape[0]
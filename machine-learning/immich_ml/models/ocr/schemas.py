@@ -1,8 +1,7 @@
-from typing import Any, Iterable
+from typing import Iterable
 
 import numpy as np
 import numpy.typing as npt
-from rapidocr.utils.typings import EngineType, LangRec
 from typing_extensions import TypedDict
 
 
@@ -16,12 +15,3 @@ class TextRecognitionOutput(TypedDict):
     boxScore: npt.NDArray[np.float32]
     text: Iterable[str]
     textScore: npt.NDArray[np.float32]
-
-
-# RapidOCR expects `engine_type`, `lang_type`, and `font_path` to be attributes
-class OcrOptions(dict[str, Any]):
-    def __init__(self, lang_type: LangRec | None = None, **options: Any) -> None:
-        super().__init__(**options)
-        self.engine_type = EngineType.ONNXRUNTIME
-        self.lang_type = lang_type
-        self.font_path = None
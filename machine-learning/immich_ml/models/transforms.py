@@ -1,5 +1,7 @@
 import string
+import threading
 from io import BytesIO
+from math import ceil
 from typing import IO
 
 import cv2
@@ -8,8 +10,16 @@ import orjson
 from numpy.typing import NDArray
 from PIL import Image
 
+from immich_ml.schemas import ImageBackend
+
 _PIL_RESAMPLING_METHODS = {resampling.name.lower(): resampling for resampling in Image.Resampling}
 _PUNCTUATION_TRANS = str.maketrans("", "", string.punctuation)
+_CV2_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
 
 
 def resize_pil(img: Image.Image, size: int) -> Image.Image:
@@ -29,6 +39,21 @@ def crop_pil(img: Image.Image, size: int) -> Image.Image:
     return img.crop((left, upper, right, lower))
 
 
+def resize_cv2(img: NDArray[np.uint8], size: int) -> NDArray[np.uint8]:
+    height, width = img.shape[:2]
+    if width < height:
+        dsize = (size, int((height / width) * size))
+    else:
+        dsize = (int((width / height) * size), size)
+    return cv2.resize(img, dsize, interpolation=cv2.INTER_AREA)  # type: ignore
+
+
+def crop_cv2(img: NDArray[np.uint8], size: int) -> NDArray[np.uint8]:
+    left = int((img.shape[1] / 2) - (size / 2))
+    upper = int((img.shape[0] / 2) - (size / 2))
+    return img[upper : upper + size, left : left + size]
+
+
 def to_numpy(img: Image.Image) -> NDArray[np.float32]:
     return np.asarray(img if img.mode == "RGB" else img.convert("RGB"), dtype=np.float32) / 255.0
 
@@ -39,6 +64,29 @@ def normalize(
     return (img - mean) / std
 
 
+def get_normalization_lut(mean: NDArray[np.float32], std: NDArray[np.float32]) -> NDArray[np.float32]:
+    """
+    Returns a (channels, 256) table mapping each uint8 value to its normalized value per channel.
+    The values are identical to those of `normalize(to_numpy(img), mean, std)`.
+    """
+    values = np.arange(256, dtype=np.float32)[:, None] / 255.0
+    return np.ascontiguousarray(normalize(values, mean, std).T)
+
+
+def normalize_to_nchw(
+    img: NDArray[np.uint8], lut: NDArray[np.float32], out: NDArray[np.float32] | None = None
+) -> NDArray[np.float32]:
+    """
+    Normalizes an HWC uint8 image into a 1CHW float32 tensor with one lookup per channel, avoiding the
+    intermediate float arrays of `to_numpy` and `normalize`. Writes into `out` if given.
+    """
+    if out is None:
+        out = np.empty((1, img.shape[2], img.shape[0], img.shape[1]), dtype=np.float32)
+    for channel in range(img.shape[2]):
+        np.take(lut[channel], img[..., channel], out=out[0, channel], mode="clip")
+    return out
+
+
 def get_pil_resampling(resample: str) -> Image.Resampling:
     return _PIL_RESAMPLING_METHODS[resample.lower()]
 
@@ -47,22 +95,183 @@ def pil_to_cv2(image: Image.Image) -> NDArray[np.uint8]:
     return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)  # type: ignore
 
 
-def decode_pil(image_bytes: bytes | IO[bytes] | Image.Image) -> Image.Image:
+def estimate_similarity_transforms(src: NDArray[np.float32], dst: NDArray[np.float32]) -> NDArray[np.float64]:
+    """
+    Returns the (N, 2, 3) similarity transforms mapping each (K, 2) point set in `src` onto the (K, 2) points `dst`,
+    solved for all N sets at once with the same least-squares estimate as skimage's `SimilarityTransform`.
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    src_mean, dst_mean = src.mean(axis=1), dst.mean(axis=0)
+    src_demean, dst_demean = src - src_mean[:, None], dst - dst_mean
+    covariance = np.einsum("ki,nkj->nij", dst_demean, src_demean) / src.shape[1]
+
+    # a reflection is never a valid solution, so the smallest singular value is negated when one would be needed
+    signs = np.ones((len(src), 2))
+    signs[np.linalg.det(covariance) < 0, 1] = -1.0
+    u, singular_values, vt = np.linalg.svd(covariance)
+    rotation = u @ (signs[:, :, None] * vt)
+    scale = (singular_values * signs).sum(axis=1) / src_demean.var(axis=1).sum(axis=1)
+
+    transforms = np.empty((len(src), 2, 3))
+    transforms[:, :, :2] = scale[:, None, None] * rotation
+    transforms[:, :, 2] = dst_mean - np.einsum("nij,nj->ni", transforms[:, :, :2], src_mean)
+    return transforms
+
+
+class ImageContext:
+    """
+    A decoded image shared by the models of a request. Downscaled levels and BGR arrays of the image are built
+    lazily and memoized, so models that need a smaller image resample from the closest level instead of the full image.
+    Levels are built with the backend the image was decoded with, i.e. from a PIL image or a BGR array.
+    """
+
+    def __init__(self, image: Image.Image | None = None, bgr: NDArray[np.uint8] | None = None) -> None:
+        if image is not None:
+            self.backend, self.size = ImageBackend.PIL, image.size
+            self.levels: dict[int, Image.Image] = {0: image}
+            self.bgr_levels: dict[int, NDArray[np.uint8]] = {}
+        elif bgr is not None:
+            self.backend, self.size = ImageBackend.CV2, (bgr.shape[1], bgr.shape[0])
+            self.levels, self.bgr_levels = {}, {0: bgr}
+        else:
+            raise ValueError("Either image or bgr must be provided")
+        # each level and BGR array has its own lock, so models needing different ones don't wait for each other
+        self.locks: dict[tuple[str, int], threading.Lock] = {}
+        self.locks_lock = threading.Lock()
+
+    @property
+    def image(self) -> Image.Image:
+        return self._level(0)
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    def level(self, min_size: tuple[int, int] | None = None) -> Image.Image:
+        """Returns the smallest level whose (shortest side, longest side) is at least `min_size`."""
+        return self._level(self._level_index(min_size))
+
+    def bgr(self, min_size: tuple[int, int] | None = None) -> NDArray[np.uint8]:
+        """Returns the smallest level satisfying `min_size` as a BGR array."""
+        return self._bgr(self._level_index(min_size))
+
+    def _level(self, index: int) -> Image.Image:
+        # built levels are read without locking, and are only built once as they're checked again under the lock
+        if (level := self.levels.get(index)) is None:
+            with self._lock("level", index):
+                if (level := self.levels.get(index)) is None:
+                    if self.backend == ImageBackend.CV2:
+                        level = Image.fromarray(cv2.cvtColor(self._bgr(index), cv2.COLOR_BGR2RGB))
+                    else:
+                        level = self._level(index - 1).reduce(2)
+                    self.levels[index] = level
+        return level
+
+    def _bgr(self, index: int) -> NDArray[np.uint8]:
+        if index not in self.bgr_levels:
+            with self._lock("bgr", index):
+                if index not in self.bgr_levels:
+                    if self.backend == ImageBackend.CV2:
+                        bgr = cv2.resize(self._bgr(0), self._level_size(index), interpolation=cv2.INTER_AREA)
+                    else:
+                        bgr = pil_to_cv2(self._level(index))
+                    self.bgr_levels[index] = bgr  # type: ignore[assignment]
+        return self.bgr_levels[index]
+
+    def _lock(self, kind: str, index: int) -> threading.Lock:
+        # building a representation only waits on the ones it's built from, which never depend on it in turn
+        with self.locks_lock:
+            if (lock := self.locks.get((kind, index))) is None:
+                lock = self.locks[(kind, index)] = threading.Lock()
+            return lock
+
+    def _level_size(self, index: int) -> tuple[int, int]:
+        # each level halves the previous one, rounding up the same way as Image.reduce
+        width, height = self.size
+        for _ in range(index):
+            width, height = (width + 1) // 2, (height + 1) // 2
+        return width, height
+
+    def _level_index(self, min_size: tuple[int, int] | None) -> int:
+        if min_size is None:
+            return 0
+        index, size = 0, self.size
+        while True:
+            next_size = self._level_size(index + 1)
+            # a 1x1 level can't be reduced any further
+            if next_size == size:
+                return index
+            width, height = next_size
+            if min(width, height) < max(min_size[0], 1) or max(width, height) < min_size[1]:
+                return index
+            index, size = index + 1, next_size
+
+
+def decode_pil(
+    image_bytes: bytes | IO[bytes] | Image.Image | ImageContext, min_size: tuple[int, int] | None = None
+) -> Image.Image:
+    """
+    Decodes an image. If `min_size` is given as (shortest side, longest side), JPEGs are decoded at the smallest
+    scale that still satisfies it, which is much faster than decoding at full resolution and resizing afterwards.
+    """
     if isinstance(image_bytes, Image.Image):
         return image_bytes
+    if isinstance(image_bytes, ImageContext):
+        return image_bytes.image
     image: Image.Image = Image.open(BytesIO(image_bytes) if isinstance(image_bytes, bytes) else image_bytes)
+    if min_size is not None and image.format == "JPEG":
+        scale = max(min_size[0] / min(image.size), min_size[1] / max(image.size))
+        if scale < 1:
+            image.draft("RGB", (ceil(image.width * scale), ceil(image.height * scale)))
     image.load()
     if not image.mode == "RGB":
         image = image.convert("RGB")
     return image
 
 
-def decode_cv2(image_bytes: NDArray[np.uint8] | bytes | Image.Image) -> NDArray[np.uint8]:
+def decode_bgr(image_bytes: bytes, min_size: tuple[int, int] | None = None) -> NDArray[np.uint8]:
+    """
+    Decodes an image with OpenCV. If `min_size` is given as (shortest side, longest side), the image is decoded at
+    the smallest power-of-two reduction that still satisfies it, which JPEG decoding applies during decoding.
+    """
+    reduction = 1
+    if min_size is not None:
+        width, height = Image.open(BytesIO(image_bytes)).size  # only reads the header
+        for factor in (8, 4, 2):
+            reduced = (ceil(width / factor), ceil(height / factor))
+            if min(reduced) >= max(min_size[0], 1) and max(reduced) >= min_size[1]:
+                reduction = factor
+                break
+    # orientation is ignored to match Pillow, which doesn't apply EXIF orientation either
+    flags = _CV2_REDUCED_FLAGS[reduction] | cv2.IMREAD_IGNORE_ORIENTATION
+    image: NDArray[np.uint8] | None = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags)  # type: ignore
+    if image is None:
+        # formats OpenCV can't decode
+        return pil_to_cv2(decode_pil(image_bytes, min_size))
+    return image
+
+
+def decode_image(
+    image_bytes: bytes, min_size: tuple[int, int] | None = None, backend: ImageBackend = ImageBackend.PIL
+) -> ImageContext:
+    if backend == ImageBackend.CV2:
+        return ImageContext(bgr=decode_bgr(image_bytes, min_size))
+    return ImageContext(decode_pil(image_bytes, min_size))
+
+
+def decode_cv2(image_bytes: NDArray[np.uint8] | bytes | Image.Image | ImageContext) -> NDArray[np.uint8]:
     match image_bytes:
         case bytes() | memoryview() | bytearray():
-            return pil_to_cv2(decode_pil(image_bytes))  # pillow is much faster than cv2
+            return pil_to_cv2(decode_pil(image_bytes))  # see benchmarks.image_backends for how this compares to cv2
         case Image.Image():
             return pil_to_cv2(image_bytes)
+        case ImageContext():
+            return image_bytes.bgr()
         case _:
             return image_bytes
 
@@ -51,6 +51,11 @@ class ModelPrecision(StrEnum):
     FP32 = "FP32"
 
 
+class ImageBackend(StrEnum):
+    CV2 = "cv2"
+    PIL = "pil"
+
+
 ModelIdentity = tuple[ModelType, ModelTask]
 
 
@@ -59,14 +64,16 @@ class SessionNode(Protocol):
     def name(self) -> str | None: ...
 
     @property
-    def shape(self) -> tuple[int, ...]: ...
+    def shape(self) -> tuple[int | str, ...]: ...
 
 
 class ModelSession(Protocol):
     def run(
         self,
         output_names: list[str] | None,
-        input_feed: dict[str, npt.NDArray[np.float32]] | dict[str, npt.NDArray[np.int32]],
+        input_feed: (
+            dict[str, npt.NDArray[np.float32]] | dict[str, npt.NDArray[np.int32]] | dict[str, npt.NDArray[np.uint8]]
+        ),
         run_options: Any = None,
     ) -> list[npt.NDArray[np.float32]]: ...
 
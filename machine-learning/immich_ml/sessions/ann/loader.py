@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from ctypes import CDLL, Array, c_bool, c_char_p, c_int, c_ulong, c_void_p
 from os.path import exists
+from threading import local
 from typing import Any, Protocol, TypeVar
 
 import numpy as np
@@ -31,6 +32,17 @@ except OSError as e:
 T = TypeVar("T", covariant=True)
 
 
+class AnnBuffers:
+    """
+    Output tensors and ctypes pointer arrays of a network, reused across executions to avoid per-call allocations.
+    """
+
+    def __init__(self, num_inputs: int, output_shapes: tuple[tuple[int, ...], ...]) -> None:
+        self.outputs: list[NDArray[np.float32]] = [np.empty(s, dtype=np.float32) for s in output_shapes]
+        self.input_ptrs = (c_void_p * num_inputs)()
+        self.output_ptrs = (c_void_p * len(self.outputs))(*[t.ctypes.data for t in self.outputs])
+
+
 class Newable(Protocol[T]):
     def new(self) -> None: ...
 
@@ -63,6 +75,9 @@ class Ann(metaclass=_Singleton):
         self.tuning_file = tuning_file
         self.output_shapes: dict[int, tuple[tuple[int], ...]] = {}
         self.input_shapes: dict[int, tuple[tuple[int], ...]] = {}
+        # each thread has its own ring of buffers per network, so concurrent executions neither share nor wait for them
+        self.buffers: dict[int, local] = {}
+        self.output_buffers: dict[int, int] = {}
         self.ann: int | None = None
         self.new()
 
@@ -100,7 +115,15 @@ class Ann(metaclass=_Singleton):
         fast_math: bool = True,
         fp16: bool = False,
         cached_network_path: str | None = None,
+        output_buffers: int = 1,
     ) -> int:
+        """
+        Loads a network and returns its ID. `execute` hands out its outputs from a ring of `output_buffers` buffer sets
+        per thread without copying them, so each output is only valid until that many further executions of the
+        network on the same thread.
+        """
+        if output_buffers < 1:
+            raise ValueError("output_buffers must be at least 1")
         if not model_path.endswith((".armnn", ".tflite", ".onnx")):
             raise ValueError("model_path must be a file with extension .armnn, .tflite or .onnx")
         if not exists(model_path):
@@ -129,11 +152,15 @@ class Ann(metaclass=_Singleton):
         self.output_shapes[net_id] = tuple(
             self.shape(net_id, input=False, index=i) for i in range(self.tensors(net_id, input=False))
         )
+        self.buffers[net_id] = local()
+        self.output_buffers[net_id] = output_buffers
         return net_id
 
     def unload(self, network_id: int) -> None:
         libann.unload(self.ann, network_id)
         del self.output_shapes[network_id]
+        del self.buffers[network_id]
+        del self.output_buffers[network_id]
 
     def execute(self, network_id: int, input_tensors: list[NDArray[np.float32]]) -> list[NDArray[np.float32]]:
         if not isinstance(input_tensors, list):
@@ -141,20 +168,29 @@ class Ann(metaclass=_Singleton):
         net_input_shapes = self.input_shapes[network_id]
         if len(input_tensors) != len(net_input_shapes):
             raise ValueError(f"input_tensors lengths {len(input_tensors)} != network inputs {len(net_input_shapes)}")
-        for net_input_shape, input_tensor in zip(net_input_shapes, input_tensors):
+
+        buffers = self._next_buffers(network_id)
+        for i, (net_input_shape, input_tensor) in enumerate(zip(net_input_shapes, input_tensors)):
             if net_input_shape != input_tensor.shape:
                 raise ValueError(f"input_tensor shape {input_tensor.shape} != network input shape {net_input_shape}")
             if not input_tensor.flags.c_contiguous:
                 raise ValueError("input_tensors must be c_contiguous numpy ndarrays")
-        output_tensors: list[NDArray[np.float32]] = [
-            np.ndarray(s, dtype=np.float32) for s in self.output_shapes[network_id]
-        ]
-        input_type = c_void_p * len(input_tensors)
-        inputs = input_type(*[t.ctypes.data_as(c_void_p) for t in input_tensors])
-        output_type = c_void_p * len(output_tensors)
-        outputs = output_type(*[t.ctypes.data_as(c_void_p) for t in output_tensors])
-        libann.execute(self.ann, network_id, inputs, outputs)
-        return output_tensors
+            buffers.input_ptrs[i] = input_tensor.ctypes.data
+        libann.execute(self.ann, network_id, buffers.input_ptrs, buffers.output_ptrs)
+        return buffers.outputs
+
+    def _next_buffers(self, network_id: int) -> AnnBuffers:
+        thread_buffers = self.buffers[network_id]
+        ring: list[AnnBuffers] | None = getattr(thread_buffers, "ring", None)
+        if ring is None:
+            num_inputs, output_shapes = len(self.input_shapes[network_id]), self.output_shapes[network_id]
+            ring = thread_buffers.ring = [
+                AnnBuffers(num_inputs, output_shapes) for _ in range(self.output_buffers[network_id])
+            ]
+            thread_buffers.index = 0
+        buffers = ring[thread_buffers.index]
+        thread_buffers.index = (thread_buffers.index + 1) % len(ring)
+        return buffers
 
     def shape(self, network_id: int, input: bool = False, index: int = 0) -> tuple[int]:
         s = libann.shape(self.ann, network_id, input, index)
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import json
+import os
+import time
+from functools import cached_property
 from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
 from typing import Any
 
 import numpy as np
+import onnx
 import onnxruntime as ort
 from numpy.typing import NDArray
 
 from immich_ml.models.constants import SUPPORTED_PROVIDERS
-from immich_ml.schemas import SessionNode
+from immich_ml.schemas import ModelPrecision, SessionNode
 
 from ..config import log, settings
 
@@ -28,11 +35,58 @@ class OrtSession:
         self.provider_options = provider_options if provider_options is not None else self._provider_options_default
         self.sess_options = sess_options if sess_options is not None else self._sess_options_default
         self.session = ort.InferenceSession(
-            self.model_path.as_posix(),
+            (self._external_data_path() if settings.model_mmap else self.model_path).as_posix(),
             providers=self.providers,
             provider_options=self.provider_options,
             sess_options=self.sess_options,
         )
+        self.last_arena_shrink = time.monotonic()
+
+    def _external_data_path(self) -> Path:
+        """
+        Returns a copy of the model that stores its weights in a separate file, which ORT memory-maps rather than
+        reading into the heap, so the weights are shared via the page cache across workers and reloads.
+        Models that already store their weights as external data are used as they are.
+        """
+        copy_dir = self.model_path.parent / "mmap" / self.model_path.stem
+        copy_path = copy_dir / self.model_path.name
+        # the copy is keyed on the source so that it's rebuilt when the model is rewritten, e.g. to add a batch axis
+        stat = self.model_path.stat()
+        source = f"{stat.st_size} {stat.st_mtime_ns}"
+        source_path = copy_dir / f"{self.model_path.name}.source"
+        if self._is_external_data_current(copy_path, source_path, source):
+            return copy_path
+
+        proto = onnx.load(self.model_path, load_external_data=False)
+        if any(init.data_location == onnx.TensorProto.EXTERNAL for init in proto.graph.initializer):
+            return self.model_path
+
+        log.info(f"Moving weights of model {self.model_path} to an external file to allow memory-mapping")
+        copy_dir.parent.mkdir(exist_ok=True)
+        tmp_dir = Path(mkdtemp(prefix=f".{copy_dir.name}.", dir=copy_dir.parent))
+        try:
+            onnx.save_model(
+                proto,
+                tmp_dir / copy_path.name,
+                save_as_external_data=True,
+                all_tensors_to_one_file=True,
+                location=f"{copy_path.name}.data",
+            )
+            (tmp_dir / source_path.name).write_text(source)
+            if copy_dir.exists():
+                log.info(f"Replacing outdated memory-mapped copy of model {self.model_path}")
+                # existing mappings of the old weights stay valid after they're unlinked
+                rmtree(copy_dir, ignore_errors=True)
+            os.replace(tmp_dir, copy_dir)
+        except OSError:
+            # another worker may have finished first
+            rmtree(tmp_dir, ignore_errors=True)
+            if not self._is_external_data_current(copy_path, source_path, source):
+                raise
+        return copy_path
+
+    def _is_external_data_current(self, copy_path: Path, source_path: Path, source: str) -> bool:
+        return copy_path.is_file() and source_path.is_file() and source_path.read_text() == source
 
     def get_inputs(self) -> list[SessionNode]:
         inputs: list[SessionNode] = self.session.get_inputs()
@@ -45,12 +99,46 @@ class OrtSession:
     def run(
         self,
         output_names: list[str] | None,
-        input_feed: dict[str, NDArray[np.float32]] | dict[str, NDArray[np.int32]],
+        input_feed: dict[str, NDArray[np.float32]] | dict[str, NDArray[np.int32]] | dict[str, NDArray[np.uint8]],
         run_options: Any = None,
     ) -> list[NDArray[np.float32]]:
+        if run_options is None and self._should_shrink_arena(input_feed):
+            run_options = self._shrink_arena_run_options
+            self.last_arena_shrink = time.monotonic()
         outputs: list[NDArray[np.float32]] = self.session.run(output_names, input_feed, run_options)
         return outputs
 
+    def _should_shrink_arena(
+        self, input_feed: dict[str, NDArray[np.float32]] | dict[str, NDArray[np.int32]] | dict[str, NDArray[np.uint8]]
+    ) -> bool:
+        if not self._arena_devices:
+            return False
+        if settings.model_arena_shrink_threshold_mb > 0:
+            input_mb = sum(value.nbytes for value in input_feed.values()) / 2**20
+            if input_mb >= settings.model_arena_shrink_threshold_mb:
+                return True
+        if settings.model_arena_shrink_interval_s > 0:
+            return time.monotonic() - self.last_arena_shrink >= settings.model_arena_shrink_interval_s
+        return False
+
+    @cached_property
+    def _arena_devices(self) -> list[str]:
+        # ORT rejects shrinkage requests for devices that don't have an arena
+        devices = []
+        providers = self.session.get_providers()
+        if self.sess_options.enable_cpu_mem_arena:
+            devices.append("cpu:0")
+        if "CUDAExecutionProvider" in providers or "ROCMExecutionProvider" in providers:
+            devices.append(f"gpu:{settings.device_id}")
+        return devices
+
+    @cached_property
+    def _shrink_arena_run_options(self) -> ort.RunOptions:
+        # unused arena chunks are released once the run completes
+        run_options = ort.RunOptions()
+        run_options.add_run_config_entry("memory.enable_memory_arena_shrinkage", ";".join(self._arena_devices))
+        return run_options
+
     @property
     def providers(self) -> list[str]:
         return self._providers
@@ -68,8 +156,11 @@ class OrtSession:
             device_ids: list[str] = ort.capi._pybind_state.get_available_openvino_device_ids()
             log.debug(f"Available OpenVINO devices: {device_ids}")
 
-            gpu_devices = [device_id for device_id in device_ids if device_id.startswith("GPU")]
-            if not gpu_devices:
+            if settings.openvino_cpu:
+                if "CPU" not in device_ids:
+                    log.warning("No CPU device found in OpenVINO. Falling back to CPU.")
+                    available_providers.remove(openvino)
+            elif not any(device_id.startswith("GPU") for device_id in device_ids):
                 log.warning("No GPU device found in OpenVINO. Falling back to CPU.")
                 available_providers.remove(openvino)
         return [provider for provider in SUPPORTED_PROVIDERS if provider in available_providers]
@@ -94,12 +185,21 @@ class OrtSession:
                     options = {"arena_extend_strategy": "kSameAsRequested", "device_id": settings.device_id}
                 case "OpenVINOExecutionProvider":
                     openvino_dir = self.model_path.parent / "openvino"
-                    device = f"GPU.{settings.device_id}"
-                    options = {
-                        "device_type": device,
-                        "precision": settings.openvino_precision.value,
-                        "cache_dir": openvino_dir.as_posix(),
-                    }
+                    if settings.openvino_cpu:
+                        # the CPU device only accepts FP32 as a precision, so FP16 is set through the plugin instead
+                        hint = "f16" if settings.openvino_precision == ModelPrecision.FP16 else "f32"
+                        precision = {"CPU": {"INFERENCE_PRECISION_HINT": hint}}
+                        options = {
+                            "device_type": "CPU",
+                            "load_config": json.dumps(precision),
+                            "cache_dir": openvino_dir.as_posix(),
+                        }
+                    else:
+                        options = {
+                            "device_type": f"GPU.{settings.device_id}",
+                            "precision": settings.openvino_precision.value,
+                            "cache_dir": openvino_dir.as_posix(),
+                        }
                 case "CoreMLExecutionProvider":
                     options = {
                         "ModelFormat": "MLProgram",
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from functools import cache
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from immich_ml.config import log
+from immich_ml.schemas import ModelFormat, ModelSession
+
+ENTRY_POINT_GROUP = "immich_ml.sessions"
+
+
+class SessionBackend(NamedTuple):
+    factory: Callable[[Path], ModelSession]
+    needs_model_file: bool = True
+
+
+# the session modules import from `immich_ml.models`, which imports this module, so they're only imported when used
+def _ann_session(model_path: Path) -> ModelSession:
+    from .ann import AnnSession
+
+    return AnnSession(model_path)
+
+
+def _ort_session(model_path: Path) -> ModelSession:
+    from .ort import OrtSession
+
+    return OrtSession(model_path)
+
+
+def _rknn_session(model_path: Path) -> ModelSession:
+    from .rknn import RknnSession
+
+    return RknnSession(model_path)
+
+
+def _synthetic_session(model_path: Path) -> ModelSession:
+    from .synthetic import SyntheticSession
+
+    return SyntheticSession(model_path)
+
+
+builtin_backends: dict[str, SessionBackend] = {
+    ModelFormat.ARMNN: SessionBackend(_ann_session),
+    ModelFormat.ONNX: SessionBackend(_ort_session),
+    ModelFormat.RKNN: SessionBackend(_rknn_session),
+    "synthetic": SessionBackend(_synthetic_session, needs_model_file=False),
+}
+
+
+@cache
+def get_session_backends() -> dict[str, SessionBackend]:
+    """
+    Returns the built-in session backends along with any registered by installed packages.
+    Packages can register a backend under the `immich_ml.sessions` entry point group, pointing either to a
+    `SessionBackend` or to a callable that takes the model path and returns a `ModelSession`.
+    """
+    backends = dict(builtin_backends)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            backend = entry_point.load()
+        except Exception:
+            log.exception(f"Failed to load session backend '{entry_point.name}' from {entry_point.value}")
+            continue
+        log.debug(f"Registered session backend '{entry_point.name}' from {entry_point.value}")
+        backends[entry_point.name] = backend if isinstance(backend, SessionBackend) else SessionBackend(backend)
+    return backends
+
+
+def get_session_backend(name: str) -> SessionBackend:
+    backend = get_session_backends().get(name)
+    if backend is None:
+        raise ValueError(f"Unsupported session backend: {name}")
+    return backend
+
+
+__all__ = ["SessionBackend", "get_session_backend", "get_session_backends"]
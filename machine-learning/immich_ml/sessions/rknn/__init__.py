@@ -14,6 +14,9 @@ from .rknnpool import RknnPoolExecutor, is_available, soc_name
 is_available = is_available and settings.rknn
 model_prefix = Path("rknpu") / soc_name if is_available and soc_name is not None else None
 
+# from rknn_api.h
+RKNN_TENSOR_NHWC = 1
+
 
 def run_inference(rknn_lite: Any, input: list[NDArray[np.float32]]) -> list[NDArray[np.float32]]:
     outputs: list[NDArray[np.float32]] = rknn_lite.inference(inputs=input, data_format="nchw")
@@ -47,25 +50,69 @@ class RknnSession:
         log.info(f"Loading RKNN model from {model_path} with {self.tpe} threads.")
         self.rknnpool = RknnPoolExecutor(model_path=model_path.as_posix(), tpes=self.tpe, func=run_inference)
         log.info(f"Loaded RKNN model from {model_path} with {self.tpe} threads.")
+        self.io_mapping = self._query_io_mapping()
 
     def get_inputs(self) -> list[SessionNode]:
-        return [RknnNode(name=k, shape=v) for k, v in input_output_mapping[self.model_type]["input"].items()]
+        return [RknnNode(name=k, shape=v) for k, v in self.io_mapping["input"].items()]
 
     def get_outputs(self) -> list[SessionNode]:
-        return [RknnNode(name=k, shape=v) for k, v in input_output_mapping[self.model_type]["output"].items()]
+        return [RknnNode(name=k, shape=v) for k, v in self.io_mapping["output"].items()]
 
     def run(
         self,
         output_names: list[str] | None,
-        input_feed: dict[str, NDArray[np.float32]] | dict[str, NDArray[np.int32]],
+        input_feed: dict[str, NDArray[np.float32]] | dict[str, NDArray[np.int32]] | dict[str, NDArray[np.uint8]],
         run_options: Any = None,
     ) -> list[NDArray[np.float32]]:
         input_data: list[NDArray[np.float32]] = [np.ascontiguousarray(v) for v in input_feed.values()]
-        self.rknnpool.put(input_data)
-        res = self.rknnpool.get()
-        if res is None:
-            raise RuntimeError("RKNN inference failed!")
-        return res
+        batch_size = next(iter(self.io_mapping["input"].values()))[0]
+        num_inputs = input_data[0].shape[0]
+        if num_inputs == batch_size:
+            return self.rknnpool.submit(input_data).result()
+
+        # the model has a static batch size, so larger batches are split across the pool's contexts
+        # and short chunks are padded to the batch size
+        chunks = [[v[i : i + batch_size] for v in input_data] for i in range(0, num_inputs, batch_size)]
+        futures = [self.rknnpool.submit([self._pad(v, batch_size) for v in chunk]) for chunk in chunks]
+        results = [
+            # outputs are either batched or flattened across the batch, so the padding is at the end in both cases
+            [output[: len(output) * len(chunk[0]) // batch_size] for output in future.result()]
+            for chunk, future in zip(chunks, futures)
+        ]
+        if len(results) == 1:
+            return results[0]
+        return [np.concatenate(outputs, axis=0) for outputs in zip(*results)]
+
+    @staticmethod
+    def _pad(input: NDArray[np.float32], batch_size: int) -> NDArray[np.float32]:
+        if len(input) == batch_size:
+            return input
+        padding = np.zeros((batch_size - len(input), *input.shape[1:]), dtype=input.dtype)
+        return np.concatenate([input, padding])
+
+    def _query_io_mapping(self) -> dict[str, dict[str, tuple[int, ...]]]:
+        try:
+            # not part of RKNNLite's public API, so the static shapes are used if it's missing or has changed
+            runtime = self.rknnpool.rknn_pool[0].rknn_runtime
+            num_inputs, num_outputs = runtime.get_in_out_num()
+            inputs = [runtime.get_tensor_attr(i) for i in range(num_inputs)]
+            outputs = [runtime.get_tensor_attr(i, is_output=True) for i in range(num_outputs)]
+            return {
+                "input": {attr.name: self._to_nchw(attr) for attr in inputs},
+                "output": {attr.name: tuple(attr.dims[: attr.n_dims]) for attr in outputs},
+            }
+        except (AttributeError, TypeError, ValueError) as e:
+            log.warning(f"Could not query tensor attributes of RKNN model, using defaults for {self.model_type}: {e!r}")
+            mapping: dict[str, dict[str, tuple[int, ...]]] = input_output_mapping[self.model_type]
+            return mapping
+
+    @staticmethod
+    def _to_nchw(attr: Any) -> tuple[int, ...]:
+        # inputs are passed as NCHW, but RKNN reports image inputs in its native NHWC format
+        dims = tuple(attr.dims[: attr.n_dims])
+        if attr.fmt == RKNN_TENSOR_NHWC and len(dims) == 4:
+            return (dims[0], dims[3], dims[1], dims[2])
+        return dims
 
 
 class RknnNode(NamedTuple):
@@ -66,21 +66,23 @@ class RknnPoolExecutor:
         func: Callable[["RKNNLite", list[NDArray[np.float32]]], list[NDArray[np.float32]]],
     ) -> None:
         self.tpes = tpes
-        self.queue: Queue[Future[list[NDArray[np.float32]]]] = Queue()
         self.rknn_pool = [init_rknn(model_path) for _ in range(tpes)]
+        # idle contexts are checked out for the duration of an inference so no two threads share one
+        self.idle: Queue["RKNNLite"] = Queue()
+        for rknn_lite in self.rknn_pool:
+            self.idle.put(rknn_lite)
         self.pool = ThreadPoolExecutor(max_workers=tpes)
         self.func = func
-        self.num = 0
 
-    def put(self, inputs: list[NDArray[np.float32]]) -> None:
-        self.queue.put(self.pool.submit(self.func, self.rknn_pool[self.num % self.tpes], inputs))
-        self.num += 1
+    def submit(self, inputs: list[NDArray[np.float32]]) -> Future[list[NDArray[np.float32]]]:
+        return self.pool.submit(self._run, inputs)
 
-    def get(self) -> list[NDArray[np.float32]] | None:
-        if self.queue.empty():
-            return None
-        fut = self.queue.get()
-        return fut.result()
+    def _run(self, inputs: list[NDArray[np.float32]]) -> list[NDArray[np.float32]]:
+        rknn_lite = self.idle.get()
+        try:
+            return self.func(rknn_lite, inputs)
+        finally:
+            self.idle.put(rknn_lite)
 
     def release(self) -> None:
         self.pool.shutdown()
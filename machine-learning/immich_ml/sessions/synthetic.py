@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from immich_ml.config import log, settings
+from immich_ml.schemas import ModelTask, ModelType, SessionNode
+
+input_output_mapping: dict[tuple[ModelTask, ModelType], dict[str, dict[str, tuple[int | str, ...]]]] = {
+    (ModelTask.SEARCH, ModelType.VISUAL): {
+        "input": {"image": ("batch", 3, "height", "width")},
+        "output": {"embedding": ("batch", "embed_dim")},
+    },
+    (ModelTask.SEARCH, ModelType.TEXTUAL): {
+        "input": {"text": ("batch", "context_length")},
+        "output": {"embedding": ("batch", "embed_dim")},
+    },
+    (ModelTask.FACIAL_RECOGNITION, ModelType.DETECTION): {
+        "input": {"input.1": (1, 3, "?", "?")},
+        "output": {
+            **{f"score_{stride}": ("?", 1) for stride in (8, 16, 32)},
+            **{f"bbox_{stride}": ("?", 4) for stride in (8, 16, 32)},
+            **{f"kps_{stride}": ("?", 10) for stride in (8, 16, 32)},
+        },
+    },
+    (ModelTask.FACIAL_RECOGNITION, ModelType.RECOGNITION): {
+        "input": {"input.1": ("batch", 3, 112, 112)},
+        "output": {"embedding": ("batch", 512)},
+    },
+    (ModelTask.OCR, ModelType.DETECTION): {
+        "input": {"x": (1, 3, "?", "?")},
+        "output": {"probability_map": (1, 1, "?", "?")},
+    },
+    (ModelTask.OCR, ModelType.RECOGNITION): {
+        "input": {"x": ("batch", 3, 48, "?")},
+        # one time step per 8 pixels of width, with a class for the blank, each character and a space
+        "output": {"fetch_name_0": ("batch", "?", 97)},
+    },
+}
+
+
+class SyntheticSession:
+    """
+    Session that returns randomly generated outputs of the expected shape instead of running a model.
+    Used to load test and profile the rest of the service without model files or accelerators.
+    """
+
+    def __init__(self, model_path: Path) -> None:
+        self.model_path = model_path
+        self.model_dir, self.model_task, self.model_type = self._parse_model_path(model_path)
+        if (self.model_task, self.model_type) not in input_output_mapping:
+            raise ValueError(f"Synthetic session does not support {self.model_task} {self.model_type} models")
+        self.rng = np.random.default_rng()
+        self.embed_dim = self._embed_dim_default
+        log.info(f"Using synthetic session for {self.model_type} model at {model_path}")
+
+    def get_inputs(self) -> list[SessionNode]:
+        mapping = input_output_mapping[(self.model_task, self.model_type)]
+        return [SyntheticNode(name=k, shape=v) for k, v in mapping["input"].items()]
+
+    def get_outputs(self) -> list[SessionNode]:
+        mapping = input_output_mapping[(self.model_task, self.model_type)]
+        return [SyntheticNode(name=k, shape=v) for k, v in mapping["output"].items()]
+
+    def run(
+        self,
+        output_names: list[str] | None,
+        input_feed: dict[str, NDArray[np.float32]] | dict[str, NDArray[np.int32]] | dict[str, NDArray[np.uint8]],
+        run_options: Any = None,
+    ) -> list[NDArray[np.float32]]:
+        input: NDArray[Any] = next(iter(input_feed.values()))
+        match self.model_task, self.model_type:
+            case ModelTask.FACIAL_RECOGNITION, ModelType.DETECTION:
+                outputs = self._detect_faces(input.shape[0], *input.shape[2:])
+            case ModelTask.OCR, ModelType.DETECTION:
+                outputs = [self._detect_text(input.shape[0], *input.shape[2:])]
+            case ModelTask.OCR, ModelType.RECOGNITION:
+                outputs = [self._recognize_text(input.shape[0], input.shape[3] // 8, 97)]
+            case ModelTask.FACIAL_RECOGNITION, ModelType.RECOGNITION:
+                outputs = [self._embed(input.shape[0], 512)]
+            case _:
+                outputs = [self._embed(input.shape[0], self.embed_dim)]
+
+        if settings.synthetic_latency_ms > 0:
+            time.sleep(settings.synthetic_latency_ms / 1000)
+        return outputs
+
+    def _embed(self, batch_size: int, embed_dim: int) -> NDArray[np.float32]:
+        embeddings = self.rng.standard_normal((batch_size, embed_dim), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings
+
+    def _detect_faces(self, batch_size: int, height: int, width: int) -> list[NDArray[np.float32]]:
+        # RetinaFace outputs scores, then box distances, then landmark offsets for 2 anchors per position and stride,
+        # flattened across the batch in image order
+        scores, bboxes, kps = [], [], []
+        for stride in (8, 16, 32):
+            num_anchors = (height // stride) * (width // stride) * 2
+            scores.append(np.zeros((num_anchors, 1), dtype=np.float32))
+            bboxes.append(np.full((num_anchors, 4), 2.0, dtype=np.float32))
+            kps.append(self.rng.uniform(-1.0, 1.0, (num_anchors, 10)).astype(np.float32))
+
+        # a single confident face in the center so recognition has something to do
+        center = ((height // 32 // 2) * (width // 32) + width // 32 // 2) * 2
+        scores[-1][center] = 0.99
+        return [np.tile(output, (batch_size, 1)) for output in scores + bboxes + kps]
+
+    def _detect_text(self, batch_size: int, height: int, width: int) -> NDArray[np.float32]:
+        # a single line of text in the center so recognition has something to do
+        probability_map = np.zeros((batch_size, 1, height, width), dtype=np.float32)
+        probability_map[..., height * 7 // 16 : height * 9 // 16, width // 4 : width * 3 // 4] = 0.9
+        return probability_map
+
+    def _recognize_text(self, batch_size: int, num_steps: int, num_classes: int) -> NDArray[np.float32]:
+        # a confident character at every other time step, with blanks in between so repeats aren't merged
+        probabilities = np.zeros((batch_size, num_steps, num_classes), dtype=np.float32)
+        probabilities[:, 1::2, 0] = 0.99
+        characters = self.rng.integers(1, num_classes, (batch_size, (num_steps + 1) // 2))
+        np.put_along_axis(probabilities[:, ::2], characters[:, :, None], 0.99, axis=2)
+        return probabilities
+
+    @property
+    def _embed_dim_default(self) -> int:
+        model_cfg_path = self.model_dir.parent / "config.json"
+        if self.model_task == ModelTask.SEARCH and model_cfg_path.is_file():
+            embed_dim: int = json.load(model_cfg_path.open())["embed_dim"]
+            return embed_dim
+        return 512
+
+    @staticmethod
+    def _parse_model_path(model_path: Path) -> tuple[Path, ModelTask, ModelType]:
+        # models are stored as <cache folder>/<task>/<model name>/<type>/...
+        for model_dir in model_path.parents:
+            if model_dir.name in list(ModelType) and len(model_dir.parents) > 1:
+                return model_dir, ModelTask(model_dir.parents[1].name), ModelType(model_dir.name)
+        raise ValueError(f"Could not determine model task and type from path {model_path}")
+
+
+class SyntheticNode(NamedTuple):
+    name: str | None
+    shape: tuple[int | str, ...]
+
+
+__all__ = ["SyntheticSession", "SyntheticNode"]
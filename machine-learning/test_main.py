@@ -1,35 +1,80 @@
 import json
 import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from ctypes import c_float
 from io import BytesIO
 from pathlib import Path
 from random import randint
 from types import SimpleNamespace
-from typing import Any, Callable
+from typing import Any, Callable, Iterator
 from unittest import mock
 
 import cv2
 import numpy as np
+import onnx
 import onnxruntime as ort
 import orjson
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from insightface.model_zoo import RetinaFace
+from insightface.utils.face_align import arcface_dst, norm_crop
+from numpy.typing import NDArray
 from PIL import Image
 from pytest import MonkeyPatch
 from pytest_mock import MockerFixture
+from rapidocr.ch_ppocr_det.utils import DBPostProcess as RapidDBPostProcess
+from rapidocr.ch_ppocr_rec.utils import CTCLabelDecode
+from skimage.transform import SimilarityTransform
 
-from immich_ml.config import Settings, settings
-from immich_ml.main import load, preload_models
+import immich_ml.models.transforms
+from immich_ml.config import MaxBatchSize, Settings, settings
+from immich_ml.main import load, preload_models, run_inference
 from immich_ml.models.base import InferenceModel
 from immich_ml.models.cache import ModelCache
 from immich_ml.models.clip.textual import MClipTextualEncoder, OpenClipTextualEncoder
 from immich_ml.models.clip.visual import OpenClipVisualEncoder
 from immich_ml.models.facial_recognition.detection import FaceDetector
 from immich_ml.models.facial_recognition.recognition import FaceRecognizer
-from immich_ml.schemas import ModelFormat, ModelPrecision, ModelTask, ModelType
+from immich_ml.models.ocr.detection import TextDetector, _tile_spans
+from immich_ml.models.ocr.postprocess import DBPostProcess, _box_points
+from immich_ml.models.ocr.recognition import TextRecognizer
+from immich_ml.models.transforms import (
+    ImageContext,
+    crop_cv2,
+    crop_pil,
+    decode_bgr,
+    decode_image,
+    decode_pil,
+    estimate_similarity_transforms,
+    get_normalization_lut,
+    normalize,
+    normalize_to_nchw,
+    pil_to_cv2,
+    resize_cv2,
+    resize_pil,
+    to_numpy,
+)
+from immich_ml.schemas import (
+    FaceDetectionOutput,
+    ImageBackend,
+    InferenceEntry,
+    ModelFormat,
+    ModelPrecision,
+    ModelTask,
+    ModelType,
+)
 from immich_ml.sessions.ann import AnnSession
+from immich_ml.sessions.ann.loader import Ann
 from immich_ml.sessions.ort import OrtSession
-from immich_ml.sessions.rknn import RknnSession, run_inference
+from immich_ml.sessions.registry import get_session_backend, get_session_backends
+from immich_ml.sessions.rknn import RknnSession
+from immich_ml.sessions.rknn import run_inference as rknn_run_inference
+from immich_ml.sessions.rknn.rknnpool import RknnPoolExecutor
+from immich_ml.sessions.synthetic import SyntheticSession
 
 
 class TestBase:
@@ -171,6 +216,63 @@ class TestBase:
         snapshot_download.assert_called_once()
         ort_session.assert_not_called()
 
+    @pytest.mark.parametrize("swap_rb", [False, True])
+    def test_add_uint8_input_normalizes_in_graph(self, identity_image_model: Path, swap_rb: bool) -> None:
+        encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir=identity_image_model.parent.parent)
+        mean = np.array([10.0, 20.0, 30.0], dtype=np.float32)
+        std = np.array([2.0, 4.0, 8.0], dtype=np.float32)
+        image = np.random.randint(0, 256, (2, 16, 24, 3), dtype=np.uint8)
+
+        encoder._add_uint8_input(identity_image_model, encoder.model_dir / "model.uint8.onnx", mean, std, swap_rb)
+        session = ort.InferenceSession(encoder.model_dir / "model.uint8.onnx", providers=["CPUExecutionProvider"])
+        output = session.run(None, {"image": image})[0]
+
+        pixels = image[..., ::-1] if swap_rb else image
+        expected = ((pixels.astype(np.float32) - mean) * (np.float32(1.0) / std)).transpose(0, 3, 1, 2)
+        assert session.get_inputs()[0].type == "tensor(uint8)"
+        assert session.get_inputs()[0].shape == ["batch", "height", "width", 3]
+        np.testing.assert_allclose(output, expected, rtol=1e-6)
+
+    def test_make_uint8_session_reuses_cached_model(
+        self, identity_image_model: Path, ort_session: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir=identity_image_model.parent.parent)
+        add_uint8_input = mocker.spy(encoder, "_add_uint8_input")
+
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3)
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3)
+
+        add_uint8_input.assert_called_once()
+        output_path = add_uint8_input.call_args.args[1]
+        assert output_path.parent == encoder.model_dir and output_path.name.startswith("model.uint8.")
+        assert ort_session.call_args.args[0] == output_path.as_posix()
+
+    def test_make_uint8_session_rebuilds_model_if_preprocessing_changes(
+        self, identity_image_model: Path, ort_session: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir=identity_image_model.parent.parent)
+        add_uint8_input = mocker.spy(encoder, "_add_uint8_input")
+
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3)
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3, swap_rb=True)
+        encoder._make_uint8_session([0.0] * 3, [2.0] * 3)
+
+        assert len({call.args[1] for call in add_uint8_input.call_args_list}) == 3
+
+    def test_make_uint8_session_rebuilds_model_if_source_changes(
+        self, identity_image_model: Path, ort_session: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir=identity_image_model.parent.parent)
+        add_uint8_input = mocker.spy(encoder, "_add_uint8_input")
+
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3)
+        stat = identity_image_model.stat()
+        os.utime(identity_image_model, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3)
+        encoder._make_uint8_session([0.0] * 3, [1.0] * 3)
+
+        assert add_uint8_input.call_count == 2
+
 
 @pytest.mark.usefixtures("ort_session")
 class TestOrtSession:
@@ -208,6 +310,17 @@ class TestOrtSession:
 
         assert session.providers == self.CPU_EP
 
+    @pytest.mark.ov_device_ids(["CPU"])
+    @pytest.mark.providers(OV_EP)
+    def test_uses_openvino_cpu_if_enabled(
+        self, providers: list[str], ov_device_ids: list[str], mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(settings, "openvino_cpu", True)
+
+        session = OrtSession("ViT-B-32__openai")
+
+        assert session.providers == self.OV_EP
+
     @pytest.mark.providers(CUDA_EP_OUT_OF_ORDER)
     def test_sets_providers_in_correct_order(self, providers: list[str]) -> None:
         session = OrtSession("ViT-B-32__openai")
@@ -282,6 +395,21 @@ class TestOrtSession:
             }
         ]
 
+    def test_sets_provider_options_for_openvino_cpu(self, mocker: MockerFixture) -> None:
+        model_path = "/cache/ViT-B-32__openai/textual/model.onnx"
+        mocker.patch.object(settings, "openvino_cpu", True)
+        mocker.patch.object(settings, "openvino_precision", ModelPrecision.FP16)
+
+        session = OrtSession(model_path, providers=["OpenVINOExecutionProvider"])
+
+        assert session.provider_options == [
+            {
+                "device_type": "CPU",
+                "load_config": '{"CPU": {"INFERENCE_PRECISION_HINT": "f16"}}',
+                "cache_dir": "/cache/ViT-B-32__openai/textual/openvino",
+            }
+        ]
+
     def test_sets_provider_options_for_cuda(self) -> None:
         os.environ["MACHINE_LEARNING_DEVICE_ID"] = "1"
 
@@ -322,6 +450,7 @@ class TestOrtSession:
         mock_settings = mocker.patch("immich_ml.sessions.ort.settings", autospec=True)
         mock_settings.model_inter_op_threads = 2
         mock_settings.model_intra_op_threads = 4
+        mock_settings.model_mmap = False
 
         session = OrtSession("ViT-B-32__openai", providers=["CUDAExecutionProvider", "CPUExecutionProvider"])
 
@@ -333,6 +462,7 @@ class TestOrtSession:
         mock_settings.model_inter_op_threads = 0
         mock_settings.model_intra_op_threads = 0
         mock_settings.model_arena = True
+        mock_settings.model_mmap = False
 
         session = OrtSession("ViT-B-32__openai", providers=["CPUExecutionProvider"])
 
@@ -343,6 +473,7 @@ class TestOrtSession:
         mock_settings.model_inter_op_threads = 0
         mock_settings.model_intra_op_threads = 0
         mock_settings.model_arena = False
+        mock_settings.model_mmap = False
 
         session = OrtSession("ViT-B-32__openai", providers=["CPUExecutionProvider"])
 
@@ -360,6 +491,126 @@ class TestOrtSession:
         assert sess_options is session.sess_options
 
 
+class TestOrtSessionMmap:
+    def test_memory_maps_weights(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_mmap", True)
+        input = np.random.rand(2, 64).astype(np.float32)
+        expected = ort.InferenceSession(matmul_model.as_posix()).run(None, {"input": input})[0]
+
+        ort_session = mocker.spy(ort, "InferenceSession")
+
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+
+        copy_path = matmul_model.parent / "mmap" / "model" / "model.onnx"
+        assert ort_session.call_args.args[0] == copy_path.as_posix()
+        assert (copy_path.parent / "model.onnx.data").is_file()
+        assert np.allclose(session.run(None, {"input": input})[0], expected)
+
+    def test_reuses_memory_mapped_copy_without_parsing_model(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_mmap", True)
+        OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        load = mocker.spy(onnx, "load")
+
+        OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+
+        load.assert_not_called()
+
+    def test_keeps_a_memory_mapped_copy_per_model(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_mmap", True)
+        other_model = matmul_model.with_name("model.uint8.onnx")
+        onnx.save(onnx.load(matmul_model), other_model)
+        OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        OrtSession(other_model, providers=["CPUExecutionProvider"])
+        save_model = mocker.spy(onnx, "save_model")
+
+        OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        OrtSession(other_model, providers=["CPUExecutionProvider"])
+
+        save_model.assert_not_called()
+        assert (matmul_model.parent / "mmap" / "model" / "model.onnx").is_file()
+        assert (matmul_model.parent / "mmap" / "model.uint8" / "model.uint8.onnx").is_file()
+
+    def test_rebuilds_memory_mapped_copy_if_model_changes(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_mmap", True)
+        input = np.random.rand(2, 64).astype(np.float32)
+        OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+
+        proto = onnx.load(matmul_model)
+        weights = np.random.rand(64, 16).astype(np.float32)
+        proto.graph.initializer[0].CopyFrom(onnx.numpy_helper.from_array(weights, "weights"))
+        proto.graph.output[0].type.tensor_type.shape.dim[1].dim_value = 16
+        onnx.save(proto, matmul_model)
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+
+        assert np.allclose(session.run(None, {"input": input})[0], input @ weights, atol=1e-5)
+
+    def test_reuses_external_data(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_mmap", True)
+        onnx.save(onnx.load(matmul_model), matmul_model, save_as_external_data=True, size_threshold=0)
+        save_model = mocker.spy(onnx, "save_model")
+
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+
+        save_model.assert_not_called()
+        assert not (matmul_model.parent / "mmap").exists()
+        assert session.run(None, {"input": np.zeros((1, 64), dtype=np.float32)})[0].shape == (1, 32)
+
+    def test_does_not_memory_map_if_disabled(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_mmap", False)
+        ort_session = mocker.patch("immich_ml.sessions.ort.ort.InferenceSession")
+
+        OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+
+        assert ort_session.call_args.args[0] == matmul_model.as_posix()
+
+
+class TestOrtSessionArenaShrinkage:
+    def test_shrinks_arena_if_input_exceeds_threshold(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_arena_shrink_threshold_mb", 1)
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        run = mocker.spy(session.session, "run")
+
+        session.run(None, {"input": np.zeros((1, 64), dtype=np.float32)})
+        session.run(None, {"input": np.zeros((4096, 64), dtype=np.float32)})
+
+        assert run.call_args_list[0].args[2] is None
+        run_options = run.call_args_list[1].args[2]
+        assert run_options.get_run_config_entry("memory.enable_memory_arena_shrinkage") == "cpu:0"
+
+    def test_shrinks_arena_after_interval(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_arena_shrink_interval_s", 60)
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        run = mocker.spy(session.session, "run")
+        input = {"input": np.zeros((1, 64), dtype=np.float32)}
+
+        session.run(None, input)
+        session.last_arena_shrink -= 60
+        session.run(None, input)
+        session.run(None, input)
+
+        assert [call.args[2] is not None for call in run.call_args_list] == [False, True, False]
+
+    def test_does_not_shrink_arena_if_disabled(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_arena_shrink_threshold_mb", 1)
+        mocker.patch.object(settings, "model_arena", False)
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        run = mocker.spy(session.session, "run")
+
+        session.run(None, {"input": np.zeros((4096, 64), dtype=np.float32)})
+
+        assert run.call_args.args[2] is None
+
+    def test_does_not_override_run_options_kwarg(self, matmul_model: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_arena_shrink_threshold_mb", 1)
+        session = OrtSession(matmul_model, providers=["CPUExecutionProvider"])
+        run = mocker.spy(session.session, "run")
+        run_options = ort.RunOptions()
+
+        session.run(None, {"input": np.zeros((4096, 64), dtype=np.float32)}, run_options)
+
+        assert run.call_args.args[2] is run_options
+
+
 class TestAnnSession:
     def test_creates_ann_session(self, ann_session: mock.Mock, info: mock.Mock) -> None:
         model_path = mock.MagicMock(spec=Path)
@@ -414,6 +665,119 @@ class TestAnnSession:
         np_spy.assert_has_calls([mock.call(input1), mock.call(input2)])
 
 
+class StubLibAnn:
+    """Network 0 doubles its (2, 4) input into a (2, 4) output and sums it into a (1,) output."""
+
+    input_shape = (2, 4)
+    output_shapes = ((2, 4), (1,))
+
+    def __init__(self) -> None:
+        self.executions = 0
+
+    def init(self, log_level: int, tuning_level: int, tuning_file: bytes | None) -> int:
+        return 1
+
+    def load(self, ann: int, model_path: bytes, *args: Any) -> int:
+        return 0
+
+    def tensors(self, ann: int, net_id: int, input: bool) -> int:
+        return 1 if input else len(self.output_shapes)
+
+    def shape(self, ann: int, net_id: int, input: bool, index: int) -> int:
+        dims = self.input_shape if input else self.output_shapes[index]
+        return sum(dim << (16 * i) for i, dim in enumerate(dims))
+
+    def execute(self, ann: int, net_id: int, inputs: Any, outputs: Any) -> None:
+        self.executions += 1
+        input = np.ctypeslib.as_array((c_float * 8).from_address(inputs[0])).reshape(self.input_shape)
+        doubled = np.ctypeslib.as_array((c_float * 8).from_address(outputs[0])).reshape(self.output_shapes[0])
+        total = np.ctypeslib.as_array((c_float * 1).from_address(outputs[1]))
+        doubled[:] = input * 2
+        total[:] = input.sum()
+
+    def unload(self, ann: int, net_id: int) -> None:
+        pass
+
+    def destroy(self, ann: int) -> None:
+        pass
+
+
+class TestAnn:
+    @pytest.fixture
+    def libann(self, tmp_path: Path, mocker: MockerFixture) -> Iterator[StubLibAnn]:
+        libann = StubLibAnn()
+        mocker.patch("immich_ml.sessions.ann.loader.libann", libann, create=True)
+        mocker.patch("immich_ml.sessions.ann.loader.is_available", True)
+        mocker.patch.dict(Ann._instances, clear=True)
+        (tmp_path / "model.armnn").touch()
+        yield libann
+        for ann in Ann._instances.values():
+            ann.destroy()  # type: ignore[attr-defined]
+
+    def test_execute(self, libann: StubLibAnn, tmp_path: Path) -> None:
+        ann = Ann()
+        net_id = ann.load((tmp_path / "model.armnn").as_posix())
+        input = np.arange(8, dtype=np.float32).reshape(2, 4)
+
+        doubled, total = ann.execute(net_id, [input])
+
+        np.testing.assert_array_equal(doubled, input * 2)
+        np.testing.assert_array_equal(total, [28])
+
+    def test_reuses_buffers(self, libann: StubLibAnn, tmp_path: Path) -> None:
+        ann = Ann()
+        net_id = ann.load((tmp_path / "model.armnn").as_posix())
+
+        first = ann.execute(net_id, [np.ones((2, 4), dtype=np.float32)])
+        buffers = ann.buffers[net_id].ring[0]
+        output_ptrs = buffers.output_ptrs
+        second = ann.execute(net_id, [np.zeros((2, 4), dtype=np.float32)])
+
+        assert first[0] is second[0] is buffers.outputs[0]
+        assert ann.buffers[net_id].ring == [buffers] and buffers.output_ptrs is output_ptrs
+        np.testing.assert_array_equal(second[1], [0])
+
+    def test_hands_out_outputs_from_ring(self, libann: StubLibAnn, tmp_path: Path) -> None:
+        ann = Ann()
+        net_id = ann.load((tmp_path / "model.armnn").as_posix(), output_buffers=2)
+
+        outputs = [ann.execute(net_id, [np.full((2, 4), i, dtype=np.float32)]) for i in range(3)]
+
+        assert outputs[0][0] is outputs[2][0]
+        assert outputs[0][0] is not outputs[1][0]
+        np.testing.assert_array_equal(outputs[1][1], [8])
+        np.testing.assert_array_equal(outputs[2][1], [16])
+
+    def test_threads_do_not_share_buffers(self, libann: StubLibAnn, tmp_path: Path) -> None:
+        ann = Ann()
+        net_id = ann.load((tmp_path / "model.armnn").as_posix())
+
+        with ThreadPoolExecutor(1) as pool:
+            other = pool.submit(ann.execute, net_id, [np.ones((2, 4), dtype=np.float32)]).result()
+        own = ann.execute(net_id, [np.zeros((2, 4), dtype=np.float32)])
+
+        assert other[0] is not own[0]
+        np.testing.assert_array_equal(other[1], [8])
+
+    def test_execute_validates_inputs(self, libann: StubLibAnn, tmp_path: Path) -> None:
+        ann = Ann()
+        net_id = ann.load((tmp_path / "model.armnn").as_posix())
+
+        with pytest.raises(ValueError, match="network input shape"):
+            ann.execute(net_id, [np.ones((4, 2), dtype=np.float32)])
+        with pytest.raises(ValueError, match="c_contiguous"):
+            ann.execute(net_id, [np.ones((4, 2), dtype=np.float32).T])
+        assert libann.executions == 0
+
+    def test_unload_frees_buffers(self, libann: StubLibAnn, tmp_path: Path) -> None:
+        ann = Ann()
+        net_id = ann.load((tmp_path / "model.armnn").as_posix())
+
+        ann.unload(net_id)
+
+        assert net_id not in ann.buffers
+
+
 class TestRknnSession:
     def test_creates_rknn_session(self, rknn_session: mock.Mock, info: mock.Mock, mocker: MockerFixture) -> None:
         model_path = mock.MagicMock(spec=Path)
@@ -422,7 +786,7 @@ class TestRknnSession:
         mocker.patch("immich_ml.sessions.rknn.is_available", True)
         RknnSession(model_path)
 
-        rknn_session.assert_called_once_with(model_path=model_path.as_posix(), tpes=tpe, func=run_inference)
+        rknn_session.assert_called_once_with(model_path=model_path.as_posix(), tpes=tpe, func=rknn_run_inference)
 
         info.assert_has_calls([mock.call(f"Loaded RKNN model from {model_path} with {tpe} threads.")])
 
@@ -436,10 +800,284 @@ class TestRknnSession:
 
         session.run(None, input_feed)
 
-        rknn_session.return_value.put.assert_called_once_with([input1, input2])
+        rknn_session.return_value.submit.assert_called_once_with([input1, input2])
+        rknn_session.return_value.submit.return_value.result.assert_called_once()
         assert np_spy.call_count == 2
         np_spy.assert_has_calls([mock.call(input1), mock.call(input2)])
 
+    def test_queries_io_shapes_from_model(self, rknn_session: mock.Mock) -> None:
+        runtime = rknn_session.return_value.rknn_pool[0].rknn_runtime
+        runtime.get_in_out_num.return_value = (1, 1)
+        runtime.get_tensor_attr.side_effect = lambda i, is_output=False: (
+            SimpleNamespace(name="output", dims=[4, 512, 0, 0], n_dims=2, fmt=0)
+            if is_output
+            else SimpleNamespace(name="input", dims=[4, 112, 112, 3], n_dims=4, fmt=1)
+        )
+
+        session = RknnSession(Path("facial-recognition/buffalo_l/recognition/model.rknn"))
+
+        assert session.get_inputs() == [("input", (4, 3, 112, 112))]
+        assert session.get_outputs() == [("output", (4, 512))]
+
+    def test_falls_back_to_static_io_shapes(self, rknn_session: mock.Mock) -> None:
+        rknn_session.return_value.rknn_pool[0].rknn_runtime.get_in_out_num.side_effect = AttributeError
+
+        session = RknnSession(Path("facial-recognition/buffalo_l/detection/model.rknn"))
+
+        assert session.get_inputs() == [("norm_tensor:0", (1, 3, 640, 640))]
+        assert len(session.get_outputs()) == 9
+
+    def test_run_splits_batch_across_contexts(self, rknn_session: mock.Mock) -> None:
+        rknn_session.return_value.rknn_pool[0].rknn_runtime.get_in_out_num.side_effect = AttributeError
+
+        def submit(inputs: list[NDArray[np.float32]]) -> Future[list[NDArray[np.float32]]]:
+            future: Future[list[NDArray[np.float32]]] = Future()
+            future.set_result([inputs[0].mean(axis=(2, 3))[:, :1]])
+            return future
+
+        rknn_session.return_value.submit.side_effect = submit
+        session = RknnSession(Path("facial-recognition/buffalo_l/recognition/model.rknn"))
+        faces = np.arange(5, dtype=np.float32).reshape(5, 1, 1, 1) * np.ones((5, 3, 112, 112), dtype=np.float32)
+
+        outputs = session.run(None, {"input.1": faces})
+
+        assert rknn_session.return_value.submit.call_count == 5
+        assert all(
+            call.args[0][0].shape == (1, 3, 112, 112) for call in rknn_session.return_value.submit.call_args_list
+        )
+        np.testing.assert_array_equal(outputs[0], np.arange(5, dtype=np.float32).reshape(5, 1))
+
+    @pytest.mark.parametrize("num_faces", [3, 5])
+    def test_run_pads_short_batches(self, rknn_session: mock.Mock, num_faces: int) -> None:
+        runtime = rknn_session.return_value.rknn_pool[0].rknn_runtime
+        runtime.get_in_out_num.return_value = (1, 1)
+        runtime.get_tensor_attr.side_effect = lambda i, is_output=False: (
+            SimpleNamespace(name="output", dims=[4, 1, 0, 0], n_dims=2, fmt=0)
+            if is_output
+            else SimpleNamespace(name="input", dims=[4, 112, 112, 3], n_dims=4, fmt=1)
+        )
+
+        def submit(inputs: list[NDArray[np.float32]]) -> Future[list[NDArray[np.float32]]]:
+            future: Future[list[NDArray[np.float32]]] = Future()
+            future.set_result([inputs[0].mean(axis=(2, 3))[:, :1]])
+            return future
+
+        rknn_session.return_value.submit.side_effect = submit
+        session = RknnSession(Path("facial-recognition/buffalo_l/recognition/model.rknn"))
+        faces = np.arange(num_faces, dtype=np.float32).reshape(-1, 1, 1, 1) * np.ones(
+            (num_faces, 3, 112, 112), dtype=np.float32
+        )
+
+        outputs = session.run(None, {"input.1": faces})
+
+        assert all(
+            call.args[0][0].shape == (4, 3, 112, 112) for call in rknn_session.return_value.submit.call_args_list
+        )
+        np.testing.assert_array_equal(outputs[0], np.arange(num_faces, dtype=np.float32).reshape(-1, 1))
+
+
+class StubRKNNLite:
+    def __init__(self, latency_s: float = 0.02) -> None:
+        self.latency_s = latency_s
+        self.active = 0
+        self.max_active = 0
+        self.released = False
+        self.lock = threading.Lock()
+
+    def inference(self, inputs: list[NDArray[np.float32]], data_format: str) -> list[NDArray[np.float32]]:
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.latency_s)
+        with self.lock:
+            self.active -= 1
+        return [inputs[0] * 2]
+
+    def release(self) -> None:
+        self.released = True
+
+
+class TestRknnPoolExecutor:
+    def test_returns_own_result_to_each_submission(self, mocker: MockerFixture) -> None:
+        mocker.patch("immich_ml.sessions.rknn.rknnpool.init_rknn", side_effect=lambda _: StubRKNNLite())
+        executor = RknnPoolExecutor(model_path="model.rknn", tpes=2, func=rknn_run_inference)
+        inputs = [np.full((1, 4), i, dtype=np.float32) for i in range(16)]
+
+        with ThreadPoolExecutor(max_workers=8) as callers:
+            results = list(callers.map(lambda input: executor.submit([input]).result(), inputs))
+
+        for input, result in zip(inputs, results):
+            np.testing.assert_array_equal(result[0], input * 2)
+
+    def test_keeps_all_contexts_busy_without_sharing_them(self, mocker: MockerFixture) -> None:
+        contexts = [StubRKNNLite(), StubRKNNLite(), StubRKNNLite()]
+        mocker.patch("immich_ml.sessions.rknn.rknnpool.init_rknn", side_effect=contexts)
+        executor = RknnPoolExecutor(model_path="model.rknn", tpes=3, func=rknn_run_inference)
+        barrier = threading.Barrier(3)
+        used: set[int] = set()
+        used_lock = threading.Lock()
+
+        def func(rknn_lite: Any, inputs: list[NDArray[np.float32]]) -> list[NDArray[np.float32]]:
+            with used_lock:
+                used.add(id(rknn_lite))
+            barrier.wait(timeout=5)  # only passes if all contexts are in use at once
+            return rknn_run_inference(rknn_lite, inputs)
+
+        executor.func = func
+        futures = [executor.submit([np.zeros((1, 4), dtype=np.float32)]) for _ in range(3)]
+        for future in futures:
+            future.result()
+
+        assert used == {id(context) for context in contexts}
+        assert all(context.max_active == 1 for context in contexts)
+
+    def test_propagates_exceptions_to_submitter(self, mocker: MockerFixture) -> None:
+        mocker.patch("immich_ml.sessions.rknn.rknnpool.init_rknn", side_effect=lambda _: StubRKNNLite())
+        func = mock.Mock(side_effect=[RuntimeError("NPU error"), [np.ones(1, dtype=np.float32)]])
+        executor = RknnPoolExecutor(model_path="model.rknn", tpes=1, func=func)
+
+        with pytest.raises(RuntimeError, match="NPU error"):
+            executor.submit([np.zeros(1, dtype=np.float32)]).result()
+        # the context is returned to the pool after a failure
+        assert executor.submit([np.zeros(1, dtype=np.float32)]).result()[0] == 1
+
+    def test_release(self, mocker: MockerFixture) -> None:
+        contexts = [StubRKNNLite(), StubRKNNLite()]
+        mocker.patch("immich_ml.sessions.rknn.rknnpool.init_rknn", side_effect=contexts)
+        executor = RknnPoolExecutor(model_path="model.rknn", tpes=2, func=rknn_run_inference)
+
+        executor.release()
+
+        assert all(context.released for context in contexts)
+
+
+class TestSessionRegistry:
+    @pytest.fixture(autouse=True)
+    def clear_backends(self) -> Iterator[None]:
+        get_session_backends.cache_clear()
+        yield
+        get_session_backends.cache_clear()
+
+    def test_selects_backend_by_suffix(self, ort_session: mock.Mock, path: mock.Mock) -> None:
+        path.suffix = ".onnx"
+
+        session = FaceDetector("buffalo_l")._make_session(path)
+
+        assert isinstance(session, OrtSession)
+
+    def test_selects_backend_from_settings(self, tmp_path: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "session_backend", "synthetic")
+
+        model_path = tmp_path / "facial-recognition" / "buffalo_l" / "detection" / "model.onnx"
+
+        session = FaceDetector("buffalo_l")._make_session(model_path)
+
+        assert isinstance(session, SyntheticSession)
+
+    def test_raises_if_backend_not_registered(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "session_backend", "tflite")
+
+        with pytest.raises(ValueError, match="Unsupported session backend: tflite"):
+            FaceDetector("buffalo_l")._make_session(Path("model.onnx"))
+
+    def test_registers_entry_point_backends(self, mocker: MockerFixture) -> None:
+        factory = mock.Mock()
+        entry_point = mock.Mock()
+        entry_point.name = "tflite"
+        entry_point.load.return_value = factory
+        entry_points = mocker.patch("immich_ml.sessions.registry.entry_points", return_value=[entry_point])
+
+        backend = get_session_backend("tflite")
+
+        entry_points.assert_called_once_with(group="immich_ml.sessions")
+        assert backend.factory is factory
+        assert backend.needs_model_file is True
+
+    def test_skips_entry_points_that_fail_to_load(self, exception: mock.Mock, mocker: MockerFixture) -> None:
+        entry_point = mock.Mock()
+        entry_point.name = "tflite"
+        entry_point.load.side_effect = ImportError
+        mocker.patch("immich_ml.sessions.registry.entry_points", return_value=[entry_point])
+
+        backends = get_session_backends()
+
+        assert "tflite" not in backends
+        assert "onnx" in backends
+        exception.assert_called_once()
+
+
+class TestSyntheticSession:
+    def test_face_pipeline(
+        self, cv_image: cv2.Mat, tmp_path: Path, snapshot_download: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(settings, "session_backend", "synthetic")
+        cache_dir = tmp_path / "facial-recognition" / "buffalo_l"
+        detector = FaceDetector("buffalo_l", cache_dir=cache_dir)
+        recognizer = FaceRecognizer("buffalo_l", cache_dir=cache_dir)
+
+        faces = detector.predict(cv_image)
+        result = recognizer.predict(cv_image, faces)
+
+        assert faces["boxes"].shape == (1, 4)
+        assert faces["landmarks"].shape == (1, 5, 2)
+        assert len(result) == 1
+        assert len(orjson.loads(result[0]["embedding"])) == 512
+        assert snapshot_download.call_args.kwargs["allow_patterns"] == ["*.json", "*.txt"]
+
+    def test_ocr_pipeline(self, pil_image: Image.Image, tmp_path: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "session_backend", "synthetic")
+        cache_dir = tmp_path / "ocr" / "PP-OCRv5_mobile"
+        detector = TextDetector("PP-OCRv5_mobile", cache_dir=cache_dir)
+        recognizer = TextRecognizer("PP-OCRv5_mobile", cache_dir=cache_dir)
+
+        texts = detector.predict(pil_image)
+        result = recognizer.predict(pil_image, texts)
+
+        assert texts["boxes"].shape == (1, 4, 2)
+        assert len(list(result["text"])) == 1
+        assert len(recognizer.characters) == 97
+
+    def test_uses_clip_embed_dim(self, tmp_path: Path, clip_model_cfg: dict[str, Any]) -> None:
+        cache_dir = tmp_path / "clip" / "ViT-B-32__openai"
+        cache_dir.mkdir(parents=True)
+        (cache_dir / "config.json").write_text(json.dumps(clip_model_cfg))
+
+        session = SyntheticSession(cache_dir / "visual" / "model.onnx")
+        outputs = session.run(None, {"image": np.zeros((2, 3, 224, 224), dtype=np.float32)})
+
+        assert session.model_task == ModelTask.SEARCH
+        assert outputs[0].shape == (2, clip_model_cfg["embed_dim"])
+
+    def test_output_shapes_follow_input(self, tmp_path: Path) -> None:
+        session = SyntheticSession(tmp_path / "ocr" / "PP-OCRv5_mobile" / "detection" / "model.onnx")
+
+        outputs = session.run(None, {"x": np.zeros((4, 3, 736, 960), dtype=np.float32)})
+
+        assert [node.name for node in session.get_outputs()] == ["probability_map"]
+        assert outputs[0].shape == (4, 1, 736, 960)
+
+    def test_face_detection_outputs_follow_batch_size(self, tmp_path: Path) -> None:
+        session = SyntheticSession(tmp_path / "facial-recognition" / "buffalo_l" / "detection" / "model.onnx")
+
+        single = session.run(None, {"input.1": np.zeros((1, 3, 640, 640), dtype=np.float32)})
+        batched = session.run(None, {"input.1": np.zeros((3, 3, 640, 640), dtype=np.float32)})
+
+        assert [output.shape[0] for output in batched] == [output.shape[0] * 3 for output in single]
+
+    def test_sleeps_for_configured_latency(self, tmp_path: Path, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "synthetic_latency_ms", 50)
+        sleep = mocker.patch("immich_ml.sessions.synthetic.time.sleep")
+        session = SyntheticSession(tmp_path / "facial-recognition" / "buffalo_l" / "recognition" / "model.onnx")
+
+        outputs = session.run(None, {"input.1": np.zeros((3, 3, 112, 112), dtype=np.float32)})
+
+        assert outputs[0].shape == (3, 512)
+        sleep.assert_called_once_with(0.05)
+
+    def test_raises_if_model_type_unknown(self, tmp_path: Path) -> None:
+        with pytest.raises(ValueError, match="Could not determine model task and type"):
+            SyntheticSession(tmp_path / "model.onnx")
+
 
 class TestCLIP:
     embedding = np.random.rand(512).astype(np.float32)
@@ -467,6 +1105,82 @@ class TestCLIP:
         assert len(embedding) == clip_model_cfg["embed_dim"]
         mocked.run.assert_called_once()
 
+    def test_fused_normalization_matches_chained(self, pil_image: Image.Image) -> None:
+        mean = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+        std = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+        expected = np.expand_dims(normalize(to_numpy(pil_image), mean, std).transpose(2, 0, 1), 0)
+
+        result = normalize_to_nchw(np.asarray(pil_image), get_normalization_lut(mean, std))
+
+        assert result.flags.c_contiguous
+        assert np.array_equal(result, expected)
+
+    def test_reuses_input_buffer(
+        self,
+        pil_image: Image.Image,
+        mocker: MockerFixture,
+        clip_model_cfg: dict[str, Any],
+        clip_preprocess_cfg: Callable[[Path], dict[str, Any]],
+    ) -> None:
+        mocker.patch.object(OpenClipVisualEncoder, "download")
+        mocker.patch.object(OpenClipVisualEncoder, "model_cfg", clip_model_cfg)
+        mocker.patch.object(OpenClipVisualEncoder, "preprocess_cfg", clip_preprocess_cfg)
+        mocker.patch.object(InferenceModel, "_make_session", autospec=True)
+        clip_encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir="test_cache")
+        clip_encoder.load()
+
+        first = clip_encoder.transform(pil_image)["image"]
+        second = clip_encoder.transform(pil_image)["image"]
+        with ThreadPoolExecutor(1) as pool:
+            other_thread = pool.submit(clip_encoder.transform, pil_image).result()["image"]
+
+        assert first is second
+        assert other_thread is not first
+        assert first.shape == (1, 3, clip_encoder.size, clip_encoder.size)
+
+    def test_transform_cv2_matches_pil(
+        self,
+        mocker: MockerFixture,
+        clip_model_cfg: dict[str, Any],
+        clip_preprocess_cfg: Callable[[Path], dict[str, Any]],
+    ) -> None:
+        mocker.patch.object(OpenClipVisualEncoder, "download")
+        mocker.patch.object(OpenClipVisualEncoder, "model_cfg", clip_model_cfg)
+        mocker.patch.object(OpenClipVisualEncoder, "preprocess_cfg", clip_preprocess_cfg)
+        mocker.patch.object(InferenceModel, "_make_session", autospec=True)
+        clip_encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir="test_cache")
+        clip_encoder.load()
+        pil_image = Image.new("RGB", (600, 400), (200, 100, 50))
+
+        pil_output = clip_encoder.transform(pil_image)["image"].copy()
+        bgr_image = np.ascontiguousarray(np.asarray(pil_image)[..., ::-1])
+        cv2_output = clip_encoder.transform(bgr_image)["image"]
+
+        np.testing.assert_allclose(cv2_output, pil_output, atol=1e-5)
+
+    def test_uint8_input(
+        self,
+        pil_image: Image.Image,
+        mocker: MockerFixture,
+        clip_model_cfg: dict[str, Any],
+        clip_preprocess_cfg: dict[str, Any],
+    ) -> None:
+        mocker.patch.object(settings, "model_uint8_input", True)
+        mocker.patch.object(OpenClipVisualEncoder, "download")
+        mocker.patch.object(OpenClipVisualEncoder, "model_cfg", clip_model_cfg)
+        mocker.patch.object(OpenClipVisualEncoder, "preprocess_cfg", clip_preprocess_cfg)
+        make_uint8_session = mocker.patch.object(InferenceModel, "_make_uint8_session", autospec=True)
+        clip_encoder = OpenClipVisualEncoder("ViT-B-32__openai", cache_dir="test_cache", model_format=ModelFormat.ONNX)
+        clip_encoder.load()
+
+        image = clip_encoder.transform(pil_image)["image"]
+
+        mean, std = make_uint8_session.call_args.args[1:]
+        np.testing.assert_allclose(mean, np.array(clip_preprocess_cfg["mean"]) * 255, rtol=1e-6)
+        np.testing.assert_allclose(std, np.array(clip_preprocess_cfg["std"]) * 255, rtol=1e-6)
+        assert image.dtype == np.uint8
+        assert image.shape == (1, 224, 224, 3)
+
     def test_basic_text(
         self,
         mocker: MockerFixture,
@@ -651,6 +1365,48 @@ class TestCLIP:
         assert np.allclose(tokens["attention_mask"], np.array([mock_attention_mask], dtype=np.int32), atol=0)
 
 
+class StubRetinaFaceSession:
+    """Returns random but deterministic outputs shaped like a RetinaFace model with 3 strides and 2 anchors."""
+
+    def get_inputs(self) -> list[SimpleNamespace]:
+        return [SimpleNamespace(name="input.1", shape=["batch", 3, "?", "?"])]
+
+    def get_outputs(self) -> list[SimpleNamespace]:
+        return [SimpleNamespace(name=f"{kind}_{stride}") for kind in ("score", "bbox", "kps") for stride in (8, 16, 32)]
+
+    def run(self, output_names: list[str], input_feed: dict[str, NDArray[np.float32]]) -> list[NDArray[np.float32]]:
+        blob = next(iter(input_feed.values()))
+        height, width = blob.shape[2:]
+        outputs: list[list[NDArray[np.float32]]] = [[] for _ in output_names]
+        num_anchors = {stride: (height // stride) * (width // stride) * 2 for stride in (8, 16, 32)}
+        # seeded by each image so the outputs for an image don't depend on the rest of the batch
+        for image in blob:
+            rng = np.random.default_rng(zlib.crc32(image.tobytes()))
+            # distinct scores, since the order of tied detections is arbitrary
+            ranks = rng.permutation(sum(num_anchors.values())) + 1
+            scores = iter(np.split((ranks / len(ranks)) ** 8, np.cumsum(list(num_anchors.values()))[:-1]))
+            for name, output in zip(output_names, outputs):
+                kind, stride = name.split("_")
+                if kind == "score":
+                    output.append(next(scores).astype(np.float32)[:, None])
+                else:
+                    size = (num_anchors[int(stride)], 4 if kind == "bbox" else 10)
+                    output.append(rng.uniform(0, 4, size).astype(np.float32))
+        return [np.concatenate(output) for output in outputs]
+
+
+class StubUint8RetinaFaceSession(StubRetinaFaceSession):
+    """Takes BGR uint8 NHWC images and normalizes them as RetinaFace does before running the float stub."""
+
+    def get_inputs(self) -> list[SimpleNamespace]:
+        return [SimpleNamespace(name="input.1", shape=["batch", "?", "?", 3])]
+
+    def run(self, output_names: list[str], input_feed: dict[str, NDArray[Any]]) -> list[NDArray[np.float32]]:
+        images = next(iter(input_feed.values()))
+        blob = ((images[..., ::-1].astype(np.float32) - 127.5) / 128.0).transpose(0, 3, 1, 2)
+        return super().run(output_names, {"input.1": blob})
+
+
 class TestFaceRecognition:
     def test_set_min_score(self, snapshot_download: mock.Mock, ort_session: mock.Mock, path: mock.Mock) -> None:
         path.return_value.__truediv__.return_value.__truediv__.return_value.suffix = ".onnx"
@@ -670,8 +1426,8 @@ class TestFaceRecognition:
         bbox = np.random.rand(num_faces, 4).astype(np.float32)
         scores = np.array([[0.67]] * num_faces).astype(np.float32)
         kpss = np.random.rand(num_faces, 5, 2).astype(np.float32)
-        det_model.detect.return_value = (np.concatenate([bbox, scores], axis=-1), kpss)
-        face_detector.model = det_model
+        det_model.return_value = (np.concatenate([bbox, scores], axis=-1), kpss)
+        mocker.patch.object(face_detector, "_detect", det_model)
 
         faces = face_detector.predict(cv_image)
 
@@ -682,7 +1438,194 @@ class TestFaceRecognition:
         assert np.equal(faces["boxes"], bbox.round()).all()
         assert np.equal(faces["landmarks"], kpss).all()
         assert np.equal(faces["scores"], scores).all()
-        det_model.detect.assert_called_once()
+        det_model.assert_called_once()
+
+    def test_detection_maps_boxes_from_downscaled_level(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceDetector, "load")
+        face_detector = FaceDetector("buffalo_s", min_score=0.0, cache_dir="test_cache")
+        det_model = mock.Mock()
+        det_model.input_size = (640, 640)
+        bbox = np.array([[10.0, 20.0, 30.0, 40.0, 0.9]], dtype=np.float32)
+        kpss = np.full((1, 5, 2), 5.0, dtype=np.float32)
+        detect = mocker.patch.object(face_detector, "_detect", return_value=(bbox, kpss))
+        face_detector.model = det_model
+
+        faces = face_detector.predict(ImageContext(Image.new("RGB", (2560, 1920))))
+
+        assert detect.call_args.args[0].shape == (480, 640, 3)
+        assert np.equal(faces["boxes"], [[40.0, 80.0, 120.0, 160.0]]).all()
+        assert np.equal(faces["landmarks"], 20.0).all()
+
+    @pytest.mark.parametrize("image_shape", [(480, 640, 3), (900, 1200, 3), (1200, 500, 3)])
+    @pytest.mark.parametrize("min_score", [0.3, 0.7])
+    def test_detection_matches_insightface(self, image_shape: tuple[int, int, int], min_score: float) -> None:
+        session = StubRetinaFaceSession()
+        reference = RetinaFace(session=session)
+        reference.prepare(ctx_id=0, det_thresh=min_score, input_size=(640, 640))
+        face_detector = FaceDetector("buffalo_s", min_score=min_score, cache_dir="test_cache", session=session)
+        face_detector.model = RetinaFace(session=session)
+        face_detector.model.prepare(ctx_id=0, det_thresh=min_score, input_size=(640, 640))
+        face_detector.anchors = {}
+        image = np.random.randint(0, 256, image_shape, dtype=np.uint8)
+
+        expected_boxes, expected_landmarks = reference.detect(image)
+        boxes, landmarks = face_detector._detect(image)
+
+        assert len(boxes) > 1
+        np.testing.assert_array_equal(boxes, expected_boxes)
+        np.testing.assert_array_equal(landmarks, expected_landmarks)
+        assert list(face_detector.anchors) == [(640, 640)]
+
+    @pytest.mark.parametrize(
+        ("image_shape", "max_resolution", "expected"),
+        [
+            ((480, 640, 3), 640, (640, 512)),
+            ((900, 1200, 3), 640, (640, 512)),
+            ((1200, 500, 3), 640, (320, 640)),
+            ((640, 2560, 3), 640, (640, 192)),
+            ((500, 500, 3), 640, (640, 640)),
+            ((480, 640, 3), 1000, (1024, 768)),
+        ],
+    )
+    def test_dynamic_input_size(
+        self, mocker: MockerFixture, image_shape: tuple[int, int, int], max_resolution: int, expected: tuple[int, int]
+    ) -> None:
+        mocker.patch.object(FaceDetector, "_make_session", return_value=StubRetinaFaceSession())
+        face_detector = FaceDetector("buffalo_s", min_score=0.7, cache_dir="test_cache")
+        face_detector.session = face_detector._load()
+        face_detector.configure(maxResolution=max_resolution)
+        image = np.random.randint(0, 256, image_shape, dtype=np.uint8)
+        run = mocker.spy(StubRetinaFaceSession, "run")
+
+        face_detector._detect(image)
+
+        assert face_detector.dynamic_input
+        assert run.call_args.args[2]["input.1"].shape == (1, 3, expected[1], expected[0])
+        assert list(face_detector.anchors) == [expected[::-1]]
+        assert face_detector.min_image_size == (0, max(expected))
+
+    def test_batched_detection_matches_single(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceDetector, "_make_session", return_value=StubRetinaFaceSession())
+        face_detector = FaceDetector("buffalo_s", min_score=0.3, cache_dir="test_cache")
+        face_detector.session = face_detector._load()
+        run = mocker.spy(StubRetinaFaceSession, "run")
+        images = [np.random.randint(0, 256, shape, dtype=np.uint8) for shape in [(480, 640, 3), (600, 800, 3)]]
+
+        detections = face_detector._detect_batch(images)
+
+        assert run.call_args.args[2]["input.1"].shape == (2, 3, 512, 640)
+        assert len(detections) == 2
+        for image, (boxes, landmarks) in zip(images, detections):
+            expected_boxes, expected_landmarks = face_detector._detect_batch([image])[0]
+            assert len(boxes) > 1
+            np.testing.assert_array_equal(boxes, expected_boxes)
+            np.testing.assert_array_equal(landmarks, expected_landmarks)
+
+    def test_batched_detection_fits_all_images(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceDetector, "_make_session", return_value=StubRetinaFaceSession())
+        face_detector = FaceDetector("buffalo_s", min_score=0.3, cache_dir="test_cache")
+        face_detector.session = face_detector._load()
+        run = mocker.spy(StubRetinaFaceSession, "run")
+        resize = mocker.spy(face_detector, "_resize")
+        images = [np.zeros((480, 640, 3), dtype=np.uint8), np.zeros((1200, 500, 3), dtype=np.uint8)]
+
+        face_detector._detect_batch(images)
+
+        assert run.call_args.args[2]["input.1"].shape == (2, 3, 640, 640)
+        assert [det_scale for _, det_scale in resize.spy_return_list] == [1.0, 640 / 1200]
+
+    def test_queued_detections_run_as_one_batch(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "max_batch_size", MaxBatchSize(face_detection=4))
+        mocker.patch.object(FaceDetector, "_make_session", return_value=StubRetinaFaceSession())
+        face_detector = FaceDetector("buffalo_s", min_score=0.3, cache_dir="test_cache")
+        face_detector.session = face_detector._load()
+        detect_batch = mocker.spy(face_detector, "_detect_batch")
+        images = [np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(5)]
+
+        with ThreadPoolExecutor(len(images)) as pool:
+            # holding the lock lets every request queue up before the first batch runs
+            with face_detector.batch_lock:
+                futures = [pool.submit(face_detector._detect, image) for image in images]
+                while len(face_detector.pending) < len(images):
+                    time.sleep(0.01)
+            results = [future.result() for future in futures]
+
+        assert face_detector.batch_size == 4
+        assert [len(call.args[0]) for call in detect_batch.call_args_list] == [4, 1]
+        for image, (boxes, landmarks) in zip(images, results):
+            expected_boxes, expected_landmarks = face_detector._detect_batch([image])[0]
+            np.testing.assert_array_equal(boxes, expected_boxes)
+            np.testing.assert_array_equal(landmarks, expected_landmarks)
+
+    def test_queued_detection_errors_reach_every_request(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "max_batch_size", MaxBatchSize(face_detection=4))
+        face_detector = FaceDetector("buffalo_s", min_score=0.3, cache_dir="test_cache")
+        mocker.patch.object(face_detector, "_detect_batch", side_effect=RuntimeError("failed"))
+
+        with ThreadPoolExecutor(3) as pool:
+            with face_detector.batch_lock:
+                futures = [pool.submit(face_detector._detect, np.zeros((10, 10, 3), dtype=np.uint8)) for _ in range(3)]
+                while len(face_detector.pending) < 3:
+                    time.sleep(0.01)
+
+        for future in futures:
+            with pytest.raises(RuntimeError, match="failed"):
+                future.result()
+        assert face_detector.pending == []
+
+    def test_detection_adds_batch_axis(self, ort_session: mock.Mock, path: mock.Mock, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "max_batch_size", MaxBatchSize(face_detection=4))
+        onnx = mocker.patch("immich_ml.models.facial_recognition.detection.onnx", autospec=True)
+        mocker.patch("immich_ml.models.base.InferenceModel.download")
+        mocker.patch("immich_ml.models.facial_recognition.detection.RetinaFace")
+        ort_session.return_value.get_inputs.return_value = [SimpleNamespace(name="input.1", shape=(1, 3, "?", "?"))]
+        path.return_value.__truediv__.return_value.__truediv__.return_value.suffix = ".onnx"
+        proto = onnx.load.return_value
+        batch_dim = SimpleNamespace(dim_value=1, dim_param="")
+        proto.graph.input[0].type.tensor_type.shape.dim = [batch_dim, SimpleNamespace(dim_value=3)]
+
+        face_detector = FaceDetector("buffalo_s", cache_dir=path)
+        face_detector.load()
+
+        assert batch_dim.dim_param == "batch"
+        onnx.save.assert_called_once_with(proto, face_detector.model_path)
+        assert ort_session.call_count == 2
+
+    def test_detection_does_not_batch_armnn(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "max_batch_size", MaxBatchSize(face_detection=4))
+
+        face_detector = FaceDetector("buffalo_s", cache_dir="test_cache", model_format=ModelFormat.ARMNN)
+
+        assert face_detector.batch_size == 1
+
+    def test_detection_does_not_add_batch_axis_without_batching(
+        self, ort_session: mock.Mock, path: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        onnx = mocker.patch("immich_ml.models.facial_recognition.detection.onnx", autospec=True)
+        mocker.patch("immich_ml.models.base.InferenceModel.download")
+        mocker.patch("immich_ml.models.facial_recognition.detection.RetinaFace")
+        ort_session.return_value.get_inputs.return_value = [SimpleNamespace(name="input.1", shape=(1, 3, "?", "?"))]
+        path.return_value.__truediv__.return_value.__truediv__.return_value.suffix = ".onnx"
+
+        face_detector = FaceDetector("buffalo_s", cache_dir=path)
+        face_detector.load()
+
+        assert face_detector.batch_size == 1
+        onnx.load.assert_not_called()
+        onnx.save.assert_not_called()
+
+    def test_static_input_size(self, mocker: MockerFixture) -> None:
+        session = StubRetinaFaceSession()
+        mocker.patch.object(
+            session, "get_inputs", return_value=[SimpleNamespace(name="input.1", shape=[1, 3, 640, 640])]
+        )
+        mocker.patch.object(FaceDetector, "_make_session", return_value=session)
+        face_detector = FaceDetector("buffalo_s", min_score=0.7, max_resolution=320, cache_dir="test_cache")
+        face_detector.session = face_detector._load()
+
+        assert not face_detector.dynamic_input
+        assert face_detector._input_size(480, 1280) == (640, 640)
+        assert face_detector.min_image_size == (0, 640)
 
     def test_recognition(self, cv_image: cv2.Mat, mocker: MockerFixture) -> None:
         mocker.patch.object(FaceRecognizer, "load")
@@ -721,6 +1664,167 @@ class TestFaceRecognition:
         assert isinstance(call_args[0][0], np.ndarray)
         assert call_args[0][0].shape == (112, 112, 3)
 
+    def test_uint8_detection_matches_float(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceDetector, "_make_session", return_value=StubRetinaFaceSession())
+        face_detector = FaceDetector("buffalo_s", min_score=0.3, cache_dir="test_cache")
+        face_detector.session = face_detector._load()
+        images = [np.random.randint(0, 256, shape, dtype=np.uint8) for shape in [(480, 640, 3), (600, 800, 3)]]
+        expected = face_detector._detect_batch(images)
+        mocker.patch.object(settings, "model_uint8_input", True)
+        mocker.patch.object(FaceDetector, "_make_uint8_session", return_value=StubUint8RetinaFaceSession())
+        uint8_detector = FaceDetector("buffalo_s", min_score=0.3, cache_dir="test_cache")
+        uint8_detector.session = uint8_detector._load()
+        run = mocker.spy(StubUint8RetinaFaceSession, "run")
+
+        detections = uint8_detector._detect_batch(images)
+
+        assert uint8_detector.dynamic_input
+        inputs = run.call_args.args[2]["input.1"]
+        assert inputs.dtype == np.uint8 and inputs.shape == (2, 512, 640, 3)
+        for (boxes, landmarks), (expected_boxes, expected_landmarks) in zip(detections, expected):
+            assert len(boxes) > 1
+            np.testing.assert_array_equal(boxes, expected_boxes)
+            np.testing.assert_array_equal(landmarks, expected_landmarks)
+
+    def test_uint8_recognition_loads_only_uint8_session(
+        self, identity_image_model: Path, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(settings, "model_uint8_input", True)
+        model_path = identity_image_model.parent.with_name("recognition") / "model.onnx"
+        model_path.parent.mkdir()
+        identity_image_model.rename(model_path)
+        make_session = mocker.spy(FaceRecognizer, "_make_session")
+        face_recognizer = FaceRecognizer("buffalo_s", cache_dir=model_path.parent.parent, model_format=ModelFormat.ONNX)
+        face_recognizer.session = face_recognizer._load()
+        cropped_faces = np.random.randint(0, 256, (2, 112, 112, 3), dtype=np.uint8)
+
+        embeddings = face_recognizer._get_feat(cropped_faces)
+
+        make_session.assert_called_once()
+        assert make_session.call_args.args[1].name.startswith("model.uint8.")
+        expected = ((cropped_faces[..., ::-1].astype(np.float32) - 127.5) / 127.5).transpose(0, 3, 1, 2)
+        np.testing.assert_allclose(embeddings, expected, rtol=1e-6)
+
+    def test_recognition_copies_reused_output_buffers(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceRecognizer, "load")
+        face_recognizer = FaceRecognizer("buffalo_s", cache_dir="test_cache")
+        face_recognizer.batch_size = 1
+        buffer = np.empty((1, 512), dtype=np.float32)
+
+        def get_feat(faces: list[NDArray[np.uint8]]) -> NDArray[np.float32]:
+            # like ARM NN, every call writes to and returns the same buffer
+            buffer[:] = faces[0].mean()
+            return buffer
+
+        face_recognizer.model = mock.Mock(get_feat=mock.Mock(side_effect=get_feat))
+        cropped_faces = np.stack([np.full((112, 112, 3), i, dtype=np.uint8) for i in range(3)])
+
+        embeddings = face_recognizer._predict_batch(cropped_faces)
+
+        np.testing.assert_array_equal(embeddings[:, 0], [0, 1, 2])
+
+    def test_recognition_limits_faces_by_score_and_area(self, cv_image: cv2.Mat, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceRecognizer, "load")
+        face_recognizer = FaceRecognizer("buffalo_s", cache_dir="test_cache")
+        face_recognizer.model = mock.Mock()
+        face_recognizer.model.get_feat.side_effect = lambda crops: np.random.rand(len(crops), 512).astype(np.float32)
+        boxes = np.array([[0, 0, 10, 10], [0, 0, 40, 40], [0, 0, 30, 30], [0, 0, 50, 50]], dtype=np.float32)
+        scores = np.array([0.99, 0.6, 0.9, 0.8], dtype=np.float32)
+        landmarks = np.random.rand(4, 5, 2).astype(np.float32) * 100
+        faces = {"boxes": boxes, "scores": scores, "landmarks": landmarks}
+
+        result = face_recognizer.predict(cv_image, faces, maxFaces=2)
+
+        assert [face["boundingBox"]["x2"] for face in result] == [40, 50]
+        assert len(face_recognizer.model.get_feat.call_args.args[0]) == 2
+
+    def test_recognition_skips_small_faces(self, cv_image: cv2.Mat, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceRecognizer, "load")
+        face_recognizer = FaceRecognizer("buffalo_s", min_face_size=20, cache_dir="test_cache")
+        face_recognizer.model = mock.Mock()
+        face_recognizer.model.get_feat.side_effect = lambda crops: np.random.rand(len(crops), 512).astype(np.float32)
+        boxes = np.array([[0, 0, 10, 100], [5, 5, 30, 30], [0, 0, 100, 19]], dtype=np.float32)
+        faces = {"boxes": boxes, "scores": np.ones(3, dtype=np.float32), "landmarks": np.random.rand(3, 5, 2) * 100}
+
+        result = face_recognizer.predict(cv_image, faces)
+
+        assert [face["boundingBox"] for face in result] == [{"x1": 5, "y1": 5, "x2": 30, "y2": 30}]
+        assert face_recognizer.predict(cv_image, faces, minFaceSize=50) == []
+        face_recognizer.model.get_feat.assert_called_once()
+
+    def test_recognition_skips_blurry_faces(self, cv_image: cv2.Mat, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceRecognizer, "load")
+        face_recognizer = FaceRecognizer("buffalo_s", cache_dir="test_cache")
+        face_recognizer.model = mock.Mock()
+        face_recognizer.model.get_feat.side_effect = lambda crops: np.random.rand(len(crops), 512).astype(np.float32)
+        sharp = np.random.default_rng(0).integers(0, 256, (112, 112, 3), dtype=np.uint8)
+        blurry = cv2.GaussianBlur(sharp, (0, 0), 8)
+        mocker.patch.object(face_recognizer, "_crop", return_value=np.stack([blurry, sharp]))
+        boxes = np.array([[0, 0, 10, 10], [0, 0, 20, 20]], dtype=np.float32)
+        faces = {"boxes": boxes, "scores": np.ones(2, dtype=np.float32), "landmarks": np.zeros((2, 5, 2))}
+
+        result = face_recognizer.predict(cv_image, faces, minSharpness=100.0)
+
+        assert [face["boundingBox"]["x2"] for face in result] == [20]
+        np.testing.assert_array_equal(face_recognizer.model.get_feat.call_args.args[0][0], sharp)
+
+    def test_similarity_transforms_match_skimage(self) -> None:
+        rng = np.random.default_rng(0)
+        scales, offsets = rng.uniform(0.5, 4, (20, 1, 1)), rng.uniform(0, 500, (20, 1, 2))
+        landmarks = arcface_dst * scales + offsets + rng.normal(0, 3, (20, 5, 2))
+        expected = []
+        for landmark in landmarks:
+            tform = SimilarityTransform()
+            tform.estimate(landmark, arcface_dst.astype(np.float64))
+            expected.append(tform.params[:2])
+
+        transforms = estimate_similarity_transforms(landmarks, arcface_dst)
+
+        assert transforms.shape == (20, 2, 3)
+        np.testing.assert_allclose(transforms, expected, atol=1e-9)
+
+    def test_crop_aligns_faces_into_one_batch(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceRecognizer, "load")
+        face_recognizer = FaceRecognizer("buffalo_s", cache_dir="test_cache")
+        gradient = np.add.outer(np.arange(600), np.arange(800)) // 6
+        image = np.stack([gradient, gradient[::-1], gradient[:, ::-1]], axis=-1).astype(np.uint8)
+        landmarks = np.stack([arcface_dst * 2 + 100, arcface_dst * 1.5 + 300]).astype(np.float32)
+        faces: FaceDetectionOutput = {
+            "boxes": np.zeros((2, 4), dtype=np.float32),
+            "landmarks": landmarks,
+            "scores": np.zeros(2, dtype=np.float32),
+        }
+
+        cropped_faces = face_recognizer._crop(image, faces)
+
+        assert cropped_faces.shape == (2, 112, 112, 3)
+        assert cropped_faces.flags.c_contiguous
+        for cropped_face, landmark in zip(cropped_faces, landmarks):
+            expected = norm_crop(image, landmark)
+            assert np.abs(cropped_face.astype(np.int16) - expected).max() <= 1
+
+    def test_detection_and_recognition_share_bgr_conversion(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(FaceDetector, "load")
+        mocker.patch.object(FaceRecognizer, "load")
+        pil_to_cv2 = mocker.spy(immich_ml.models.transforms, "pil_to_cv2")
+        face_detector = FaceDetector("buffalo_s", min_score=0.0, cache_dir="test_cache")
+        face_detector.model = mock.Mock(input_size=(640, 640))
+        bbox = np.array([[10.0, 20.0, 30.0, 40.0, 0.9]], dtype=np.float32)
+        detect = mocker.patch.object(
+            face_detector, "_detect", return_value=(bbox, np.random.rand(1, 5, 2).astype(np.float32))
+        )
+        face_recognizer = FaceRecognizer("buffalo_s", min_score=0.0, cache_dir="test_cache")
+        face_recognizer.model = mock.Mock()
+        face_recognizer.model.get_feat.return_value = np.random.rand(1, 512).astype(np.float32)
+        crop = mocker.patch.object(face_recognizer, "_crop", return_value=[np.zeros((112, 112, 3), dtype=np.uint8)])
+        context = ImageContext(Image.new("RGB", (800, 600)))
+
+        faces = face_detector.predict(context)
+        face_recognizer.predict(context, faces)
+
+        pil_to_cv2.assert_called_once()
+        assert detect.call_args.args[0] is crop.call_args.args[0]
+
     def test_recognition_adds_batch_axis_for_ort(
         self, ort_session: mock.Mock, path: mock.Mock, mocker: MockerFixture
     ) -> None:
@@ -803,6 +1907,23 @@ class TestFaceRecognition:
         onnx.load.assert_not_called()
         onnx.save.assert_not_called()
 
+    def test_recognition_batches_rknn_without_adding_batch_axis(
+        self, rknn_session: mock.Mock, path: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        onnx = mocker.patch("immich_ml.models.facial_recognition.recognition.onnx", autospec=True)
+        mocker.patch("immich_ml.models.base.InferenceModel.download")
+        mocker.patch("immich_ml.models.facial_recognition.recognition.ArcFaceONNX")
+        path.return_value.__truediv__.return_value.__truediv__.return_value.__truediv__.return_value.suffix = ".rknn"
+        mocker.patch("immich_ml.models.base.rknn.model_prefix", Path("rknpu/rk3588"))
+
+        face_recognizer = FaceRecognizer("buffalo_s", model_format=ModelFormat.RKNN, cache_dir=path)
+        face_recognizer.load()
+
+        assert face_recognizer.batch_size is None
+        rknn_session.assert_called_once()
+        onnx.load.assert_not_called()
+        onnx.save.assert_not_called()
+
     def test_recognition_does_not_add_batch_axis_for_openvino(
         self, ort_session: mock.Mock, path: mock.Mock, mocker: MockerFixture
     ) -> None:
@@ -830,6 +1951,392 @@ class TestFaceRecognition:
         onnx.save.assert_not_called()
 
 
+class TestTextDetection:
+    run: mock.Mock
+
+    def _detector(self, mocker: MockerFixture) -> TextDetector:
+        mocker.patch.object(TextDetector, "load")
+        text_detector = TextDetector("PP-OCRv5_mobile", cache_dir="test_cache")
+
+        def session(_: Any, inputs: dict[str, NDArray[np.float32]]) -> list[NDArray[np.float32]]:
+            # a "model" that sees dark pixels as text
+            batch = inputs["x"]
+            return [np.clip(1.0 - batch[:, :1], 0.0, 1.0)]
+
+        self.run = mock.Mock(side_effect=session)
+        text_detector.session = mock.Mock(run=self.run)
+        return text_detector
+
+    def _image(self) -> Image.Image:
+        # a long screenshot with lines of text on either side of where tiles meet
+        image = Image.new("RGB", (400, 6000), "white")
+        for y in range(100, 5900, 130):
+            image.paste("black", (40 + y % 100, y, 300 + y % 50, y + 24))
+        return image
+
+    def test_rejects_non_positive_max_resolution(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+
+        with pytest.raises(ValueError, match="maxResolution"):
+            text_detector.configure(maxResolution=0)
+
+    @pytest.mark.parametrize("length", [100, 512, 700, 3000, 3008])
+    def test_tile_spans_cover_axis(self, length: int) -> None:
+        spans = _tile_spans(length, 512)
+
+        assert spans[0][0] == 0 and spans[0][1] == 0
+        assert spans[-1][0] + min(512, length) == length and spans[-1][2] == length
+        for (offset, start, end), (next_offset, next_start, _) in zip(spans, spans[1:]):
+            assert end == next_start
+            assert offset + 512 - end >= 64 and start - next_offset <= -64
+        for offset, start, end in spans:
+            assert offset <= start < end <= offset + min(512, length)
+
+    def test_tiled_detection_matches_untiled(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+        image = self._image()
+
+        expected = text_detector.predict(image, maxResolution=400)
+        untiled_calls = self.run.call_count
+        result = text_detector.predict(image, maxResolution=400, tileSize=512)
+
+        tiled_calls = self.run.call_args_list[untiled_calls:]
+        assert len(expected["boxes"]) == 45
+        np.testing.assert_array_equal(result["boxes"], expected["boxes"])
+        np.testing.assert_array_equal(result["scores"], expected["scores"])
+        assert [call.args[1]["x"].shape for call in tiled_calls] == [(4, 3, 512, 384)] * 4
+
+    def test_tiling_skipped_for_small_images(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+
+        text_detector.predict(self._image().crop((0, 0, 400, 500)), maxResolution=400, tileSize=512)
+
+        self.run.assert_called_once()
+        assert self.run.call_args.args[1]["x"].shape == (1, 3, 512, 384)
+
+    def test_preprocessing_matches_float_path(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+        x, y = np.meshgrid(np.arange(1600), np.arange(1200))
+        rgb = np.stack([x * 255 // 1600, y * 255 // 1200, (x + y) * 255 // 2800], axis=-1).astype(np.uint8)
+        context = ImageContext(Image.fromarray(rgb))
+
+        batch = text_detector._to_input(text_detector._resize(context, 736)[None])
+
+        resized = np.array(Image.fromarray(rgb).resize((992, 736), Image.Resampling.LANCZOS), dtype=np.float32)
+        expected = ((resized[..., ::-1] - 0.5) / 127.5).transpose(2, 0, 1)[None]
+        assert batch.shape == (1, 3, 736, 992) and batch.flags.c_contiguous
+        assert np.abs(batch - expected).mean() * 127.5 < 0.5
+
+    def test_input_buffer_is_reused(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "ocr_detection_buckets", [736])
+        text_detector = self._detector(mocker)
+        images = np.zeros((4, 64, 96, 3), dtype=np.uint8)
+
+        batch = text_detector._to_input(images)
+        same_shape = text_detector._to_input(images)
+        smaller_batch = text_detector._to_input(images[:2])
+        new_shape = text_detector._to_input(images[:, :32])
+
+        assert same_shape.base is batch.base
+        assert smaller_batch.base is batch.base
+        assert new_shape.shape == (4, 3, 32, 96) and new_shape.base is not batch.base
+
+    def test_input_buffer_is_not_kept_if_unlikely_to_be_reused(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+        text_detector._to_input(np.zeros((1, 64, 96, 3), dtype=np.uint8))
+        assert text_detector.buffers.x is None
+
+        mocker.patch.object(settings, "ocr_detection_buckets", [736])
+        text_detector = self._detector(mocker)
+        text_detector._to_input(np.zeros((1, 4416, 736, 3), dtype=np.uint8))
+        assert text_detector.buffers.x is None
+
+    def test_uint8_input_is_bgr(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "model_uint8_input", True)
+        make_uint8_session = mocker.patch.object(InferenceModel, "_make_uint8_session", autospec=True)
+        text_detector = TextDetector("PP-OCRv5_mobile", cache_dir="test_cache")
+        text_detector._load()
+        images = np.random.randint(0, 256, (1, 32, 64, 3), dtype=np.uint8)
+
+        np.testing.assert_array_equal(text_detector._to_input(images), images)
+        assert make_uint8_session.call_args.kwargs.get("swap_rb", False) is False
+
+    @pytest.mark.parametrize(("length", "expected"), [(100, 736), (736, 736), (800, 1024), (1100, 1472), (3000, 4416)])
+    def test_shape_bucket(self, mocker: MockerFixture, length: int, expected: int) -> None:
+        mocker.patch.object(settings, "ocr_detection_buckets", [1024, 730, 1472])
+        text_detector = self._detector(mocker)
+
+        assert text_detector.shape_buckets == [736, 1024, 1472]
+        assert text_detector._bucket(length) == expected
+
+    def test_bucketed_detection_matches_unbucketed(self, mocker: MockerFixture) -> None:
+        image = self._image().crop((0, 0, 400, 1000))
+        expected = self._detector(mocker).predict(image, maxResolution=400)
+        mocker.patch.object(settings, "ocr_detection_buckets", [512, 1024])
+        text_detector = self._detector(mocker)
+
+        result = text_detector.predict(image, maxResolution=400)
+        text_detector.predict(image.crop((0, 0, 380, 900)), maxResolution=400)
+
+        assert len(expected["boxes"]) > 0
+        np.testing.assert_array_equal(result["boxes"], expected["boxes"])
+        np.testing.assert_array_equal(result["scores"], expected["scores"])
+        assert [call.args[1]["x"].shape for call in self.run.call_args_list] == [
+            (1, 3, 1024, 512),
+            (1, 3, 1024, 512),
+        ]
+        assert text_detector.bucket_usage == {(1024, 512): 2}
+
+    def test_prepass_is_not_padded_to_bucket(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings, "ocr_detection_buckets", [736, 1024, 1472])
+        text_detector = self._detector(mocker)
+
+        text_detector.predict(Image.new("RGB", (800, 600), "white"), prepassResolution=160)
+
+        self.run.assert_called_once()
+        assert self.run.call_args.args[1]["x"].shape == (1, 3, 160, 224)
+        assert text_detector.bucket_usage == {}
+
+    def test_no_text_skips_postprocessing(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+        text_detector.postprocess = mock.Mock(thresh=0.3, box_thresh=0.5, min_size=3)
+        image = Image.new("RGB", (800, 600), "white")
+        image.paste("black", (100, 100, 101, 101))  # too small to be text
+
+        result = text_detector.predict(image)
+
+        assert result is text_detector._empty
+        text_detector.postprocess.assert_not_called()
+
+    def test_has_text_agrees_with_postprocessing_on_smallest_box(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+        text_detector.postprocess.box_thresh = 0.4
+        out = np.full((1, 1, 32, 32), 0.3, dtype=np.float32)
+        # the fewest pixels above the threshold that post-processing turns into a box, thanks to dilation
+        out[0, 0, [10, 12, 13], [16, 16, 14]] = 1.0
+
+        assert len(text_detector.postprocess(out, (32, 32))[0]) == 1
+        assert text_detector._has_text(out, 0.4)
+
+        out[0, 0, 13, 14] = 0.3
+
+        assert len(text_detector.postprocess(out, (32, 32))[0]) == 0
+        assert not text_detector._has_text(out, 0.4)
+
+    def test_prepass_skips_full_detection_without_text(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+
+        result = text_detector.predict(Image.new("RGB", (1200, 900), "white"), prepassResolution=192)
+
+        assert result is text_detector._empty
+        self.run.assert_called_once()
+        assert self.run.call_args.args[1]["x"].shape == (1, 3, 192, 256)
+
+    def test_prepass_runs_full_detection_with_text(self, mocker: MockerFixture) -> None:
+        text_detector = self._detector(mocker)
+        image = self._image().crop((0, 0, 400, 1000)).resize((1200, 3000))
+
+        expected = text_detector.predict(image)
+        result = text_detector.predict(image, prepassResolution=192)
+
+        assert len(expected["boxes"]) > 0
+        np.testing.assert_array_equal(result["boxes"], expected["boxes"])
+        assert [call.args[1]["x"].shape[2:] for call in self.run.call_args_list] == [
+            (1824, 736),
+            (480, 192),
+            (1824, 736),
+        ]
+
+
+class TestTextDetectionPostprocess:
+    kwargs: dict[str, Any] = {
+        "thresh": 0.3,
+        "box_thresh": 0.5,
+        "unclip_ratio": 1.6,
+        "use_dilation": True,
+        "score_mode": "fast",
+    }
+
+    def _prob_map(self, rotated: float = 0.0) -> NDArray[np.float32]:
+        # lines of words with varying confidence, some of them slightly rotated
+        rng = np.random.default_rng(0)
+        prob = np.zeros((736, 992), dtype=np.float32)
+        for y in range(8, 700, 22):
+            x = 5
+            while x < 940:
+                width = int(rng.uniform(12, 70))
+                score = rng.uniform(0.4, 1.0)
+                if rng.random() < rotated:
+                    rect = ((x + width / 2, y + 6), (width, 10), rng.uniform(-8, 8))
+                    cv2.fillPoly(prob, [cv2.boxPoints(rect).astype(np.int32)], score)
+                else:
+                    prob[y : y + 11, x : x + width] = score
+                x += width + int(rng.uniform(6, 20))
+        return cv2.GaussianBlur(prob, (3, 3), 0.8)[None, None].astype(np.float32)
+
+    def test_box_points_match_rapidocr(self) -> None:
+        rng = np.random.default_rng(0)
+        contours = [rng.integers(0, 200, (rng.integers(3, 12), 1, 2)).astype(np.int32) for _ in range(200)]
+        contours += [np.array([[[10, 20]], [[50, 20]], [[50, 31]], [[10, 31]]], dtype=np.int32)]
+        rects = np.array([(*center, *size, angle) for center, size, angle in map(cv2.minAreaRect, contours)])
+
+        boxes = _box_points(rects)
+
+        rapid = RapidDBPostProcess()
+        for contour, box in zip(contours, boxes):
+            expected, _ = rapid.get_mini_boxes(contour)
+            np.testing.assert_array_equal(box, expected)
+
+    def test_matches_rapidocr(self) -> None:
+        prob = self._prob_map()
+
+        boxes, scores = DBPostProcess(**self.kwargs)(prob, (1472, 1984))
+
+        expected_boxes, expected_scores = RapidDBPostProcess(**self.kwargs)(prob, (1472, 1984))
+        assert len(boxes) > 400
+        np.testing.assert_array_equal(boxes, expected_boxes)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-9)
+
+    def test_rotated_boxes_are_close_to_rapidocr(self) -> None:
+        prob = self._prob_map(rotated=0.3)
+
+        boxes, scores = DBPostProcess(**self.kwargs)(prob, (736, 992))
+
+        expected_boxes, expected_scores = RapidDBPostProcess(**self.kwargs)(prob, (736, 992))
+        assert len(boxes) == len(expected_boxes)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-9)
+        assert np.abs(boxes - expected_boxes).max() <= 2
+        assert np.abs(boxes - expected_boxes).mean() < 0.1
+
+    def test_keeps_highest_scoring_candidates(self) -> None:
+        prob = np.zeros((1, 1, 100, 200), dtype=np.float32)
+        for i, score in enumerate([0.6, 0.9, 0.7, 0.8]):
+            prob[0, 0, 20:40, 10 + i * 45 : 40 + i * 45] = score
+
+        all_boxes, all_scores = DBPostProcess(**self.kwargs)(prob, (100, 200))
+        boxes, scores = DBPostProcess(**{**self.kwargs, "max_candidates": 2})(prob, (100, 200))
+
+        top = np.sort(np.argsort(all_scores)[-2:])
+        assert len(all_boxes) == 4
+        np.testing.assert_array_equal(boxes, all_boxes[top])
+        assert scores == [all_scores[i] for i in top]
+        assert sorted(boxes[:, 0, 0].tolist()) == [45.0, 135.0]
+
+    def test_empty(self) -> None:
+        prob = np.zeros((1, 1, 100, 200), dtype=np.float32)
+        prob[0, 0, 50, 50] = 1.0
+
+        boxes, scores = DBPostProcess(**self.kwargs)(prob, (100, 200))
+
+        assert boxes.shape == (0, 4, 2)
+        assert scores == []
+
+
+class TestTextRecognition:
+    def _recognizer(self, mocker: MockerFixture, batch_size: int = 6) -> TextRecognizer:
+        mocker.patch.object(TextRecognizer, "load")
+        text_recognizer = TextRecognizer("PP-OCRv5_mobile", cache_dir="test_cache")
+        text_recognizer.batch_size = batch_size
+        text_recognizer.session = mock.Mock()
+        text_recognizer.characters = np.array(["blank", *"0123456789", " "], dtype=object)
+        return text_recognizer
+
+    def _image(self) -> NDArray[np.uint8]:
+        x, y = np.meshgrid(np.arange(800), np.arange(600))
+        return np.stack([x % 256, y % 256, (x // 4 + y // 4) % 256], axis=-1).astype(np.uint8)
+
+    def test_crop_batch_matches_resized_crop(self, mocker: MockerFixture) -> None:
+        text_recognizer = self._recognizer(mocker)
+        image = self._image()
+        boxes = np.array([[[100, 50], [300, 50], [300, 90], [100, 90]]], dtype=np.float32)
+
+        transforms, crop_sizes = text_recognizer._get_crop_transforms(boxes)
+        batch = text_recognizer._crop_batch(image, transforms, crop_sizes, 320)
+
+        expected = cv2.resize(image[50:90, 100:300], (240, 48)).transpose(2, 0, 1) / 127.5 - 1
+        assert crop_sizes.tolist() == [[200, 40]]
+        assert batch.shape == (1, 3, 48, 320)
+        assert np.abs(batch[0, :, :, :240] - expected).mean() < 0.01
+        assert (batch[0, :, :, 240:] == 0).all()
+
+    def test_crop_rotates_tall_boxes(self, mocker: MockerFixture) -> None:
+        text_recognizer = self._recognizer(mocker)
+        image = self._image()
+        boxes = np.array([[[400, 100], [420, 100], [420, 300], [400, 300]]], dtype=np.float32)
+
+        transforms, crop_sizes = text_recognizer._get_crop_transforms(boxes)
+        batch = text_recognizer._crop_batch(image, transforms, crop_sizes, 480)
+
+        rotated = np.ascontiguousarray(np.rot90(image[100:300, 400:420]))
+        expected = cv2.resize(rotated, (480, 48)).transpose(2, 0, 1) / 127.5 - 1
+        assert crop_sizes.tolist() == [[200, 20]]
+        assert np.abs(batch[0] - expected).mean() < 0.01
+
+    def test_recognition_batches_by_width_bucket(self, mocker: MockerFixture) -> None:
+        text_recognizer = self._recognizer(mocker, batch_size=2)
+
+        def session(batch: NDArray[np.float32]) -> NDArray[np.float32]:
+            # "recognizes" the width of each crop without its padding, with blanks between repeated digits
+            preds = np.zeros((len(batch), batch.shape[3] // 8, 12), dtype=np.float32)
+            preds[:, :, 0] = 1.0
+            for row, crop in zip(preds, batch):
+                for step, digit in enumerate(str((crop != 0).any(axis=(0, 1)).sum())):
+                    row[step * 2] = 0.0
+                    row[step * 2, int(digit) + 1] = 0.99
+            return preds
+
+        run = mock.Mock(side_effect=lambda output_names, input_feed: [session(input_feed["x"])])
+        text_recognizer.session = mock.Mock(run=run)
+        widths = [300, 100, 200, 120]
+        boxes = np.array([[[0, 0], [width, 0], [width, 50], [0, 50]] for width in widths], dtype=np.float32)
+        texts = {"boxes": boxes, "scores": np.ones(4, dtype=np.float32)}
+
+        result = text_recognizer.predict(self._image(), texts)
+
+        assert result["text"] == ["288", "96", "192", "116"]
+        np.testing.assert_allclose(result["textScore"], 0.99)
+        assert [call.args[1]["x"].shape for call in run.call_args_list] == [
+            (2, 3, 48, 128),
+            (1, 3, 48, 192),
+            (1, 3, 48, 320),
+        ]
+        np.testing.assert_allclose(result["box"][:2], [0, 0])
+        np.testing.assert_allclose(result["box"][2:4], [300 / 800, 0])
+
+    def test_load_reads_characters_from_model(
+        self, identity_image_model: Path, ort_session: mock.Mock, mocker: MockerFixture
+    ) -> None:
+        proto = onnx.load(identity_image_model)
+        onnx.helper.set_model_props(proto, {"character": "a\nb\nc"})
+        model_path = identity_image_model.parent.with_name("recognition") / "model.onnx"
+        model_path.parent.mkdir()
+        onnx.save(proto, model_path)
+        make_session = mocker.spy(TextRecognizer, "_make_session")
+        text_recognizer = TextRecognizer("PP-OCRv5_mobile", cache_dir=model_path.parent.parent)
+
+        text_recognizer._load()
+
+        make_session.assert_called_once_with(text_recognizer, model_path)
+        assert text_recognizer.characters.tolist() == ["blank", "a", "b", "c", " "]
+
+    def test_decode_matches_rapidocr(self, mocker: MockerFixture) -> None:
+        text_recognizer = self._recognizer(mocker)
+        ctc_decode = CTCLabelDecode(character=list("abcdefghij"))
+        text_recognizer.characters = np.array(ctc_decode.character, dtype=object)
+        logits = np.random.default_rng(0).normal(0, 2, (16, 40, 12))
+        logits[:, :, 0] += 1.5
+        preds = (np.exp(logits) / np.exp(logits).sum(axis=2, keepdims=True)).astype(np.float32)
+        preds[3] = np.eye(12, dtype=np.float32)[0]  # only blanks
+
+        texts, scores = text_recognizer._decode(preds)
+
+        expected, _ = ctc_decode(preds)
+        assert texts == [text for text, _ in expected]
+        np.testing.assert_allclose(scores, [score for _, score in expected], atol=1e-6)
+        assert texts[3] == ""
+        assert scores[3] == 0.0
+
+
 @pytest.mark.asyncio
 class TestCache:
     async def test_caches(self, mock_get_model: mock.Mock) -> None:
@@ -1072,6 +2579,195 @@ class TestLoad:
         mock_model.model_format = ModelFormat.ONNX
 
 
+class TestDecode:
+    def _jpeg(self, size: tuple[int, int]) -> bytes:
+        buf = BytesIO()
+        Image.new("RGB", size, (255, 0, 0)).save(buf, format="JPEG")
+        return buf.getvalue()
+
+    def test_decodes_full_resolution_by_default(self) -> None:
+        image = decode_pil(self._jpeg((2000, 1000)))
+
+        assert image.size == (2000, 1000)
+        assert image.mode == "RGB"
+
+    def test_decodes_jpeg_at_smallest_sufficient_scale(self) -> None:
+        image = decode_pil(self._jpeg((2000, 1000)), min_size=(224, 0))
+
+        assert image.size == (500, 250)
+
+    def test_satisfies_longest_side(self) -> None:
+        image = decode_pil(self._jpeg((2000, 1000)), min_size=(0, 640))
+
+        assert image.size == (1000, 500)
+
+    def test_does_not_reduce_other_formats(self) -> None:
+        buf = BytesIO()
+        Image.new("RGB", (2000, 1000)).save(buf, format="PNG")
+
+        image = decode_pil(buf.getvalue(), min_size=(224, 0))
+
+        assert image.size == (2000, 1000)
+
+    def test_decodes_bgr_at_smallest_sufficient_scale(self) -> None:
+        image = decode_bgr(self._jpeg((2000, 1000)), min_size=(224, 0))
+
+        assert image.shape == (250, 500, 3)
+        np.testing.assert_allclose(image[125, 250], [0, 0, 255], atol=2)
+
+    def test_decode_image_uses_backend(self) -> None:
+        assert decode_image(self._jpeg((64, 32)), backend=ImageBackend.CV2).backend == ImageBackend.CV2
+        assert decode_image(self._jpeg((64, 32)), backend=ImageBackend.PIL).backend == ImageBackend.PIL
+
+    def test_cv2_resize_and_crop_match_pil_semantics(self) -> None:
+        pil_image = Image.new("RGB", (1000, 600))
+
+        resized = resize_cv2(np.asarray(pil_image), 224)
+        cropped = crop_cv2(resized, 224)
+
+        assert resized.shape[1::-1] == resize_pil(pil_image, 224).size
+        assert cropped.shape[1::-1] == crop_pil(resize_pil(pil_image, 224), 224).size
+
+
+class TestImageContext:
+    def test_level_is_smallest_satisfying_min_size(self) -> None:
+        context = ImageContext(Image.new("RGB", (2000, 1000)))
+
+        assert context.level((224, 0)).size == (500, 250)
+        assert context.level((0, 640)).size == (1000, 500)
+        assert context.level().size == (2000, 1000)
+
+    def test_level_stops_at_smallest_size(self) -> None:
+        context = ImageContext(Image.new("RGB", (100, 80)))
+
+        assert context._level_index((0, 0)) == 7
+        assert context.level((0, 0)).size == (1, 1)
+
+    def test_levels_are_built_once(self, mocker: MockerFixture) -> None:
+        context = ImageContext(Image.new("RGB", (2000, 1000)))
+        reduce = mocker.spy(Image.Image, "reduce")
+
+        first = context.level((224, 0))
+        second = context.level((400, 0))
+
+        assert first is context.level((224, 0))
+        assert second.size == (1000, 500)
+        assert reduce.call_count == 2
+
+    def test_bgr_is_memoized(self) -> None:
+        context = ImageContext(Image.new("RGB", (64, 32), (255, 0, 0)))
+
+        bgr = context.bgr()
+
+        assert bgr is context.bgr()
+        assert bgr.shape == (32, 64, 3)
+        assert (bgr[0, 0] == [0, 0, 255]).all()
+
+    def test_levels_do_not_wait_for_other_representations(self, mocker: MockerFixture) -> None:
+        context = ImageContext(Image.new("RGB", (2000, 1000)))
+        started, release = threading.Event(), threading.Event()
+
+        def slow_pil_to_cv2(image: Image.Image) -> NDArray[np.uint8]:
+            started.set()
+            release.wait(5)
+            return pil_to_cv2(image)
+
+        mocker.patch("immich_ml.models.transforms.pil_to_cv2", side_effect=slow_pil_to_cv2)
+        with ThreadPoolExecutor(2) as pool:
+            bgr = pool.submit(context.bgr)
+            try:
+                assert started.wait(5)
+                level = pool.submit(context.level, (224, 0)).result(timeout=5)
+            finally:
+                release.set()
+
+        assert level.size == (500, 250)
+        assert bgr.result().shape == (1000, 2000, 3)
+
+    def test_levels_are_built_once_across_threads(self, mocker: MockerFixture) -> None:
+        context = ImageContext(Image.new("RGB", (2000, 1000)))
+        reduce = mocker.spy(Image.Image, "reduce")
+
+        with ThreadPoolExecutor(8) as pool:
+            levels = list(pool.map(lambda _: context.level((224, 0)), range(16)))
+
+        assert all(level is levels[0] for level in levels)
+        assert reduce.call_count == 2
+
+    def test_cv2_backed_levels(self) -> None:
+        bgr = np.zeros((1000, 2000, 3), dtype=np.uint8)
+        bgr[..., 0] = 255
+        context = ImageContext(bgr=bgr)
+
+        assert context.size == (2000, 1000)
+        assert context.bgr() is bgr
+        assert context.bgr((224, 0)).shape == (250, 500, 3)
+        assert context.level((224, 0)).size == (500, 250)
+        assert context.image.getpixel((0, 0)) == (0, 0, 255)
+
+
+@pytest.mark.asyncio
+class TestRunInference:
+    def _model(self, min_image_size: tuple[int, int] | None) -> mock.Mock:
+        model = mock.Mock(spec=InferenceModel)
+        model.loaded = True
+        model.identity = (ModelType.VISUAL, ModelTask.SEARCH)
+        model.depends = []
+        model.min_image_size = min_image_size
+        model.predict.side_effect = lambda image, **_: image.size
+        return model
+
+    async def test_decodes_at_size_needed_by_models(self, mocker: MockerFixture) -> None:
+        models = [self._model((224, 0)), self._model((0, 640))]
+        mocker.patch("immich_ml.main.model_cache.get", side_effect=models)
+        entries = [
+            {"name": "ViT-B-32__openai", "task": ModelTask.SEARCH, "type": ModelType.VISUAL, "options": {}},
+            {"name": "buffalo_l", "task": ModelTask.FACIAL_RECOGNITION, "type": ModelType.DETECTION, "options": {}},
+        ]
+
+        response = await run_inference(TestDecode()._jpeg((4000, 3000)), (entries, []))  # type: ignore[arg-type]
+
+        assert response[ModelTask.SEARCH] == (1000, 750)
+        assert response["imageWidth"] == 1000
+        assert response["imageHeight"] == 750
+
+    async def test_decodes_at_size_needed_by_request_options(self, mocker: MockerFixture) -> None:
+        text_detector = TextDetector("PP-OCRv5_mobile", session=mock.Mock(), cache_dir="test_cache")
+        mocker.patch.object(text_detector, "predict", side_effect=lambda image, **_: image.size)
+        mocker.patch("immich_ml.main.model_cache.get", return_value=text_detector)
+        entry: InferenceEntry = {
+            "name": "PP-OCRv5_mobile",
+            "task": ModelTask.OCR,
+            "type": ModelType.DETECTION,
+            "options": {},
+        }
+
+        default = await run_inference(TestDecode()._jpeg((4000, 3000)), ([entry], []))
+        entry["options"] = {"maxResolution": 2000}
+        configured = await run_inference(TestDecode()._jpeg((4000, 3000)), ([entry], []))
+
+        assert default[ModelTask.OCR] == (1000, 750)
+        assert configured[ModelTask.OCR] == (4000, 3000)
+
+    async def test_decodes_full_resolution_if_any_model_needs_it(self, mocker: MockerFixture) -> None:
+        detector = self._model((0, 640))
+        recognizer = self._model(None)
+        recognizer.depends = [(ModelType.DETECTION, ModelTask.FACIAL_RECOGNITION)]
+        recognizer.predict.side_effect = lambda image, faces, **_: image.size
+        detector.identity = (ModelType.DETECTION, ModelTask.FACIAL_RECOGNITION)
+        recognizer.identity = (ModelType.RECOGNITION, ModelTask.FACIAL_RECOGNITION)
+        mocker.patch("immich_ml.main.model_cache.get", side_effect=[detector, recognizer])
+        entries = (
+            [{"name": "buffalo_l", "task": ModelTask.FACIAL_RECOGNITION, "type": ModelType.DETECTION, "options": {}}],
+            [{"name": "buffalo_l", "task": ModelTask.FACIAL_RECOGNITION, "type": ModelType.RECOGNITION, "options": {}}],
+        )
+
+        response = await run_inference(TestDecode()._jpeg((4000, 3000)), entries)  # type: ignore[arg-type]
+
+        assert response[ModelTask.FACIAL_RECOGNITION] == (4000, 3000)
+        assert response["imageWidth"] == 4000
+
+
 def test_root_endpoint(deployed_app: TestClient) -> None:
     response = deployed_app.get("http://localhost:3003")
 